@@ -7,9 +7,10 @@ logger = logging.getLogger(__name__)
 
 import os
 import io
+import html
 import aiosqlite
 import smtplib
-from datetime import datetime, timedelta
+from datetime import datetime
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
 from email.mime.image import MIMEImage
@@ -26,6 +27,11 @@ from aiogram.types import BufferedInputFile
 from apscheduler.triggers.cron import CronTrigger
 import numpy as np
 
+from business_day import business_days_ago
+from reviews_query import RATING_BUCKETS
+from review_themes import rising_themes_async
+from demand_forecast import FORECAST_HOUR, ForecastError, train_forecast_async
+
 # Настройки
 DB_FILE = os.getenv('DB_FILE', 'orders.db')
 ADMIN_IDS = list(map(int, os.getenv("ADMIN_IDS", "").split(","))) if os.getenv("ADMIN_IDS") else []
@@ -49,7 +55,7 @@ async def get_reviews_analytics(days: int = 30) -> Dict:
     """
     Собирает аналитику по отзывам за последние N дней
     """
-    start_date = (datetime.now() - timedelta(days=days)).strftime('%Y-%m-%d')
+    start_date = business_days_ago(days)
     
     async with aiosqlite.connect(DB_FILE) as db:
         db.row_factory = aiosqlite.Row
@@ -57,9 +63,9 @@ async def get_reviews_analytics(days: int = 30) -> Dict:
         # 1. Статистика по дням
         cursor = await db.execute("""
             SELECT 
-                DATE(created_at) as date,
+                business_day as date,
                 COUNT(*) as count,
-                ROUND(AVG((cleanliness + comfort + location + facilities + staff + value_for_money) / 6.0), 2) as avg_rating,
+                ROUND(AVG(avg_score), 2) as avg_rating,
                 ROUND(AVG(cleanliness), 2) as avg_cleanliness,
                 ROUND(AVG(comfort), 2) as avg_comfort,
                 ROUND(AVG(location), 2) as avg_location,
@@ -67,8 +73,8 @@ async def get_reviews_analytics(days: int = 30) -> Dict:
                 ROUND(AVG(staff), 2) as avg_staff,
                 ROUND(AVG(value_for_money), 2) as avg_value
             FROM reviews
-            WHERE created_at >= ? AND status IN ('approved', 'pending')
-            GROUP BY DATE(created_at)
+            WHERE business_day >= ? AND status IN ('approved', 'pending')
+            GROUP BY business_day
             ORDER BY date
         """, (start_date,))
         daily_stats = await cursor.fetchall()
@@ -83,36 +89,32 @@ async def get_reviews_analytics(days: int = 30) -> Dict:
                 ROUND(AVG(staff), 2) as avg_staff,
                 ROUND(AVG(value_for_money), 2) as avg_value
             FROM reviews
-            WHERE created_at >= ? AND status IN ('approved', 'pending')
+            WHERE business_day >= ? AND status IN ('approved', 'pending')
         """, (start_date,))
         category_averages = await cursor.fetchone()
         
-        # 3. Распределение по рейтингам
+        # 3. Распределение по рейтингам (корзины — столбец rating_bucket)
         cursor = await db.execute("""
-            SELECT 
-                CASE 
-                    WHEN (cleanliness + comfort + location + facilities + staff + value_for_money) / 6.0 < 2 THEN 'Очень плохо'
-                    WHEN (cleanliness + comfort + location + facilities + staff + value_for_money) / 6.0 < 4 THEN 'Плохо'
-                    WHEN (cleanliness + comfort + location + facilities + staff + value_for_money) / 6.0 < 6 THEN 'Удовлетворительно'
-                    WHEN (cleanliness + comfort + location + facilities + staff + value_for_money) / 6.0 < 8 THEN 'Хорошо'
-                    ELSE 'Отлично'
-                END as rating_category,
-                COUNT(*) as count
+            SELECT rating_bucket, COUNT(*) as count
             FROM reviews
-            WHERE created_at >= ? AND status IN ('approved', 'pending')
-            GROUP BY rating_category
+            WHERE business_day >= ? AND status IN ('approved', 'pending')
+            GROUP BY rating_bucket
         """, (start_date,))
-        rating_distribution = await cursor.fetchall()
+        rating_distribution = [
+            {'rating_category': RATING_BUCKETS[row['rating_bucket']], 'count': row['count']}
+            for row in await cursor.fetchall() if row['rating_bucket'] is not None
+        ]
         
-        # 4. Топ-3 лучших отзыва
+        # 4. Топ-3 лучших отзыва: обход индекса по оценке до первых трёх
+        # подходящих — иначе сортировался бы весь период
         cursor = await db.execute("""
             SELECT 
                 id, guest_name, room_number,
-                ROUND((cleanliness + comfort + location + facilities + staff + value_for_money) / 6.0, 1) as avg_rating,
+                ROUND(avg_score, 1) as avg_rating,
                 pros, comment, created_at
-            FROM reviews
-            WHERE created_at >= ? AND status IN ('approved', 'pending')
-            ORDER BY avg_rating DESC, created_at DESC
+            FROM reviews INDEXED BY idx_reviews_avg_score
+            WHERE business_day >= ? AND status IN ('approved', 'pending')
+            ORDER BY avg_score DESC, created_at DESC
             LIMIT 3
         """, (start_date,))
         best_reviews = await cursor.fetchall()
@@ -121,43 +123,47 @@ async def get_reviews_analytics(days: int = 30) -> Dict:
         cursor = await db.execute("""
             SELECT 
                 id, guest_name, room_number,
-                ROUND((cleanliness + comfort + location + facilities + staff + value_for_money) / 6.0, 1) as avg_rating,
+                ROUND(avg_score, 1) as avg_rating,
                 cons, comment, created_at
-            FROM reviews
-            WHERE created_at >= ? AND status IN ('approved', 'pending')
-            ORDER BY avg_rating ASC, created_at DESC
+            FROM reviews INDEXED BY idx_reviews_avg_score
+            WHERE business_day >= ? AND status IN ('approved', 'pending')
+            ORDER BY avg_score ASC, created_at DESC
             LIMIT 3
         """, (start_date,))
         worst_reviews = await cursor.fetchall()
         
         # 6. Сравнение с предыдущим периодом
-        prev_start_date = (datetime.now() - timedelta(days=days*2)).strftime('%Y-%m-%d')
+        prev_start_date = business_days_ago(days * 2)
         prev_end_date = start_date
         
         cursor = await db.execute("""
             SELECT 
-                ROUND(AVG((cleanliness + comfort + location + facilities + staff + value_for_money) / 6.0), 2) as avg_rating
+                ROUND(AVG(avg_score), 2) as avg_rating
             FROM reviews
-            WHERE created_at >= ? AND created_at < ? AND status IN ('approved', 'pending')
+            WHERE business_day >= ? AND business_day < ? AND status IN ('approved', 'pending')
         """, (prev_start_date, prev_end_date))
         prev_period = await cursor.fetchone()
         
         cursor = await db.execute("""
             SELECT 
-                ROUND(AVG((cleanliness + comfort + location + facilities + staff + value_for_money) / 6.0), 2) as avg_rating
+                ROUND(AVG(avg_score), 2) as avg_rating
             FROM reviews
-            WHERE created_at >= ? AND status IN ('approved', 'pending')
+            WHERE business_day >= ? AND status IN ('approved', 'pending')
         """, (start_date,))
         current_period = await cursor.fetchone()
     
+    # 7. Растущие темы жалоб и похвалы в тексте (review_themes.py)
+    themes = await rising_themes_async(days, DB_FILE)
+    
     return {
         'daily_stats': [dict(row) for row in daily_stats],
         'category_averages': dict(category_averages) if category_averages else {},
-        'rating_distribution': [dict(row) for row in rating_distribution],
+        'rating_distribution': rating_distribution,
         'best_reviews': [dict(row) for row in best_reviews],
         'worst_reviews': [dict(row) for row in worst_reviews],
         'prev_period_avg': prev_period['avg_rating'] if prev_period and prev_period['avg_rating'] else None,
         'current_period_avg': current_period['avg_rating'] if current_period and current_period['avg_rating'] else None,
+        'themes': themes,
         'days': days,
         'start_date': start_date
     }
@@ -393,6 +399,15 @@ def generate_text_report(analytics: Dict) -> str:
                 text += f"    <i>\"{review['cons'][:100]}...\"</i>\n" if len(review['cons']) > 100 else f"    <i>\"{review['cons']}\"</i>\n"
         text += "\n"
     
+    themes = analytics.get('themes') or {}
+    for kind, title in (('complaint', "🔥 <b>Растущие темы жалоб:</b>"), ('praise', "💚 <b>Растущие темы похвалы:</b>")):
+        if themes.get(kind):
+            text += f"{title}\n"
+            for theme in themes[kind]:
+                text += (f"  • {html.escape(theme['term'])}: {theme['reviews']} отзывов "
+                         f"({theme['share']:.1f}%, было {theme['prev_share']:.1f}%)\n")
+            text += "\n"
+    
     text += "━━━━━━━━━━━━━━━━━\n"
     text += "Подробные графики прикреплены к сообщению."
     
@@ -571,6 +586,14 @@ async def scheduled_report(bot: Bot):
         import traceback
         traceback.print_exc()
 
+async def scheduled_forecast_training():
+    """Ночное переобучение прогноза заказов бара"""
+    try:
+        model = await train_forecast_async(DB_FILE)
+        logger.info(f"🔮 Прогноз заказов переобучен: {model['orders']} заказов за {model['weeks']} нед. ({model['seconds']} с)")
+    except ForecastError as e:
+        logger.warning(f"Прогноз заказов не переобучен: {e}")
+
 def setup_scheduler(bot: Bot):
     """Настройка планировщика для автоматической отправки отчетов"""
     scheduler = AsyncIOScheduler(timezone='Asia/Almaty')
@@ -584,6 +607,10 @@ def setup_scheduler(bot: Bot):
         args=[bot]
     )
     
+    # Прогноз заказов бара (demand_forecast.py) — после закрытия учётного дня
+    if FORECAST_HOUR:
+        scheduler.add_job(scheduled_forecast_training, trigger='cron', hour=int(FORECAST_HOUR), minute=30)
+    
     scheduler.start()
     logger.info("✅ Analytics scheduler started - отчеты будут отправляться ежедневно в 9:00")
     return scheduler
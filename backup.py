@@ -0,0 +1,251 @@
+# ==============================================================================
+# backup.py - Онлайн-бэкап SQLite через backup API (бот и командная строка)
+# ==============================================================================
+#
+# Только стандартная библиотека: скрипт запускается и на хосте без
+# зависимостей бота (scripts/backup-db.sh), и внутри бота (/backup).
+#
+#   python3 backup.py --db data/orders.db --dir ~/backups --keep-days 30
+#   python3 backup.py --verify ~/backups/orders_20260701_030000.db.gz
+
+import argparse
+import asyncio
+import gzip
+import os
+import shutil
+import sqlite3
+import sys
+import threading
+import time
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from replica import REPLICA_DIR, ReplicaError, restore
+
+DATA_DIR = os.getenv("DATA_DIR", "/app/data")
+DB_FILE = os.getenv("DB_FILE", "orders.db")
+BACKUP_DIR = os.getenv("BACKUP_DIR", f"{DATA_DIR}/backups")
+# Ротация: сколько последних бэкапов хранить и/или сколько дней (0 — без ограничения)
+BACKUP_KEEP = int(os.getenv("BACKUP_KEEP", "14"))
+BACKUP_KEEP_DAYS = int(os.getenv("BACKUP_KEEP_DAYS", "0"))
+# Копирование порциями страниц с паузой, чтобы не мешать записи заказов
+BACKUP_PAGES_PER_STEP = int(os.getenv("BACKUP_PAGES_PER_STEP", "256"))
+BACKUP_STEP_SLEEP = float(os.getenv("BACKUP_STEP_SLEEP_MS", "5")) / 1000
+
+BACKUP_PREFIX = "orders_"
+
+# Два бэкапа одновременно только удвоят нагрузку на диск
+_backup_lock = threading.Lock()
+
+
+class BackupError(Exception):
+    pass
+
+
+def create_backup(db_path: str = DB_FILE, backup_dir: str = BACKUP_DIR,
+                  pages: int = BACKUP_PAGES_PER_STEP, step_sleep: float = BACKUP_STEP_SLEEP,
+                  compress: bool = True, keep: int = BACKUP_KEEP, keep_days: int = BACKUP_KEEP_DAYS) -> Dict:
+    """
+    Консистентный снимок живой базы.
+
+    sqlite3 backup API копирует страницы порциями и перезапускается, если
+    база изменилась между шагами, поэтому файл не бывает «рваным» в отличие
+    от cp. Результат проверяется PRAGMA integrity_check, сжимается gzip и
+    старые бэкапы удаляются по правилам ротации.
+    """
+    if not os.path.exists(db_path):
+        raise BackupError(f"База не найдена: {db_path}")
+    if not _backup_lock.acquire(blocking=False):
+        raise BackupError("Бэкап уже выполняется")
+
+    try:
+        os.makedirs(backup_dir, exist_ok=True)
+        started = time.monotonic()
+        name = f"{BACKUP_PREFIX}{datetime.now().strftime('%Y%m%d_%H%M%S')}.db"
+        raw_path = os.path.join(backup_dir, name)
+        partial_path = raw_path + ".partial"
+        steps = 0
+
+        def progress(status, remaining, total):
+            nonlocal steps
+            steps += 1
+            if remaining and step_sleep:
+                time.sleep(step_sleep)
+
+        source = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+        target = sqlite3.connect(partial_path)
+        try:
+            source.backup(target, pages=pages, progress=progress)
+            page_count = target.execute("PRAGMA page_count").fetchone()[0]
+            integrity = verify_connection(target)
+        finally:
+            target.close()
+            source.close()
+
+        if integrity != "ok":
+            os.remove(partial_path)
+            raise BackupError(f"integrity_check не пройден: {integrity}")
+
+        os.replace(partial_path, raw_path)
+        return _finish_backup(raw_path, backup_dir, compress, keep, keep_days, started, {
+            "pages": page_count,
+            "steps": steps,
+            "integrity": integrity,
+        })
+    finally:
+        _backup_lock.release()
+
+
+def create_backup_from_replica(replica_dir: str = REPLICA_DIR, backup_dir: str = BACKUP_DIR,
+                               compress: bool = True, keep: int = BACKUP_KEEP,
+                               keep_days: int = BACKUP_KEEP_DAYS) -> Dict:
+    """
+    Бэкап из WAL-реплики (снапшот + сегменты) без обращения к основной базе.
+    Состояние — на момент последней синхронизации реплики.
+    """
+    if not _backup_lock.acquire(blocking=False):
+        raise BackupError("Бэкап уже выполняется")
+
+    try:
+        os.makedirs(backup_dir, exist_ok=True)
+        started = time.monotonic()
+        raw_path = os.path.join(backup_dir, f"{BACKUP_PREFIX}{datetime.now().strftime('%Y%m%d_%H%M%S')}.db")
+        try:
+            restored = restore(replica_dir, raw_path)
+        except ReplicaError as e:
+            raise BackupError(str(e))
+        return _finish_backup(raw_path, backup_dir, compress, keep, keep_days, started, {
+            "integrity": "ok",
+            "replica_generation": restored["generation"],
+            "restored_to": restored["restored_to"],
+        })
+    finally:
+        _backup_lock.release()
+
+
+def _finish_backup(raw_path: str, backup_dir: str, compress: bool, keep: int, keep_days: int,
+                   started: float, details: Dict) -> Dict:
+    """Сжатие проверенной копии и ротация"""
+    raw_size = os.path.getsize(raw_path)
+    path = raw_path
+    if compress:
+        path = raw_path + ".gz"
+        with open(raw_path, "rb") as src, gzip.open(path + ".partial", "wb", compresslevel=6) as dst:
+            shutil.copyfileobj(src, dst, 1024 * 1024)
+        os.replace(path + ".partial", path)
+        os.remove(raw_path)
+
+    removed = apply_retention(backup_dir, keep, keep_days, exclude=path)
+    return {
+        "path": path,
+        "size": os.path.getsize(path),
+        "raw_size": raw_size,
+        "seconds": round(time.monotonic() - started, 2),
+        "removed": removed,
+        **details,
+    }
+
+
+async def create_backup_async(**kwargs) -> Dict:
+    """create_backup в рабочем потоке — event loop бота не блокируется"""
+    return await asyncio.to_thread(create_backup, **kwargs)
+
+
+async def create_backup_from_replica_async(**kwargs) -> Dict:
+    return await asyncio.to_thread(create_backup_from_replica, **kwargs)
+
+
+def verify_connection(conn: sqlite3.Connection) -> str:
+    rows = conn.execute("PRAGMA integrity_check").fetchall()
+    return "ok" if rows == [("ok",)] else "; ".join(row[0] for row in rows[:5])
+
+
+def verify_backup(path: str) -> str:
+    """integrity_check готового бэкапа (.db или .db.gz)"""
+    if not path.endswith(".gz"):
+        with sqlite3.connect(f"file:{path}?mode=ro", uri=True) as conn:
+            return verify_connection(conn)
+
+    restored = path[:-3] + ".verify"
+    try:
+        with gzip.open(path, "rb") as src, open(restored, "wb") as dst:
+            shutil.copyfileobj(src, dst, 1024 * 1024)
+        conn = sqlite3.connect(restored)
+        try:
+            return verify_connection(conn)
+        finally:
+            conn.close()
+    finally:
+        if os.path.exists(restored):
+            os.remove(restored)
+
+
+def list_backups(backup_dir: str = BACKUP_DIR) -> List[str]:
+    """Бэкапы от новых к старым"""
+    if not os.path.isdir(backup_dir):
+        return []
+    names = [
+        name for name in os.listdir(backup_dir)
+        if name.startswith(BACKUP_PREFIX) and (name.endswith(".db") or name.endswith(".db.gz"))
+    ]
+    return [os.path.join(backup_dir, name) for name in sorted(names, reverse=True)]
+
+
+def apply_retention(backup_dir: str, keep: int, keep_days: int, exclude: Optional[str] = None) -> List[str]:
+    removed = []
+    cutoff = time.time() - keep_days * 86400 if keep_days else None
+    for index, path in enumerate(list_backups(backup_dir)):
+        if path == exclude:
+            continue
+        too_many = keep and index >= keep
+        too_old = cutoff is not None and os.path.getmtime(path) < cutoff
+        if too_many or too_old:
+            os.remove(path)
+            removed.append(os.path.basename(path))
+    return removed
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Онлайн-бэкап базы Pelikan Bot")
+    parser.add_argument("--db", default=DB_FILE, help="путь к базе")
+    parser.add_argument("--dir", default=BACKUP_DIR, help="каталог бэкапов")
+    parser.add_argument("--keep", type=int, default=BACKUP_KEEP, help="сколько последних хранить (0 — все)")
+    parser.add_argument("--keep-days", type=int, default=BACKUP_KEEP_DAYS, help="удалять старше N дней (0 — не удалять)")
+    parser.add_argument("--pages", type=int, default=BACKUP_PAGES_PER_STEP, help="страниц за шаг")
+    parser.add_argument("--no-compress", action="store_true", help="не сжимать gzip")
+    parser.add_argument("--from-replica", metavar="DIR", help="собрать бэкап из WAL-реплики, не читая базу")
+    parser.add_argument("--verify", metavar="FILE", help="только проверить готовый бэкап")
+    args = parser.parse_args()
+
+    if args.verify:
+        result = verify_backup(args.verify)
+        print(f"{'✅' if result == 'ok' else '❌'} {args.verify}: {result}")
+        return 0 if result == "ok" else 1
+
+    try:
+        if args.from_replica:
+            result = create_backup_from_replica(
+                args.from_replica, args.dir, compress=not args.no_compress,
+                keep=args.keep, keep_days=args.keep_days
+            )
+        else:
+            result = create_backup(
+                args.db, args.dir, pages=args.pages, compress=not args.no_compress,
+                keep=args.keep, keep_days=args.keep_days
+            )
+    except BackupError as e:
+        print(f"❌ {e}")
+        return 1
+
+    print(
+        f"✅ Backup created: {result['path']} "
+        f"({result['raw_size'] / 1024:.1f} KB → {result['size'] / 1024:.1f} KB, "
+        f"{result['seconds']} с, integrity_check: {result['integrity']})"
+    )
+    if result["removed"]:
+        print(f"🗑️ Удалены старые бэкапы: {', '.join(result['removed'])}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
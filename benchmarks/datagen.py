@@ -0,0 +1,176 @@
+# ==============================================================================
+# benchmarks/datagen.py - Синтетическая база заказов и отзывов для бенчмарков
+# ==============================================================================
+#
+# Схема создаётся тем же init_db, что и у бота (со всеми индексами и
+# триггерами), данные равномерно размазаны по последним --days дням.
+#
+# Запуск из корня репозитория:
+#   python benchmarks/datagen.py --size 100k
+#   python benchmarks/datagen.py --orders 50000 --reviews 5000 --out /tmp/custom.db
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import sqlite3
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+DATA_DIR = Path(__file__).resolve().parent / "data"
+SIZES = {"10k": 10_000, "100k": 100_000, "1m": 1_000_000}
+
+MENU = [
+    ("Капучино", 1200), ("Американо", 900), ("Латте", 1300), ("Чай зелёный", 700),
+    ("Лимонад", 1100), ("Пиво разливное", 1500), ("Мохито", 2500), ("Вода", 400),
+    ("Шашлык из курицы", 3200), ("Шашлык из баранины", 4200), ("Плов", 2500),
+    ("Салат Цезарь", 2400), ("Картофель фри", 1300), ("Лагман", 2200), ("Бешбармак", 3500),
+]
+STATUSES = ["выдан"] * 90 + ["готов"] * 4 + ["готовится"] * 3 + ["принят"] * 3
+REVIEW_STATUSES = ["approved"] * 70 + ["pending"] * 20 + ["rejected"] * 10
+NAMES = ["Айгерим", "Ерлан", "Ольга", "Дмитрий", "Асель", "Марат", "Светлана", "Нурлан", "Анна", "Руслан"]
+PROS = [
+    "Чистый пляж и тёплое озеро", "Вкусная кухня в столовой", "Приветливый персонал",
+    "Уютные бунгало", "Отличный вид на Алаколь", "Хорошая детская площадка",
+    "Быстро приносят заказы из бара", None,
+]
+CONS = [
+    "Медленный Wi-Fi", "Мало шезлонгов на пляже", "Шумно вечером", "Горячая вода с перебоями",
+    "Долго ждали заказ в баре", "Комары вечером", "Слабый кондиционер", None,
+]
+COMMENTS = [
+    "Приедем ещё следующим летом", "В целом всё понравилось", "Отдыхали семьёй, детям понравилось",
+    "Цена соответствует качеству", "Хотелось бы больше развлечений", None, None,
+]
+
+
+def build_schema(db_path: Path):
+    """Схема бота: init_db из bot.py на пустой базе"""
+    os.environ["DB_FILE"] = str(db_path)
+    os.environ.setdefault("BOT_TOKEN", "123456:BENCHMARK")
+    sys.path.insert(0, str(ROOT))
+    import bot
+    asyncio.run(bot.init_db())
+
+
+def order_rows(count: int, days: int, rooms: list, rng: random.Random):
+    end = time.time()
+    start = end - days * 86400
+    seq = {}
+    for _ in range(count):
+        created = rng.uniform(start, end)
+        second = int(created)
+        seq[second] = seq.get(second, -1) + 1
+        items = [
+            {"name": name, "price": price, "quantity": rng.randint(1, 3)}
+            for name, price in rng.sample(MENU, rng.randint(1, 5))
+        ]
+        created_utc = datetime.fromtimestamp(created, timezone.utc)
+        yield (
+            f"{second}{seq[second]:03d}",
+            rng.choice(NAMES),
+            rng.choice(rooms),
+            rng.randint(100_000_000, 999_999_999),
+            None,
+            json.dumps(items, ensure_ascii=False),
+            sum(item["price"] * item["quantity"] for item in items),
+            rng.choice(STATUSES),
+            datetime.fromtimestamp(created).strftime('%Y-%m-%d %H:%M:%S'),
+            None,
+            created_utc.strftime('%Y-%m-%d %H:%M:%S'),
+            rng.choice(rooms) if rng.random() < 0.6 else None,
+        )
+
+
+def review_rows(count: int, days: int, rooms: list, rng: random.Random):
+    end = datetime.now(timezone.utc)
+    for _ in range(count):
+        created = end - timedelta(seconds=rng.uniform(0, days * 86400))
+        # Оценки гостя коррелированы: общее впечатление плюс шум по категориям
+        base = rng.gauss(8, 1.6)
+        scores = [min(10, max(1, round(rng.gauss(base, 1.0)))) for _ in range(6)]
+        status = rng.choice(REVIEW_STATUSES)
+        name = rng.choice(NAMES)
+        room = rng.choice(rooms) if rng.random() < 0.85 else None
+        yield (
+            rng.randint(100_000_000, 999_999_999), None, name, room, *scores,
+            rng.choice(PROS), rng.choice(CONS), rng.choice(COMMENTS),
+            status, created.strftime('%Y-%m-%d %H:%M:%S'), name,
+            1 if status == "approved" and rng.random() < 0.9 else 0,
+            room,
+        )
+
+
+def insert_batched(conn: sqlite3.Connection, sql: str, rows, batch: int = 10_000) -> int:
+    total = 0
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == batch:
+            conn.executemany(sql, chunk)
+            total += len(chunk)
+            chunk = []
+    if chunk:
+        conn.executemany(sql, chunk)
+        total += len(chunk)
+    return total
+
+
+def generate(db_path: Path, orders: int, reviews: int, days: int, seed: int):
+    if db_path.exists():
+        db_path.unlink()
+    db_path.parent.mkdir(parents=True, exist_ok=True)
+    build_schema(db_path)
+    from qr_generator import ROOM_NUMBERS
+
+    rng = random.Random(seed)
+    conn = sqlite3.connect(db_path)
+    conn.execute("PRAGMA synchronous = OFF")
+    started = time.perf_counter()
+    with conn:
+        inserted_orders = insert_batched(conn, """
+            INSERT INTO orders (order_id, client_name, room, telegram_user_id, telegram_username,
+                                items, total, status, timestamp, pdf_path, created_at, scanned_room_number)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, order_rows(orders, days, ROOM_NUMBERS, rng))
+        inserted_reviews = insert_batched(conn, """
+            INSERT INTO reviews (telegram_user_id, telegram_username, guest_name, room_number,
+                                 cleanliness, comfort, location, facilities, staff, value_for_money,
+                                 pros, cons, comment, status, created_at, display_name, is_published,
+                                 scanned_room_number)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, review_rows(reviews, days, ROOM_NUMBERS, rng))
+    conn.execute("ANALYZE")
+    conn.close()
+    print(
+        f"{db_path}: {inserted_orders} заказов, {inserted_reviews} отзывов за {days} дней "
+        f"({time.perf_counter() - started:.1f} с, {db_path.stat().st_size / 1024 / 1024:.1f} MiB)"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Генерация синтетической базы для бенчмарков")
+    parser.add_argument("--size", choices=SIZES, default="10k", help="строк в orders и reviews")
+    parser.add_argument("--orders", type=int, help="переопределить число заказов")
+    parser.add_argument("--reviews", type=int, help="переопределить число отзывов")
+    parser.add_argument("--days", type=int, default=400, help="глубина истории")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--out", type=Path, help="путь к базе (по умолчанию benchmarks/data/bench_<size>.db)")
+    args = parser.parse_args()
+
+    rows = SIZES[args.size]
+    generate(
+        args.out or DATA_DIR / f"bench_{args.size}.db",
+        args.orders if args.orders is not None else rows,
+        args.reviews if args.reviews is not None else rows,
+        args.days,
+        args.seed,
+    )
+
+
+if __name__ == "__main__":
+    main()
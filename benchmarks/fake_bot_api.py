@@ -0,0 +1,289 @@
+# ==============================================================================
+# benchmarks/fake_bot_api.py - Локальный фейковый Bot API сервер для бенчмарков
+# ==============================================================================
+#
+# Отвечает на набор методов Bot API, которые вызывает бот, отдаёт апдейты
+# через getUpdates (long-poll) или POST на установленный webhook и
+# запоминает всё, что бот отправил.
+#
+# Запуск отдельно:  python benchmarks/fake_bot_api.py --port 8081
+# Бот:              TELEGRAM_API_URL=http://127.0.0.1:8081 python bot.py
+
+import argparse
+import asyncio
+import itertools
+import json
+import time
+from typing import Dict, List, Optional, Tuple, Union
+
+from aiohttp import ClientSession, ClientTimeout, web
+
+BOT_USER = {"id": 100000001, "is_bot": True, "first_name": "Pelikan Bench", "username": "pelikan_bench_bot"}
+
+# Ключ ожидания ответа: ("chat", chat_id) или ("callback", callback_query_id)
+WaitKey = Tuple[str, Union[int, str]]
+
+
+class FakeBotAPI:
+    """Фейковый Bot API: очередь апдейтов, webhook-доставка и журнал ответов бота"""
+
+    def __init__(self):
+        self.updates: "asyncio.Queue[Dict]" = asyncio.Queue()
+        self.update_ids = itertools.count(1)
+        self.message_ids = itertools.count(1)
+        self.callback_ids = itertools.count(1)
+        self.file_ids = itertools.count(1)
+        self.webhook_url: Optional[str] = None
+        self.webhook_secret: Optional[str] = None
+        self.sent: List[Dict] = []
+        self.calls: Dict[str, int] = {}
+        self._waiters: Dict[WaitKey, List[asyncio.Future]] = {}
+        self._client: Optional[ClientSession] = None
+
+        self.app = web.Application(client_max_size=50 * 1024 * 1024)
+        self.app.router.add_post("/bot{token}/{method}", self.handle_method)
+        self.app.on_cleanup.append(self._close_client)
+        self.methods = {
+            "getMe": self.get_me,
+            "getUpdates": self.get_updates,
+            "setWebhook": self.set_webhook,
+            "deleteWebhook": self.delete_webhook,
+            "setMyCommands": self.ok_true,
+            "sendMessage": self.send_message,
+            "sendDocument": self.send_document,
+            "sendPhoto": self.send_photo,
+            "editMessageText": self.edit_message_text,
+            "editMessageReplyMarkup": self.edit_message_reply_markup,
+            "answerCallbackQuery": self.answer_callback_query,
+        }
+
+    # ===== СЕРВЕР =====
+
+    async def handle_method(self, request: web.Request) -> web.StreamResponse:
+        method = request.match_info["method"]
+        self.calls[method] = self.calls.get(method, 0) + 1
+        handler = self.methods.get(method)
+        if handler is None:
+            return web.json_response(
+                {"ok": False, "error_code": 404, "description": f"Not Found: method {method} not implemented"},
+                status=404
+            )
+        params = await self._read_params(request)
+        received_at = time.perf_counter()
+        events: List[Tuple[WaitKey, Dict]] = []
+        result = await handler(params, events)
+
+        # Ожидающих будим только после отправки ответа боту: следующий апдейт
+        # сценария не должен обогнать продолжение текущего хендлера
+        response = web.json_response({"ok": True, "result": result})
+        try:
+            await response.prepare(request)
+            await response.write_eof()
+        except ConnectionResetError:
+            # Бот остановлен посреди long-poll getUpdates
+            return response
+        for key, payload in events:
+            for waiter in self._waiters.pop(key, []):
+                if not waiter.done():
+                    waiter.set_result((received_at, payload))
+        return response
+
+    @staticmethod
+    async def _read_params(request: web.Request) -> Dict:
+        if request.content_type == "application/json":
+            return await request.json()
+        params = {}
+        for key, value in (await request.post()).items():
+            if isinstance(value, str):
+                try:
+                    value = json.loads(value)
+                except ValueError:
+                    pass
+            params[key] = value
+        return params
+
+    async def start(self, host: str = "127.0.0.1", port: int = 8081) -> web.AppRunner:
+        runner = web.AppRunner(self.app)
+        await runner.setup()
+        await web.TCPSite(runner, host, port).start()
+        return runner
+
+    async def _close_client(self, app):
+        if self._client is not None:
+            await self._client.close()
+
+    # ===== МЕТОДЫ BOT API =====
+
+    async def ok_true(self, params: Dict, events: List):
+        return True
+
+    async def get_me(self, params: Dict, events: List):
+        return BOT_USER
+
+    async def get_updates(self, params: Dict, events: List):
+        if self.webhook_url:
+            # Как в настоящем API: при активном webhook getUpdates недоступен
+            return []
+        timeout = float(params.get("timeout") or 0)
+        batch = []
+        try:
+            batch.append(await asyncio.wait_for(self.updates.get(), timeout) if timeout else self.updates.get_nowait())
+        except (asyncio.TimeoutError, asyncio.QueueEmpty):
+            return []
+        while not self.updates.empty():
+            batch.append(self.updates.get_nowait())
+        return batch
+
+    async def set_webhook(self, params: Dict, events: List):
+        self.webhook_url = params["url"]
+        self.webhook_secret = params.get("secret_token")
+        return True
+
+    async def delete_webhook(self, params: Dict, events: List):
+        self.webhook_url = None
+        self.webhook_secret = None
+        return True
+
+    async def send_message(self, params: Dict, events: List):
+        return self._outgoing(params, events, text=str(params.get("text", "")))
+
+    async def send_document(self, params: Dict, events: List):
+        return self._outgoing(params, events, caption=params.get("caption"), document=self._file())
+
+    async def send_photo(self, params: Dict, events: List):
+        photo = {**self._file(), "width": 600, "height": 800}
+        return self._outgoing(params, events, caption=params.get("caption"), photo=[photo])
+
+    async def edit_message_text(self, params: Dict, events: List):
+        return self._outgoing(params, events, message_id=int(params["message_id"]), text=str(params.get("text", "")))
+
+    async def edit_message_reply_markup(self, params: Dict, events: List):
+        return self._outgoing(params, events, message_id=int(params["message_id"]), text="")
+
+    async def answer_callback_query(self, params: Dict, events: List):
+        events.append((("callback", str(params["callback_query_id"])), params))
+        return True
+
+    def _outgoing(self, params: Dict, events: List, message_id: int = None, **content) -> Dict:
+        chat_id = self._chat_id(params["chat_id"])
+        message = {
+            "message_id": message_id or next(self.message_ids),
+            "date": int(time.time()),
+            "chat": {"id": chat_id if isinstance(chat_id, int) else 0, "type": "private"},
+            "from": BOT_USER,
+            **{key: value for key, value in content.items() if value is not None},
+        }
+        if "reply_markup" in params:
+            message["reply_markup"] = params["reply_markup"]
+        self.sent.append(message)
+        events.append((("chat", chat_id), message))
+        return message
+
+    @staticmethod
+    def _chat_id(value) -> Union[int, str]:
+        # chat_id бывает и "@username" (уведомление клиенту по username)
+        try:
+            return int(value)
+        except (TypeError, ValueError):
+            return str(value)
+
+    def _file(self) -> Dict:
+        file_id = f"fake-file-{next(self.file_ids)}"
+        return {"file_id": file_id, "file_unique_id": file_id}
+
+    # ===== ОЖИДАНИЕ ОТВЕТОВ =====
+
+    def expect(self, key: WaitKey) -> asyncio.Future:
+        """Future, которое завершится (perf_counter, payload) при следующем ответе по ключу"""
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.setdefault(key, []).append(future)
+        return future
+
+    def expect_reply(self, chat_id: int) -> asyncio.Future:
+        return self.expect(("chat", chat_id))
+
+    def expect_callback_answer(self, callback_query_id: str) -> asyncio.Future:
+        return self.expect(("callback", callback_query_id))
+
+    # ===== АПДЕЙТЫ =====
+
+    @staticmethod
+    def make_user(user_id: int, username: str = None) -> Dict:
+        user = {"id": user_id, "is_bot": False, "first_name": f"Guest {user_id}"}
+        if username:
+            user["username"] = username
+        return user
+
+    def _message(self, user: Dict, **content) -> Dict:
+        return {
+            "message_id": next(self.message_ids),
+            "date": int(time.time()),
+            "chat": {"id": user["id"], "type": "private", "first_name": user["first_name"]},
+            "from": user,
+            **content,
+        }
+
+    def make_message_update(self, user_id: int, text: str, username: str = None) -> Dict:
+        entities = (
+            {"entities": [{"type": "bot_command", "offset": 0, "length": len(text.split()[0])}]}
+            if text.startswith("/") else {}
+        )
+        return {
+            "update_id": next(self.update_ids),
+            "message": self._message(self.make_user(user_id, username), text=text, **entities),
+        }
+
+    def make_web_app_data_update(self, user_id: int, data: Dict, username: str = None) -> Dict:
+        web_app_data = {"data": json.dumps(data, ensure_ascii=False), "button_text": "🍸 Бар"}
+        return {
+            "update_id": next(self.update_ids),
+            "message": self._message(self.make_user(user_id, username), web_app_data=web_app_data),
+        }
+
+    def make_callback_update(self, user_id: int, data: str, message_text: str = "",
+                             reply_markup: Dict = None, username: str = None) -> Dict:
+        """Нажатие inline-кнопки под сообщением бота с текстом message_text"""
+        user = self.make_user(user_id, username)
+        message = {
+            "message_id": next(self.message_ids),
+            "date": int(time.time()),
+            "chat": {"id": user_id, "type": "private", "first_name": user["first_name"]},
+            "from": BOT_USER,
+            "text": message_text,
+        }
+        if reply_markup:
+            message["reply_markup"] = reply_markup
+        return {
+            "update_id": next(self.update_ids),
+            "callback_query": {
+                "id": str(next(self.callback_ids)),
+                "from": user,
+                "chat_instance": str(user_id),
+                "message": message,
+                "data": data,
+            },
+        }
+
+    async def deliver(self, update: Dict):
+        """Отдать апдейт боту тем способом, который он сейчас использует"""
+        if not self.webhook_url:
+            await self.updates.put(update)
+            return
+        if self._client is None:
+            self._client = ClientSession(timeout=ClientTimeout(total=30))
+        headers = {"X-Telegram-Bot-Api-Secret-Token": self.webhook_secret} if self.webhook_secret else {}
+        async with self._client.post(self.webhook_url, json=update, headers=headers) as response:
+            response.raise_for_status()
+
+
+async def _serve(port: int):
+    api = FakeBotAPI()
+    await api.start(port=port)
+    print(f"Fake Bot API: http://127.0.0.1:{port}")
+    await asyncio.Event().wait()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Фейковый Bot API для локальных бенчмарков")
+    parser.add_argument("--port", type=int, default=8081)
+    asyncio.run(_serve(parser.parse_args().port))
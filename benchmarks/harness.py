@@ -0,0 +1,84 @@
+# ==============================================================================
+# benchmarks/harness.py - Запуск bot.py против фейкового Bot API
+# ==============================================================================
+
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import AsyncIterator, Dict, List
+
+from fake_bot_api import FakeBotAPI
+
+ROOT = Path(__file__).resolve().parent.parent
+STAFF_ID = 700000001
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def percentile(values: List[float], pct: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+async def wait_until(predicate, timeout: float, what: str):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            raise TimeoutError(f"Бот не успел {what} за {timeout} с")
+        await asyncio.sleep(0.05)
+
+
+@asynccontextmanager
+async def running_bot(mode: str = "polling", extra_env: Dict[str, str] = None) -> AsyncIterator[FakeBotAPI]:
+    """
+    Фейковый Bot API + bot.py отдельным процессом с временной базой и DATA_DIR.
+
+    STAFF_ID прописан администратором, чтобы сценарии могли нажимать
+    кнопки статуса заказа. Выход из контекста останавливает бота.
+    """
+    api = FakeBotAPI()
+    api_port, bot_port = free_port(), free_port()
+    runner = await api.start(port=api_port)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        env = {
+            **os.environ,
+            "BOT_TOKEN": "123456:BENCHMARK",
+            "ADMIN_IDS": str(STAFF_ID),
+            "DB_FILE": os.path.join(tmp, "bench.db"),
+            "DATA_DIR": tmp,
+            "WEBHOOK_PORT": str(bot_port),
+            "TELEGRAM_API_URL": f"http://127.0.0.1:{api_port}",
+            "BOT_MODE": mode,
+            "WEBHOOK_BASE_URL": f"http://127.0.0.1:{bot_port}",
+            **(extra_env or {}),
+        }
+        log_path = os.path.join(tmp, "bot.log")
+        with open(log_path, "wb") as log:
+            process = subprocess.Popen([sys.executable, "-u", "bot.py"], cwd=ROOT, env=env, stdout=log, stderr=log)
+        try:
+            if mode == "webhook":
+                await wait_until(lambda: api.webhook_url is not None, 30, "установить webhook")
+            else:
+                await wait_until(lambda: api.calls.get("getUpdates", 0) > 0, 30, "начать getUpdates")
+            api.bot_log_path = log_path
+            api.bot_url = f"http://127.0.0.1:{bot_port}"
+            yield api
+        finally:
+            process.terminate()
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+            await runner.cleanup()
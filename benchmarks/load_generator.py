@@ -0,0 +1,213 @@
+# ==============================================================================
+# benchmarks/load_generator.py - Нагрузочный прогон бота на фейковом Bot API
+# ==============================================================================
+#
+# Виртуальные гости параллельно проигрывают сценарии:
+#   start  — /start review_<номер> (QR-код из номера)
+#   order  — заказ из WebApp (web_app_data), затем персонал жмёт кнопки
+#            статуса «готовится» → «готов» → «выдан»
+#   survey — /start review_<номер> и полный опрос из 12 шагов
+#
+# Латентность шага — от доставки апдейта до ответа бота (сообщение в чат
+# или answerCallbackQuery для кнопок статуса).
+#
+# Запуск из корня репозитория:
+#   python benchmarks/load_generator.py --users 20 --sessions 300 --mix start=3,order=2,survey=1
+
+import argparse
+import asyncio
+import itertools
+import json
+import random
+import re
+import statistics
+import sys
+import time
+from collections import defaultdict
+from pathlib import Path
+from typing import Dict, List
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from harness import STAFF_ID, percentile, running_bot
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from qr_generator import ROOM_NUMBERS
+
+MENU = [
+    ("Капучино", 1200), ("Американо", 900), ("Лимонад", 1100), ("Пиво разливное", 1500),
+    ("Шашлык из курицы", 3200), ("Плов", 2500), ("Салат Цезарь", 2400), ("Картофель фри", 1300),
+]
+SCORE_CRITERIA = ["cleanliness", "comfort", "location", "facilities", "staff", "value"]
+ORDER_ID_RE = re.compile(r"#(\d+)")
+
+
+class LoadRun:
+    def __init__(self, api, step_timeout: float, think: float):
+        self.api = api
+        self.step_timeout = step_timeout
+        self.think = think
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, int] = defaultdict(int)
+        self.user_ids = itertools.count(800000001)
+
+    async def step(self, label: str, update: Dict, wait_key) -> Dict:
+        """Доставить апдейт и дождаться ответа бота; None при таймауте"""
+        reply = self.api.expect(wait_key)
+        started = time.perf_counter()
+        await self.api.deliver(update)
+        try:
+            finished, payload = await asyncio.wait_for(reply, self.step_timeout)
+        except asyncio.TimeoutError:
+            self.errors[label] += 1
+            return None
+        self.latencies[label].append((finished - started) * 1000)
+        if self.think:
+            await asyncio.sleep(random.uniform(0, 2 * self.think))
+        return payload
+
+    async def message(self, label: str, user_id: int, text: str):
+        return await self.step(label, self.api.make_message_update(user_id, text), ("chat", user_id))
+
+    async def callback(self, label: str, user_id: int, data: str, wait_chat: bool = True, **kwargs):
+        update = self.api.make_callback_update(user_id, data, **kwargs)
+        key = ("chat", user_id) if wait_chat else ("callback", update["callback_query"]["id"])
+        return await self.step(label, update, key)
+
+    # ===== СЦЕНАРИИ =====
+
+    async def scenario_start(self):
+        user_id = next(self.user_ids)
+        await self.message("start_deeplink", user_id, f"/start review_{random.choice(ROOM_NUMBERS)}")
+
+    async def scenario_order(self):
+        user_id = next(self.user_ids)
+        items = [
+            {"name": name, "price": price, "quantity": random.randint(1, 3)}
+            for name, price in random.sample(MENU, random.randint(1, 4))
+        ]
+        order = {
+            "name": f"Гость {user_id}",
+            "room": random.choice(ROOM_NUMBERS),
+            "items": items,
+            "total": sum(item["price"] * item["quantity"] for item in items),
+        }
+        reply = await self.step(
+            "webapp_order", self.api.make_web_app_data_update(user_id, order), ("chat", user_id)
+        )
+        match = ORDER_ID_RE.search((reply or {}).get("text", ""))
+        if not match:
+            if reply is not None:
+                self.errors["webapp_order"] += 1
+            return
+
+        order_id = match.group(1)
+        markup = {"inline_keyboard": [[
+            {"text": status, "callback_data": f"status:{order_id}:{status}"}
+            for status in ("готовится", "готов", "выдан")
+        ]]}
+        for status in ("готовится", "готов", "выдан"):
+            await self.callback(
+                "status_callback", STAFF_ID, f"status:{order_id}:{status}", wait_chat=False,
+                message_text=f"🆕 <b>#{order_id}</b>\n📊 Статус: принят", reply_markup=markup
+            )
+
+    async def scenario_survey(self):
+        user_id = next(self.user_ids)
+        if await self.message("start_deeplink", user_id, f"/start review_{random.choice(ROOM_NUMBERS)}") is None:
+            return
+        # Номер известен из QR-кода, поэтому шаг «номер комнаты» бот пропускает
+        steps = [("callback", "review_start"), ("message", f"Гость {user_id}")]
+        steps += [("callback", f"score_{criteria}_{random.randint(4, 10)}") for criteria in SCORE_CRITERIA]
+        steps += [
+            ("message", random.choice(["Чистый пляж", "Вкусная кухня", "Приветливый персонал"])),
+            ("message", random.choice(["Медленный Wi-Fi", "Мало шезлонгов", "Шумно вечером"])),
+            ("message", "Приедем ещё"),
+            ("callback", "review_submit"),
+        ]
+        for kind, value in steps:
+            if kind == "callback":
+                reply = await self.callback("survey_step", user_id, value)
+            else:
+                reply = await self.message("survey_step", user_id, value)
+            if reply is None:
+                return
+
+    # ===== ПРОГОН =====
+
+    async def run(self, users: int, sessions: int, mix: Dict[str, float]) -> float:
+        scenarios = {"start": self.scenario_start, "order": self.scenario_order, "survey": self.scenario_survey}
+        names = list(mix)
+        plan = random.choices(names, weights=[mix[name] for name in names], k=sessions)
+        queue: "asyncio.Queue[str]" = asyncio.Queue()
+        for name in plan:
+            queue.put_nowait(name)
+
+        async def virtual_user():
+            while not queue.empty():
+                await scenarios[queue.get_nowait()]()
+
+        started = time.perf_counter()
+        await asyncio.gather(*(virtual_user() for _ in range(users)))
+        return time.perf_counter() - started
+
+
+def parse_mix(value: str) -> Dict[str, float]:
+    mix = {}
+    for part in value.split(","):
+        name, _, weight = part.partition("=")
+        if name not in ("start", "order", "survey"):
+            raise argparse.ArgumentTypeError(f"неизвестный сценарий: {name}")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Нагрузочный прогон бота на фейковом Bot API")
+    parser.add_argument("--mode", choices=["polling", "webhook"], default="polling")
+    parser.add_argument("--users", type=int, default=10, help="параллельных виртуальных гостей")
+    parser.add_argument("--sessions", type=int, default=100, help="всего сценариев")
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix("start=3,order=2,survey=1"))
+    parser.add_argument("--think", type=float, default=0.0, help="средняя пауза между шагами, с")
+    parser.add_argument("--timeout", type=float, default=30.0, help="таймаут ответа на шаг, с")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--json", dest="json_path", help="сохранить результаты в JSON")
+    args = parser.parse_args()
+    random.seed(args.seed)
+
+    async with running_bot(args.mode) as api:
+        load = LoadRun(api, args.timeout, args.think)
+        elapsed = await load.run(args.users, args.sessions, args.mix)
+
+    total = sum(len(values) for values in load.latencies.values())
+    print(f"mode={args.mode} users={args.users} sessions={args.sessions} elapsed={elapsed:.2f}s")
+    print(f"throughput: {total / elapsed:.1f} updates/s, {args.sessions / elapsed:.1f} sessions/s\n")
+    print(f"{'step':<18}{'n':>7}{'errors':>8}{'p50, ms':>10}{'p99, ms':>10}{'mean, ms':>10}")
+
+    results = {"mode": args.mode, "users": args.users, "sessions": args.sessions,
+               "elapsed_s": elapsed, "updates_per_s": total / elapsed, "steps": {}}
+    for label in sorted(set(load.latencies) | set(load.errors)):
+        values = load.latencies.get(label, [])
+        stats = {
+            "n": len(values),
+            "errors": load.errors.get(label, 0),
+            "p50_ms": percentile(values, 50) if values else None,
+            "p99_ms": percentile(values, 99) if values else None,
+            "mean_ms": statistics.mean(values) if values else None,
+        }
+        results["steps"][label] = stats
+        if values:
+            print(f"{label:<18}{stats['n']:>7}{stats['errors']:>8}"
+                  f"{stats['p50_ms']:>10.2f}{stats['p99_ms']:>10.2f}{stats['mean_ms']:>10.2f}")
+        else:
+            print(f"{label:<18}{0:>7}{stats['errors']:>8}{'-':>10}{'-':>10}{'-':>10}")
+
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,126 @@
+# ==============================================================================
+# benchmarks/restore_bench.py - Время восстановления из WAL-реплики
+# ==============================================================================
+#
+# Копия базы из datagen.py реплицируется, пока пишутся синтетические заказы,
+# затем замеряется восстановление: последняя точка и точка посередине
+# (снапшот + сегменты WAL). Результат сверяется с основной базой.
+#
+# Запуск из корня репозитория:
+#   python benchmarks/restore_bench.py --db benchmarks/data/bench_100k.db --seconds 30 --rate 50
+
+import argparse
+import json
+import os
+import random
+import shutil
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from replica import Replicator, list_generations, restore  # noqa: E402
+
+ITEMS = json.dumps([{"name": "Капучино", "price": 1200, "quantity": 2}], ensure_ascii=False)
+
+
+def write_orders(db_path: str, seconds: float, rate: float, marks: list):
+    """Заказы с частотой rate/с отдельными короткими соединениями, как у бота"""
+    deadline = time.monotonic() + seconds
+    written = 0
+    while time.monotonic() < deadline:
+        conn = sqlite3.connect(db_path, timeout=10)
+        with conn:
+            conn.execute("""
+                INSERT INTO orders (order_id, client_name, room, telegram_user_id, items, total, status, timestamp)
+                VALUES (?, 'bench', 'Бунгало (2+1) 401', ?, ?, 2400, 'принят', ?)
+            """, (f"bench{written}", random.randint(1, 10**9), ITEMS, datetime.now().strftime('%Y-%m-%d %H:%M:%S')))
+            if written % 10 == 0:
+                conn.execute("UPDATE orders SET status = 'выдан' WHERE order_id = ?", (f"bench{written // 2}",))
+        conn.close()
+        written += 1
+        if written % max(1, int(rate)) == 0:
+            marks.append(datetime.now())
+        time.sleep(1 / rate)
+    return written
+
+
+def count_orders(db_path: str) -> tuple:
+    with sqlite3.connect(db_path) as conn:
+        return conn.execute("SELECT COUNT(*), SUM(status = 'выдан') FROM orders").fetchone()
+
+
+def timed_restore(replica_dir: str, target: str, at=None) -> dict:
+    started = time.perf_counter()
+    result = restore(replica_dir, target, at)
+    result["wall_ms"] = round((time.perf_counter() - started) * 1000, 1)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк восстановления из WAL-реплики")
+    parser.add_argument("--db", type=Path, required=True, help="база из datagen.py (копируется)")
+    parser.add_argument("--seconds", type=float, default=20, help="длительность записи")
+    parser.add_argument("--rate", type=float, default=50, help="заказов в секунду")
+    parser.add_argument("--sync-interval", type=float, default=1.0)
+    parser.add_argument("--json", action="store_true", help="вывести результат в JSON")
+    args = parser.parse_args()
+
+    if not args.db.exists():
+        parser.error(f"{args.db} не найдена — создайте её: python benchmarks/datagen.py")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "orders.db")
+        replica_dir = os.path.join(tmp, "replica")
+        shutil.copy(args.db, db_path)
+
+        replicator = Replicator(db_path, replica_dir, interval=args.sync_interval)
+        started = time.perf_counter()
+        replicator.start()
+        first_snapshot_s = time.perf_counter() - started
+
+        marks = []
+        written = write_orders(db_path, args.seconds, args.rate, marks)
+        time.sleep(args.sync_interval * 2)
+        replicator.stop()
+        expected = count_orders(db_path)
+
+        generation = list_generations(replica_dir)[-1]
+        snapshot_bytes = sum(os.path.getsize(path) for _, _, path in generation["snapshots"])
+        wal_bytes = sum(os.path.getsize(path) for _, _, path in generation["segments"])
+
+        latest = timed_restore(replica_dir, os.path.join(tmp, "latest.db"))
+        restored = count_orders(latest["path"])
+        middle = timed_restore(replica_dir, os.path.join(tmp, "middle.db"), marks[len(marks) // 2]) if marks else None
+
+        report = {
+            "db": args.db.name,
+            "db_mib": round(os.path.getsize(db_path) / 1024 / 1024, 2),
+            "orders_written": written,
+            "generations": replicator.generations_started,
+            "first_snapshot_s": round(first_snapshot_s, 3),
+            "snapshot_gz_mib": round(snapshot_bytes / 1024 / 1024, 2),
+            "wal_segments": len(generation["segments"]),
+            "wal_gz_kib": round(wal_bytes / 1024, 1),
+            "restore_latest_ms": latest["wall_ms"],
+            "restore_latest_frames": latest["frames"],
+            "restore_middle_ms": middle["wall_ms"] if middle else None,
+            "restore_middle_segments": middle["segments"] if middle else None,
+            "matches_primary": restored == expected,
+        }
+
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+        return
+    for key, value in report.items():
+        print(f"{key:<26}{value}")
+
+
+if __name__ == "__main__":
+    main()
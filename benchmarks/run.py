@@ -0,0 +1,202 @@
+# ==============================================================================
+# benchmarks/run.py - Замеры рендеров, запросов и аналитики на синтетической базе
+# ==============================================================================
+#
+# Запуск из корня репозитория (базу сначала создать через datagen.py):
+#   python benchmarks/run.py --db benchmarks/data/bench_100k.db
+#   python benchmarks/run.py --db benchmarks/data/bench_100k.db --only analytics --baseline benchmarks/results/old.json
+#
+# Результаты пишутся в benchmarks/results/<время>_<база>.json
+
+import argparse
+import asyncio
+import inspect
+import json
+import os
+import platform
+import re
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+RESULTS_DIR = Path(__file__).resolve().parent / "results"
+
+SAMPLE_ORDER = {
+    "name": "Айгерим",
+    "room": "Бунгало (2+1) 401",
+    "telegram_username": "guest",
+    "timestamp": "2026-07-15 14:30:00",
+    "total": 14300,
+    "items": [
+        {"name": "Шашлык из баранины", "price": 4200, "quantity": 2},
+        {"name": "Плов", "price": 2500, "quantity": 1},
+        {"name": "Лимонад", "price": 1100, "quantity": 3},
+        {"name": "Салат Цезарь", "price": 2400, "quantity": 1},
+    ],
+}
+
+
+def load_modules(db_path: Path, data_dir: str):
+    """Модули бота читают DB_FILE при импорте — окружение задаём до импорта"""
+    os.environ["DB_FILE"] = str(db_path)
+    os.environ["DATA_DIR"] = data_dir
+    os.environ.setdefault("BOT_TOKEN", "123456:BENCHMARK")
+    sys.path.insert(0, str(ROOT))
+    import analytics_handler
+    import bot
+    import exporter
+    import qr_generator
+    import reviews_query
+    from reviews_cache import PublishedReviewsSnapshot
+
+    # База из старого datagen.py — схема доводится тем же init_db (business_day, avg_score)
+    asyncio.run(bot.init_db())
+    if not os.path.exists(qr_generator.LOGO_PATH):
+        # Вне контейнера логотип лежит в корне репозитория
+        qr_generator.LOGO_PATH = str(ROOT / "logo.png")
+    return analytics_handler, bot, exporter, qr_generator, reviews_query, PublishedReviewsSnapshot
+
+
+def build_benchmarks(db_path: Path, data_dir: str) -> dict:
+    analytics_handler, bot, exporter, qr_generator, reviews_query, PublishedReviewsSnapshot = load_modules(db_path, data_dir)
+    from business_day import business_days_ago, business_today
+    import search_index
+    import demand_forecast
+    today = business_today()
+    month_ago = business_days_ago(30)
+    analytics = asyncio.run(analytics_handler.get_reviews_analytics(90))
+
+    async def reviews_snapshot_rebuild():
+        snapshot = PublishedReviewsSnapshot(str(db_path))
+        await snapshot.get()
+
+    benchmarks = {
+        "render.generate_receipt_pdf": lambda: bot.generate_receipt_pdf("bench", SAMPLE_ORDER),
+        "render.generate_receipt_image": lambda: bot.generate_receipt_image("bench", SAMPLE_ORDER),
+        "qr.generate_qr_code": lambda: qr_generator.generate_qr_code("Бунгало (2+1) 401"),
+        "qr.generate_qr_pdf_all_rooms": qr_generator.generate_qr_pdf_all_rooms,
+        "charts.generate_trend_chart": lambda: analytics_handler.generate_trend_chart(analytics["daily_stats"]),
+        "charts.generate_category_chart": lambda: analytics_handler.generate_category_chart(analytics["category_averages"]),
+        "charts.generate_distribution_chart": lambda: analytics_handler.generate_distribution_chart(analytics["rating_distribution"]),
+        "api.reviews_snapshot_rebuild": reviews_snapshot_rebuild,
+        "api.reviews_page_first": lambda: reviews_query.query_published_reviews({"limit": 20}),
+        "api.reviews_page_min_score": lambda: reviews_query.query_published_reviews({"limit": 20, "min_score": 9.0}),
+        "api.reviews_page_room_type": lambda: reviews_query.query_published_reviews({"limit": 20, "room_type": "Бунгало (2+1)"}),
+        "api.reviews_summary": reviews_query.get_reviews_summary,
+        "stats.day_stats": lambda: bot.get_day_stats(today),
+        "export.day_csv": lambda: exporter.export_orders(today, today, "csv", export_dir=data_dir),
+        "export.month_csv": lambda: exporter.export_orders(month_ago, today, "csv", export_dir=data_dir),
+        "search.reviews": lambda: search_index.search("горячая вода", str(db_path), orders=False),
+        "search.orders": lambda: search_index.search("цезарь", str(db_path), reviews=False),
+        "forecast.train": lambda: demand_forecast.train_forecast(str(db_path), os.path.join(data_dir, "archive")),
+        "forecast.read": lambda: demand_forecast.forecast(3, str(db_path)),
+    }
+    for days in (7, 30, 90, 365):
+        benchmarks[f"analytics.get_reviews_analytics_{days}d"] = (
+            lambda days=days: analytics_handler.get_reviews_analytics(days)
+        )
+    return benchmarks
+
+
+def measure(fn, repeat: int) -> dict:
+    def call():
+        result = fn()
+        if inspect.isawaitable(result):
+            return asyncio.run(_await(result))
+        return result
+
+    call()  # прогрев: импорты, шрифты, кэш страниц SQLite
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        call()
+        timings.append((time.perf_counter() - started) * 1000)
+    return {
+        "repeat": repeat,
+        "min_ms": round(min(timings), 3),
+        "median_ms": round(statistics.median(timings), 3),
+        "mean_ms": round(statistics.mean(timings), 3),
+        "max_ms": round(max(timings), 3),
+    }
+
+
+async def _await(awaitable):
+    return await awaitable
+
+
+def environment(db_path: Path) -> dict:
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True
+        ).stdout.strip()
+    except OSError:
+        commit = None
+    with sqlite3.connect(db_path) as conn:
+        orders = conn.execute("SELECT COUNT(*) FROM orders").fetchone()[0]
+        reviews = conn.execute("SELECT COUNT(*) FROM reviews").fetchone()[0]
+    return {
+        "started_at": datetime.now().isoformat(timespec="seconds"),
+        "git_commit": commit,
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "platform": platform.platform(),
+        "db": db_path.name,
+        "orders": orders,
+        "reviews": reviews,
+    }
+
+
+def print_comparison(results: dict, baseline_path: Path):
+    baseline = json.loads(baseline_path.read_text(encoding="utf-8"))["results"]
+    print(f"\nСравнение с {baseline_path.name} (median):")
+    for name, stats in results.items():
+        if name not in baseline:
+            continue
+        old, new = baseline[name]["median_ms"], stats["median_ms"]
+        ratio = new / old if old else float("inf")
+        marker = "  🔴" if ratio > 1.2 else "  🟢" if ratio < 0.8 else ""
+        print(f"{name:<44}{old:>10.2f} → {new:>10.2f} ms  x{ratio:.2f}{marker}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарки рендеров, запросов и аналитики")
+    parser.add_argument("--db", type=Path, required=True, help="база из datagen.py")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--only", help="регулярное выражение по имени бенчмарка")
+    parser.add_argument("--out", type=Path, help="файл результатов (по умолчанию benchmarks/results/...)")
+    parser.add_argument("--baseline", type=Path, help="сравнить с предыдущим JSON")
+    args = parser.parse_args()
+
+    if not args.db.exists():
+        parser.error(f"{args.db} не найдена — создайте её: python benchmarks/datagen.py")
+
+    with tempfile.TemporaryDirectory() as data_dir:
+        benchmarks = build_benchmarks(args.db.resolve(), data_dir)
+        pattern = re.compile(args.only) if args.only else None
+        results = {}
+        print(f"{'benchmark':<44}{'median, ms':>12}{'min, ms':>10}{'max, ms':>10}")
+        for name, fn in benchmarks.items():
+            if pattern and not pattern.search(name):
+                continue
+            results[name] = measure(fn, args.repeat)
+            stats = results[name]
+            print(f"{name:<44}{stats['median_ms']:>12.2f}{stats['min_ms']:>10.2f}{stats['max_ms']:>10.2f}")
+
+    report = {"meta": environment(args.db), "results": results}
+    out = args.out or RESULTS_DIR / f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{args.db.stem}.json"
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+    print(f"\nРезультаты: {out}")
+
+    if args.baseline:
+        print_comparison(results, args.baseline)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+# ==============================================================================
+# benchmarks/webhook_latency.py - Задержка ответа бота: long polling против webhook
+# ==============================================================================
+#
+# Поднимает benchmarks/fake_bot_api.py, запускает bot.py отдельным процессом
+# в каждом режиме и меряет время от появления апдейта /help в Bot API до
+# прихода ответного sendMessage.
+#
+# Запуск из корня репозитория:
+#   python benchmarks/webhook_latency.py --requests 200
+
+import argparse
+import asyncio
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from harness import percentile, running_bot
+
+BENCH_USER_ID = 555000111
+
+
+async def run_mode(mode: str, requests: int, warmup: int) -> list:
+    async with running_bot(mode) as api:
+        latencies = []
+        for i in range(warmup + requests):
+            reply = api.expect_reply(BENCH_USER_ID)
+            update = api.make_message_update(BENCH_USER_ID, "/help")
+            started = time.perf_counter()
+            await api.deliver(update)
+            finished, _ = await asyncio.wait_for(reply, 10)
+            if i >= warmup:
+                latencies.append((finished - started) * 1000)
+        return latencies
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Сравнение задержки polling/webhook на фейковом Bot API")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--warmup", type=int, default=10)
+    parser.add_argument("--modes", default="polling,webhook")
+    args = parser.parse_args()
+
+    print(f"{'mode':<10}{'n':>6}{'p50, ms':>10}{'p99, ms':>10}{'mean, ms':>10}")
+    for mode in args.modes.split(","):
+        latencies = await run_mode(mode, args.requests, args.warmup)
+        print(
+            f"{mode:<10}{len(latencies):>6}"
+            f"{percentile(latencies, 50):>10.2f}{percentile(latencies, 99):>10.2f}"
+            f"{statistics.mean(latencies):>10.2f}"
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
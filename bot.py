@@ -2,6 +2,8 @@ import asyncio
 import logging
 import os
 import json
+import html
+import secrets
 from datetime import datetime
 import aiosqlite
 from aiohttp import web
@@ -15,8 +17,10 @@ from reportlab.pdfbase.ttfonts import TTFont
 from reportlab.lib.colors import black
 from PIL import Image, ImageDraw, ImageFont
 import tempfile
-import shutil
 from aiogram.client.default import DefaultBotProperties
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
 from aiogram.filters import Command, CommandObject
 from aiogram.fsm.storage.memory import MemoryStorage
 from aiogram.fsm.context import FSMContext
@@ -25,7 +29,7 @@ from aiogram.types import (
     Message, CallbackQuery,
     InlineKeyboardMarkup, InlineKeyboardButton,
     WebAppInfo,
-    FSInputFile)
+    FSInputFile, BufferedInputFile)
 
 
 # === Глобальный tracking для QR кодов ===
@@ -36,6 +40,38 @@ from navigation_handler import router as navigation_router
 from analytics_handler import setup_scheduler
 from analytics_commands import analytics_router
 from qr_generator import qr_router
+from reviews_cache import REVIEWS_CACHE_SCHEMA, REVIEWS_CACHE_MAX_AGE, published_reviews_snapshot, accepts_gzip
+from reviews_query import ensure_reviews_query_schema, parse_review_filters, query_published_reviews, get_reviews_summary
+from loop_monitor import loop_monitor, perf_router
+from profiler import profile_router, profile_endpoint, track_object
+from chunked_upload import send_file_chunked
+from exporter import EXPORT_SCHEMA, cleanup_exports, parse_export_args, start_export
+from business_day import BUSINESS_DAY_CUTOFF_HOUR, business_today, migrate_business_day
+from live_stats import LIVE_STATS_VERIFY, live_stats
+from search_index import SearchError, migrate_search_index, search_async
+from review_themes import migrate_themes_index
+from review_guard import migrate_review_guard
+from rating_anomaly import rating_monitor
+from demand_forecast import FORECAST_DAYS, ForecastError, forecast_async, format_forecast, generate_forecast_chart
+from order_history import compare_with_last_year_async, parse_period
+from retention import RETENTION_DAYS, RETENTION_HOUR, RetentionError, run_retention_async, upgrade_archives
+from backup import create_backup_async, create_backup_from_replica_async
+from replica import REPLICA_DIR, replicator
+from metrics import setup_bot_metrics, register_commands, instrument_aiosqlite, http_metrics_middleware, metrics_endpoint
+from order_status import order_status_cache, STATUS_EMOJI, STATUS_LONG_POLL_MAX
+from order_intake import (
+    IDEMPOTENCY_SCHEMA,
+    order_id_generator,
+    resolve_idempotency_key,
+    claim_idempotency_key,
+    lookup_idempotency_keys,
+    existing_order_ids,
+    idempotency_row,
+    store_idempotent_result,
+    store_idempotent_results,
+    release_idempotency_key,
+    purge_expired_idempotency_keys
+)
 # ==================== НАСТРОЙКИ ====================
 
 load_dotenv()
@@ -64,19 +100,47 @@ def has_permission(user_id: int, permission: str) -> bool:
     return role and permission in permissions.get(role, [])
 
 DB_FILE = os.getenv("DB_FILE", "orders.db")
+# Каталог для накладных и выгрузок (в контейнере — смонтированный том)
+DATA_DIR = os.getenv("DATA_DIR", "/app/data")
 WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", "8080"))
 ALLOWED_ORIGIN = os.getenv("ALLOWED_ORIGIN", "https://parkpelikan-alakol.kz")
 
+# Режим получения апдейтов: polling (по умолчанию) или webhook на том же порту, что и HTTP API
+BOT_MODE = os.getenv("BOT_MODE", "polling").lower()
+WEBHOOK_BASE_URL = os.getenv("WEBHOOK_BASE_URL", "")
+TELEGRAM_WEBHOOK_PATH = os.getenv("TELEGRAM_WEBHOOK_PATH", "/telegram/webhook")
+# Если секрет не задан — генерируем на запуск: set_webhook всё равно вызывается при старте
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET") or secrets.token_urlsafe(32)
+# Свой Bot API сервер (локальный telegram-bot-api или фейковый для бенчмарков)
+TELEGRAM_API_URL = os.getenv("TELEGRAM_API_URL")
+
+if BOT_MODE == "webhook" and not WEBHOOK_BASE_URL:
+    raise RuntimeError("BOT_MODE=webhook требует WEBHOOK_BASE_URL")
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-bot = Bot(token=BOT_TOKEN, default=DefaultBotProperties(parse_mode="HTML"))
+bot = Bot(
+    token=BOT_TOKEN,
+    session=AiohttpSession(api=TelegramAPIServer.from_base(TELEGRAM_API_URL)) if TELEGRAM_API_URL else None,
+    default=DefaultBotProperties(parse_mode="HTML")
+)
 dp = Dispatcher(storage=MemoryStorage())
+setup_bot_metrics(dp, bot)
+instrument_aiosqlite()
+# Размеры in-memory структур в отчёте /profile <сек> mem
+track_object("user_room_tracking", lambda: user_room_tracking)
+track_object("fsm_storage", lambda: dp.storage.storage)
+track_object("order_status_cache", lambda: order_status_cache._entries)
+track_object("live_stats", lambda: live_stats._orders)
+track_object("rating_monitor", lambda: rating_monitor.metrics)
 
 # ==================== БАЗА ДАННЫХ ====================
 
 async def init_db():
     async with aiosqlite.connect(DB_FILE) as db:
+        # Действует только для новой базы; существующую переводит retention.py --convert-vacuum
+        await db.execute("PRAGMA auto_vacuum = INCREMENTAL")
         await db.execute("""
             CREATE TABLE IF NOT EXISTS orders (
                 order_id TEXT PRIMARY KEY,
@@ -140,6 +204,48 @@ async def init_db():
             logger.info("Миграция: добавлена колонка scanned_room_number в reviews")
         except:
             pass
+        
+        for statement in IDEMPOTENCY_SCHEMA + REVIEWS_CACHE_SCHEMA + EXPORT_SCHEMA:
+            await db.execute(statement)
+        await db.commit()
+        
+        try:
+            await db.execute("ALTER TABLE idempotency_keys ADD COLUMN claimed_at REAL")
+            await db.commit()
+            logger.info("Миграция: добавлена колонка claimed_at в idempotency_keys")
+        except:
+            pass
+        
+        # Новые ID продолжают последовательность даже при перезапуске в ту же секунду
+        cursor = await db.execute(
+            "SELECT MAX(order_id) FROM orders WHERE length(order_id) = 13 AND order_id NOT GLOB '*[^0-9]*'"
+        )
+        order_id_generator.seed((await cursor.fetchone())[0])
+    
+    # Учётный день (business_day.py): столбец, индекс, триггеры и досчёт старых строк
+    backfilled = await asyncio.to_thread(migrate_business_day, DB_FILE)
+    backfilled += await asyncio.to_thread(upgrade_archives)
+    if backfilled:
+        logger.info(f"Миграция: business_day заполнен для {backfilled} строк")
+    
+    # Индексы по средней оценке отзыва включают business_day — после миграции
+    async with aiosqlite.connect(DB_FILE) as db:
+        await ensure_reviews_query_schema(db)
+    
+    # Полнотекстовый поиск (search_index.py): при первом запуске индекс строится целиком
+    if await asyncio.to_thread(migrate_search_index, DB_FILE):
+        logger.info("Миграция: построены индексы полнотекстового поиска")
+    # Темы отзывов для отчёта (review_themes.py): дни пересчитываются при первом отчёте
+    await asyncio.to_thread(migrate_themes_index, DB_FILE)
+    # Проверка дубликатов отзывов (review_guard.py): подписи для старых отзывов
+    signed = await asyncio.to_thread(migrate_review_guard, DB_FILE)
+    if signed:
+        logger.info(f"Миграция: MinHash-подписи посчитаны для {signed} отзывов")
+    
+    # Счётчики «Статистики за день» (live_stats.py)
+    await live_stats.rebuild(DB_FILE)
+    # EWMA оценок (rating_anomaly.py): сохранённое состояние + отзывы после него
+    await rating_monitor.load(DB_FILE)
             
     logger.info("База данных готова")
 
@@ -250,7 +356,7 @@ async def show_admin_panel(callback: CallbackQuery):
         buttons.append([InlineKeyboardButton(text="📥 Экспорт заказов", callback_data="admin_export")])
     
     if has_permission(user_id, "cleanup"):
-        buttons.append([InlineKeyboardButton(text="🗑️ Очистка (>30 дней)", callback_data="admin_cleanup")])
+        buttons.append([InlineKeyboardButton(text=f"🗄️ Архивация (>{RETENTION_DAYS} дней)", callback_data="admin_cleanup")])
     
     buttons.append([InlineKeyboardButton(text="🔙 Назад в меню", callback_data="back_to_menu")])
     
@@ -281,7 +387,7 @@ async def cmd_admin_panel(message: Message):
         buttons.append([InlineKeyboardButton(text="📥 Экспорт заказов", callback_data="admin_export")])
     
     if has_permission(user_id, "cleanup"):
-        buttons.append([InlineKeyboardButton(text="🗑️ Очистка (>30 дней)", callback_data="admin_cleanup")])
+        buttons.append([InlineKeyboardButton(text=f"🗄️ Архивация (>{RETENTION_DAYS} дней)", callback_data="admin_cleanup")])
     
     buttons.append([InlineKeyboardButton(text="🔙 Назад в меню", callback_data="back_to_menu")])
     
@@ -290,26 +396,16 @@ async def cmd_admin_panel(message: Message):
 
 
 @dp.message(Command("stats"))
-async def cmd_stats(message: Message):
+async def cmd_stats(message: Message, command: CommandObject):
     if not has_permission(message.from_user.id, "stats"):
         await message.answer("❌ У вас нет прав")
         return
     
-    from datetime import date
-    today = date.today().isoformat()
+    if command.args:
+        await send_period_stats(message, command.args)
+        return
     
-    async with aiosqlite.connect(DB_FILE) as db:
-        cursor = await db.execute(
-            "SELECT COUNT(*), SUM(total) FROM orders WHERE DATE(created_at) = ?", 
-            (today,)
-        )
-        count, total_sum = await cursor.fetchone()
-        
-        cursor = await db.execute(
-            "SELECT status, COUNT(*) FROM orders WHERE DATE(created_at) = ? GROUP BY status",
-            (today,)
-        )
-        statuses = await cursor.fetchall()
+    count, total_sum, statuses = await get_day_stats(business_today())
     
     status_text = "\n".join([f"  • {status}: {cnt}" for status, cnt in statuses]) if statuses else "  Нет заказов"
     
@@ -324,6 +420,40 @@ async def cmd_stats(message: Message):
     await message.answer(text)
 
 
+async def send_period_stats(message: Message, args: str):
+    """/stats <с> <по> | /stats сезон [ГГГГ] — с архивами и сравнением с прошлым годом"""
+    try:
+        date_from, date_to = parse_period(args.split())
+    except ValueError:
+        await message.answer(
+            "ℹ️ Использование: /stats &lt;с&gt; [по] или /stats сезон [ГГГГ]\n"
+            "Например: /stats 2025-06-01 2025-08-31"
+        )
+        return
+    
+    current, previous = await compare_with_last_year_async(date_from, date_to)
+    status_text = "\n".join(
+        f"  • {status}: {count}" for status, (count, _) in sorted(current["statuses"].items(), key=lambda item: -item[1][0])
+    ) or "  Нет заказов"
+    if previous["total"]:
+        change = (current["total"] - previous["total"]) / previous["total"] * 100
+        last_year = f"{previous['orders']} заказов, {previous['total']}₸ ({change:+.1f}%)"
+    else:
+        last_year = "нет данных"
+    
+    await message.answer(f"""📊 <b>Статистика за {date_from} — {date_to}</b>
+
+📦 Всего заказов: {current['orders']}
+💰 Сумма: {current['total']}₸
+🧾 Средний чек: {current['avg_total']:.0f}₸
+
+📋 По статусам:
+{status_text}
+
+📅 Год назад: {last_year}
+""")
+
+
 @dp.message(Command("backup"))
 async def cmd_backup(message: Message):
     if message.from_user.id not in ADMIN_IDS:
@@ -331,51 +461,65 @@ async def cmd_backup(message: Message):
         return
     
     try:
-        backup_name = f"orders_backup_{datetime.now().strftime('%Y%m%d_%H%M%S')}.db"
-        backup_path = f"/tmp/{backup_name}"
-        
         await message.answer("⏳ Создаю бэкап...")
         
-        shutil.copy(DB_FILE, backup_path)
+        if replicator.running:
+            # Снапшот собирается из WAL-реплики — основная база не читается
+            result = await create_backup_from_replica_async()
+        else:
+            # Backup API в рабочем потоке: бот продолжает принимать заказы
+            result = await create_backup_async(db_path=DB_FILE)
+        logger.info(f"Бэкап создан: {result['path']} ({result['size'] / 1024:.1f} KB, {result['seconds']} с)")
         
-        file = FSInputFile(backup_path)
-        await message.answer_document(
-            document=file,
+        # Больше лимита Bot API — частями с манифестом, иначе одним документом
+        await send_file_chunked(
+            bot, message.chat.id, result["path"],
             caption=f"📦 <b>Бэкап базы данных</b>\n\n"
                     f"📅 Дата: {datetime.now().strftime('%d.%m.%Y %H:%M')}\n"
-                    f"💾 Размер: {os.path.getsize(backup_path) / 1024:.1f} KB"
+                    f"💾 Размер: {result['raw_size'] / 1024:.1f} KB → {result['size'] / 1024:.1f} KB (gzip)\n"
+                    f"✅ integrity_check: {result['integrity']} · {result['seconds']} с"
+                    + (f"\n🔁 Из реплики WAL на {result['restored_to']}" if "restored_to" in result else "")
         )
         
-        os.remove(backup_path)
-        
     except Exception as e:
         await message.answer(f"❌ Ошибка создания бэкапа: {e}")
         logger.error(f"Ошибка бэкапа: {e}")
 
 
-@dp.callback_query(F.data == "admin_stats")
-async def show_stats(callback: CallbackQuery):
-    if not has_permission(callback.from_user.id, "stats"):
-        await callback.answer("❌ У вас нет прав", show_alert=True)
-        return
-    
-    await callback.answer()
-    
-    from datetime import date
-    today = date.today().isoformat()
+async def get_day_stats(day: str) -> tuple:
+    """Число заказов, сумма и разбивка по статусам за учётный день (YYYY-MM-DD)"""
+    if day == business_today():
+        # Текущий день — из счётчиков в памяти, база не читается
+        if live_stats.stale:
+            await live_stats.rebuild(DB_FILE)
+        elif LIVE_STATS_VERIFY:
+            await live_stats.verify(DB_FILE)
+        return live_stats.snapshot()
     
     async with aiosqlite.connect(DB_FILE) as db:
         cursor = await db.execute(
-            "SELECT COUNT(*), SUM(total) FROM orders WHERE DATE(created_at) = ?", 
-            (today,)
+            "SELECT COUNT(*), SUM(total) FROM orders WHERE business_day = ?", 
+            (day,)
         )
         count, total_sum = await cursor.fetchone()
         
         cursor = await db.execute(
-            "SELECT status, COUNT(*) FROM orders WHERE DATE(created_at) = ? GROUP BY status",
-            (today,)
+            "SELECT status, COUNT(*) FROM orders WHERE business_day = ? GROUP BY status",
+            (day,)
         )
         statuses = await cursor.fetchall()
+    return count, total_sum, statuses
+
+
+@dp.callback_query(F.data == "admin_stats")
+async def show_stats(callback: CallbackQuery):
+    if not has_permission(callback.from_user.id, "stats"):
+        await callback.answer("❌ У вас нет прав", show_alert=True)
+        return
+    
+    await callback.answer()
+    
+    count, total_sum, statuses = await get_day_stats(business_today())
     
     status_text = "\n".join([f"  • {status}: {cnt}" for status, cnt in statuses]) if statuses else "  Нет заказов"
     
@@ -403,77 +547,146 @@ async def export_orders(callback: CallbackQuery):
     
     await callback.answer("📥 Генерирую отчёт...")
     
-    import csv
-    from io import StringIO
-    from datetime import date
-    
-    today = date.today().isoformat()
+    today = business_today()
+    start_export(bot, callback.from_user.id, today, today, "csv")
+
+
+@dp.message(Command("export"))
+async def cmd_export(message: Message, command: CommandObject):
+    if not has_permission(message.from_user.id, "export"):
+        await message.answer("❌ Недостаточно прав")
+        return
     
-    async with aiosqlite.connect(DB_FILE) as db:
-        db.row_factory = aiosqlite.Row
-        cursor = await db.execute(
-            "SELECT * FROM orders WHERE DATE(created_at) = ? ORDER BY created_at DESC",
-            (today,)
+    try:
+        date_from, date_to, fmt = parse_export_args(command.args)
+    except ValueError:
+        await message.answer(
+            "ℹ️ Использование: /export &lt;с&gt; &lt;по&gt; [csv|xlsx|parquet]\n"
+            "Например: /export 2026-07-01 2026-07-31 xlsx"
         )
-        orders = await cursor.fetchall()
+        return
     
-    if not orders:
-        await callback.message.answer("📭 Нет заказов за сегодня")
+    await message.answer(f"⏳ Готовлю выгрузку {fmt.upper()} за {date_from} — {date_to}...")
+    start_export(bot, message.chat.id, date_from, date_to, fmt)
+
+
+@dp.message(Command("search"))
+async def cmd_search(message: Message, command: CommandObject):
+    """/search [отзывы|заказы] <слова> — по тексту отзывов и по заказам (клиент, блюда)"""
+    if not has_permission(message.from_user.id, "view_orders"):
+        await message.answer("❌ Недостаточно прав")
         return
     
-    output = StringIO()
-    writer = csv.writer(output)
-    writer.writerow(['ID', 'Клиент', 'Комната', 'Сумма', 'Статус', 'Дата'])
-    
-    for order in orders:
-        writer.writerow([
-            order['order_id'],
-            order['client_name'],
-            order['room'],
-            order['total'],
-            order['status'],
-            order['created_at']
-        ])
+    query = (command.args or "").strip()
+    scope = query.split(maxsplit=1)[0].lower() if query else ""
+    reviews, orders = True, True
+    if scope in ("отзывы", "reviews"):
+        orders, query = False, query[len(scope):].strip()
+    elif scope in ("заказы", "orders"):
+        reviews, query = False, query[len(scope):].strip()
+    
+    if not query:
+        await message.answer(
+            "ℹ️ Использование: /search [отзывы|заказы] &lt;слова&gt;\n"
+            "Например: /search отзывы холодный душ"
+        )
+        return
     
-    filename = f"orders_{today}.csv"
-    csv_path = f"/app/data/exports/{filename}"
+    try:
+        results = await search_async(query, limit=5, markup="html", reviews=reviews, orders=orders)
+    except SearchError as e:
+        await message.answer(f"❌ Ошибка поиска: {html.escape(str(e))}")
+        return
     
-    os.makedirs("/app/data/exports", exist_ok=True)
+    lines = [f"🔎 <b>Поиск: {html.escape(query)}</b>"]
+    if reviews:
+        lines.append(f"\n💬 <b>Отзывы</b> ({len(results['reviews'])}):")
+        for review in results["reviews"]:
+            lines.append(
+                f"#{review['id']} · {html.escape(review['guest_name'] or '')} · "
+                f"{html.escape(review['room'] or '-')} · ⭐ {review['avg_score']} · {(review['date'] or '')[:10]}\n"
+                f"  {review['snippet']}"
+            )
+    if orders:
+        lines.append(f"\n🧾 <b>Заказы</b> ({len(results['orders'])}):")
+        for order in results["orders"]:
+            lines.append(
+                f"#{order['order_id']} · {order['client_name']} · {html.escape(order['room'] or '-')} · "
+                f"{order['total']}₸ · {order['status']} · {(order['date'] or '')[:16]}"
+                + (f"\n  {order['snippet']}" if order["snippet"] else "")
+            )
+    await message.answer("\n".join(lines))
+
+
+@dp.message(Command("forecast"))
+async def cmd_forecast(message: Message, command: CommandObject):
+    """/forecast [дней] — прогноз заказов бара по часам и топ позиций (demand_forecast.py)"""
+    if not has_permission(message.from_user.id, "stats"):
+        await message.answer("❌ Недостаточно прав")
+        return
     
-    with open(csv_path, 'w', encoding='utf-8') as f:
-        f.write(output.getvalue())
+    arg = (command.args or "").strip()
+    if arg and not (arg.isdigit() and 1 <= int(arg) <= 7):
+        await message.answer("ℹ️ Использование: /forecast [дней 1-7]\nНапример: /forecast 3")
+        return
     
-    await bot.send_document(
-        callback.from_user.id,
-        document=FSInputFile(csv_path),
-        caption=f"📊 Отчёт за {today}\nВсего заказов: {len(orders)}"
+    try:
+        result = await forecast_async(int(arg) if arg else FORECAST_DAYS)
+    except ForecastError as e:
+        await message.answer(f"❌ {e}")
+        return
+    
+    chart = generate_forecast_chart(result)
+    await message.answer_photo(
+        BufferedInputFile(chart.read(), filename="forecast.png"),
+        caption="🔮 Заказы по часам: линия — среднее, заливка — до 80-го перцентиля"
     )
+    await message.answer(format_forecast(result))
 
 
 @dp.callback_query(F.data == "admin_cleanup")
 async def cleanup_old_orders(callback: CallbackQuery):
+    """Заказы старше RETENTION_DAYS переносятся в помесячные архивы (retention.py)"""
     if not has_permission(callback.from_user.id, "cleanup"):
         await callback.answer("❌ У вас нет прав", show_alert=True)
         return
     
-    await callback.answer()
+    await callback.answer("🗄️ Архивирую старые заказы...")
     
-    async with aiosqlite.connect(DB_FILE) as db:
-        cursor = await db.execute(
-            "DELETE FROM orders WHERE created_at < datetime('now', '-30 days')"
-        )
-        await db.commit()
-        deleted = cursor.rowcount
+    try:
+        result = await run_retention_async()
+    except RetentionError as e:
+        await callback.message.answer(f"❌ {e}")
+        return
     
+    months = "\n".join(
+        f"• {month['month']}: {month['orders']} заказов на {month['total']}₸" for month in result["months"]
+    )
     await callback.message.answer(
-        f"🗑️ Очистка завершена\n\n"
-        f"Удалено заказов: {deleted}",
+        f"🗄️ Архивация завершена\n\n"
+        f"Перенесено в архив заказов: {result['archived']}\n"
+        + (f"{months}\n" if months else "")
+        + f"Освобождено на диске: {result['freed_pages'] * result['page_size'] / 1024 / 1024:.1f} МБ",
         reply_markup=InlineKeyboardMarkup(inline_keyboard=[
             [InlineKeyboardButton(text="🔙 Назад", callback_data="admin_panel")]
         ])
     )
 
 
+async def scheduled_retention():
+    """Ночная архивация по планировщику"""
+    try:
+        result = await run_retention_async()
+    except RetentionError as e:
+        logger.warning(f"Архивация пропущена: {e}")
+        return
+    if result["archived"]:
+        logger.info(
+            f"🗄️ В архив перенесено {result['archived']} заказов старше {result['cutoff']}, "
+            f"освобождено {result['freed_pages']} страниц за {result['seconds']} с"
+        )
+
+
 @dp.callback_query(F.data == "back_to_menu")
 async def back_to_menu(callback: CallbackQuery):
     await callback.answer()
@@ -533,7 +746,8 @@ async def cmd_help(message: Message):
         "🚗 Трансфер / 🎯 Экскурсии — свяжитесь с нами:\n"
         "💬 WhatsApp: +7 (776) 727 58 41\n"
         "✈️ Telegram: https://t.me/+77767275841\n\n"
-        "Статусы:\n🟡 Принят\n🟠 Готовится\n🟢 Готов\n✅ Выдан"
+        "Статусы:\n🟡 Принят\n🟠 Готовится\n🟢 Готов\n✅ Выдан\n\n"
+        "Проверить статус заказа: /status номер_заказа"
     )
     await message.answer(text)
 
@@ -602,6 +816,8 @@ async def handle_status_button(callback: CallbackQuery):
             await callback.answer("❌ Заказ не найден", show_alert=True)
             return
     
+    order_status_cache.update_status(order_id, new_status)
+    live_stats.record_status(order_id, new_status)
     await notify_client_status_update(order_id, new_status)
     
     emoji = {"готовится": "🟠", "готов": "🟢", "выдан": "🎉"}.get(new_status, "⚪")
@@ -625,13 +841,30 @@ async def handle_status_button(callback: CallbackQuery):
     await callback.answer(f"✅ Статус изменён на '{new_status}'")
 
 
-async def notify_client_status_update(order_id: str, status: str):
+async def get_order_status(order_id: str) -> dict | None:
+    """Статус заказа из кэша, SQLite — только при промахе"""
+    entry = order_status_cache.get(order_id)
+    if entry:
+        return entry
+    
     async with aiosqlite.connect(DB_FILE) as db:
-        cursor = await db.execute("SELECT telegram_user_id FROM orders WHERE order_id = ?", (order_id,))
+        cursor = await db.execute(
+            "SELECT status, telegram_user_id, telegram_username FROM orders WHERE order_id = ?",
+            (order_id,)
+        )
         row = await cursor.fetchone()
-        if not row:
-            return
-        telegram_user_id = row[0]
+    
+    if not row:
+        return None
+    status, telegram_user_id, telegram_username = row
+    return order_status_cache.put(order_id, status, telegram_user_id, telegram_username)
+
+
+async def notify_client_status_update(order_id: str, status: str):
+    entry = await get_order_status(order_id)
+    if not entry:
+        return
+    telegram_user_id = entry["telegram_user_id"]
     
     messages = {
         "готовится": f"⏳ Ваш заказ #{order_id} готовится!",
@@ -651,7 +884,7 @@ async def notify_client_status_update(order_id: str, status: str):
 # ==================== PDF И ФОТО ====================
 
 def generate_receipt_pdf(order_id: str, order_data: dict) -> str:
-    pdf_dir = '/app/data/receipts'
+    pdf_dir = f'{DATA_DIR}/receipts'
     os.makedirs(pdf_dir, exist_ok=True)
     
     pdf_path = f"{pdf_dir}/{order_id}.pdf"
@@ -727,7 +960,7 @@ def generate_receipt_pdf(order_id: str, order_data: dict) -> str:
 
 
 def generate_receipt_image(order_id: str, order_data: dict) -> str:
-    img_dir = '/app/data/receipts'
+    img_dir = f'{DATA_DIR}/receipts'
     os.makedirs(img_dir, exist_ok=True)
     
     img_path = f"{img_dir}/{order_id}.png"
@@ -847,38 +1080,73 @@ async def handle_photo_button(callback: CallbackQuery):
 
 # ==================== ЛОГИКА ЗАКАЗОВ ====================
 
-async def save_order(order_data: dict) -> dict:
-    order_id = order_data.get("orderId") or str(int(datetime.now().timestamp()))
-    
-    # Получаем отслеживаемый номер комнаты из QR-кода
+INSERT_ORDER_SQL = """
+    INSERT INTO orders 
+    (order_id, client_name, room, telegram_user_id, telegram_username, items, total, timestamp, pdf_path, status, scanned_room_number)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, 'принят', ?)
+"""
+
+
+def build_order_row(order_id: str, order_data: dict, pdf_path: str | None, scanned_room: str | None) -> tuple:
+    return (
+        order_id,
+        order_data.get("name"),
+        order_data.get("room"),
+        order_data.get("telegram_user_id"),
+        order_data.get("telegram_username"),
+        json.dumps(order_data.get("items", []), ensure_ascii=False),
+        order_data.get("total"),
+        order_data.get("timestamp"),
+        pdf_path,
+        scanned_room
+    )
+
+
+def resolve_scanned_room(order_data: dict) -> str | None:
     # Сначала проверяем order_data (для WebApp заказов), затем user_room_tracking
     scanned_room = order_data.get("scanned_room")
     if not scanned_room:
         user_id = order_data.get("telegram_user_id")
         scanned_room = user_room_tracking.get(user_id) if user_id else None
+    return scanned_room
+
+
+async def save_order(order_data: dict, idempotency_key: str = None) -> dict:
+    # Повтор того же заказа (плохой Wi-Fi, повторная отправка WebApp) возвращает
+    # исходный ответ без повторного рендера накладной и уведомлений
+    key, key_ttl = resolve_idempotency_key(order_data, idempotency_key)
+    
+    # Получаем отслеживаемый номер комнаты из QR-кода
+    scanned_room = resolve_scanned_room(order_data)
     
     try:
         async with aiosqlite.connect(DB_FILE) as db:
-            pdf_path = generate_receipt_pdf(order_id, order_data)
+            claimed, previous = await claim_idempotency_key(db, key, key_ttl)
+            if not claimed:
+                if previous is None:
+                    return {"status": "pending", "message": "Заказ уже обрабатывается"}
+                logger.info(f"Повтор заказа #{previous.get('order_id')} (ключ {key}) — возвращаем исходный ответ")
+                return {**previous, "duplicate": True}
             
-            await db.execute("""
-                INSERT INTO orders 
-                (order_id, client_name, room, telegram_user_id, telegram_username, items, total, timestamp, pdf_path, status, scanned_room_number)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, 'принят', ?)
-            """, (
-                order_id,
-                order_data.get("name"),
-                order_data.get("room"),
-                order_data.get("telegram_user_id"),
-                order_data.get("telegram_username"),
-                json.dumps(order_data.get("items", []), ensure_ascii=False),
-                order_data.get("total"),
-                order_data.get("timestamp"),
-                pdf_path,
-                scanned_room
-            ))
-            await db.commit()
+            order_id = order_data.get("orderId") or order_id_generator.next_id()
+            try:
+                pdf_path = generate_receipt_pdf(order_id, order_data)
+                
+                await db.execute(INSERT_ORDER_SQL, build_order_row(order_id, order_data, pdf_path, scanned_room))
+                result = {"status": "ok", "order_id": order_id}
+                await store_idempotent_result(db, key, order_id, result)
+                await db.commit()
+            except Exception:
+                await db.rollback()
+                await release_idempotency_key(db, key)
+                raise
         
+        order_status_cache.put(
+            order_id, 'принят',
+            order_data.get("telegram_user_id"),
+            order_data.get("telegram_username")
+        )
+        live_stats.record_order(order_id, order_data.get("total"))
         logger.info(f"Заказ #{order_id} сохранён (QR-номер: {scanned_room or 'не указан'})")
         order_data['pdf_path'] = pdf_path
         order_data['scanned_room'] = scanned_room
@@ -886,7 +1154,7 @@ async def save_order(order_data: dict) -> dict:
         await notify_admins_new_order(order_id, order_data)
         await notify_client_order_received(order_id, order_data)
         
-        return {"status": "ok", "order_id": order_id}
+        return result
     except Exception as e:
         logger.error(f"Ошибка сохранения заказа: {e}")
         return {"status": "error", "message": str(e)}
@@ -940,6 +1208,169 @@ async def notify_client_order_received(order_id: str, order_data: dict):
         logger.warning(f"Не удалось отправить клиенту @{telegram_username}: {e}")
 
 
+# ==================== ПАКЕТНЫЙ ПРИЁМ ЗАКАЗОВ ====================
+
+MAX_BATCH_ORDERS = int(os.getenv("MAX_BATCH_ORDERS", "200"))
+
+# Ссылки на фоновые задачи, чтобы их не собрал GC до завершения
+background_tasks = set()
+
+
+def spawn_background(coro):
+    task = asyncio.create_task(coro)
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+    return task
+
+
+def validate_order(order_data) -> str | None:
+    """Проверка заказа из пакета; возвращает текст ошибки или None"""
+    if not isinstance(order_data, dict):
+        return "order must be an object"
+    items = order_data.get("items")
+    if not isinstance(items, list) or not items:
+        return "items must be a non-empty list"
+    for item in items:
+        if not isinstance(item, dict) or not item.get("name"):
+            return "each item must have a name"
+        if not isinstance(item.get("price"), (int, float)):
+            return f"item '{item.get('name')}' has no numeric price"
+    if not isinstance(order_data.get("total"), (int, float)):
+        return "total must be a number"
+    if not order_data.get("name") or not order_data.get("room"):
+        return "name and room are required"
+    return None
+
+
+async def save_orders_batch(orders: list) -> list:
+    """
+    Сохраняет пакет заказов одной транзакцией (executemany).
+    
+    orderId, который уже есть в orders (ключ идемпотентности истёк или
+    другой заказ с тем же номером), помечается ошибкой по своему индексу —
+    остальные заказы пакета сохраняются.
+    
+    Накладные рендерятся и админы уведомляются одним сообщением в фоне.
+    Возвращает результат по каждому заказу в порядке пакета.
+    """
+    results = [None] * len(orders)
+    keys = {}
+    for index, order_data in enumerate(orders):
+        error = validate_order(order_data)
+        if error:
+            results[index] = {"index": index, "status": "error", "message": error}
+            continue
+        keys[index] = resolve_idempotency_key(order_data)
+    
+    accepted = []
+    async with aiosqlite.connect(DB_FILE) as db:
+        # BEGIN IMMEDIATE: одиночный save_order с тем же ключом дождётся конца пакета
+        await db.execute("BEGIN IMMEDIATE")
+        try:
+            known = await lookup_idempotency_keys(db, [key for key, _ in keys.values()])
+            taken = await existing_order_ids(
+                db, [orders[index]["orderId"] for index in keys if orders[index].get("orderId")]
+            )
+            order_rows, key_rows, seen = [], [], {}
+            
+            for index, (key, ttl) in keys.items():
+                if key in known or key in seen:
+                    previous = known.get(key) or seen.get(key)
+                    if previous is None:
+                        results[index] = {"index": index, "status": "pending", "message": "Заказ уже обрабатывается"}
+                    else:
+                        results[index] = {"index": index, **previous, "duplicate": True}
+                    continue
+                
+                order_data = orders[index]
+                order_id = order_data.get("orderId") or order_id_generator.next_id()
+                if order_id in taken:
+                    results[index] = {
+                        "index": index, "status": "error", "order_id": order_id,
+                        "message": f"Заказ #{order_id} уже существует"
+                    }
+                    continue
+                taken.add(order_id)
+                scanned_room = resolve_scanned_room(order_data)
+                order_data["scanned_room"] = scanned_room
+                result = {"status": "ok", "order_id": order_id}
+                
+                order_rows.append(build_order_row(order_id, order_data, None, scanned_room))
+                key_rows.append(idempotency_row(key, ttl, order_id, result))
+                seen[key] = result
+                accepted.append((order_id, order_data))
+                results[index] = {"index": index, **result}
+            
+            await db.executemany(INSERT_ORDER_SQL, order_rows)
+            await store_idempotent_results(db, key_rows)
+            await db.commit()
+        except Exception:
+            await db.rollback()
+            raise
+    
+    for order_id, order_data in accepted:
+        order_status_cache.put(
+            order_id, 'принят',
+            order_data.get("telegram_user_id"),
+            order_data.get("telegram_username")
+        )
+        live_stats.record_order(order_id, order_data.get("total"))
+    
+    logger.info(f"Пакет заказов: принято {len(accepted)} из {len(orders)}")
+    if accepted:
+        spawn_background(finish_orders_batch(accepted))
+    
+    return results
+
+
+async def finish_orders_batch(accepted: list):
+    """Фоновая часть пакета: накладные пачкой, одно уведомление админам, клиентам — как обычно"""
+    def render_all():
+        rows = []
+        for order_id, order_data in accepted:
+            try:
+                rows.append((generate_receipt_pdf(order_id, order_data), order_id))
+            except Exception as e:
+                logger.error(f"Ошибка рендера накладной #{order_id}: {e}")
+        return rows
+    
+    try:
+        pdf_rows = await asyncio.to_thread(render_all)
+        async with aiosqlite.connect(DB_FILE) as db:
+            await db.executemany("UPDATE orders SET pdf_path = ? WHERE order_id = ?", pdf_rows)
+            await db.commit()
+    except Exception as e:
+        logger.error(f"Ошибка сохранения накладных пакета: {e}")
+    
+    await notify_admins_orders_batch(accepted)
+    for order_id, order_data in accepted:
+        await notify_client_order_received(order_id, order_data)
+
+
+async def notify_admins_orders_batch(accepted: list):
+    total_sum = sum(order_data.get("total") or 0 for _, order_data in accepted)
+    lines = [
+        f"• <b>#{order_id}</b> — {order_data.get('name')}, 🏨 {order_data.get('room')} — {order_data.get('total')} ₸"
+        for order_id, order_data in accepted
+    ]
+    
+    header = f"<b>📦 Пакет заказов: {len(accepted)}</b>\n💰 На сумму: <b>{total_sum} ₸</b>\n\n"
+    footer = "\n\n📄 Накладные доступны в 📋 Активные заказы"
+    body = ""
+    for shown, line in enumerate(lines):
+        # Лимит сообщения Telegram — 4096 символов
+        if len(header) + len(body) + len(line) + len(footer) + 40 > 4096:
+            body += f"… и ещё {len(lines) - shown}\n"
+            break
+        body += line + "\n"
+    
+    for admin_id in ADMIN_IDS:
+        try:
+            await bot.send_message(admin_id, header + body.rstrip() + footer)
+        except Exception as e:
+            logger.error(f"Ошибка отправки админу {admin_id}: {e}")
+
+
 @dp.message(F.web_app_data)
 async def handle_webapp_order(message: Message):
     try:
@@ -956,7 +1387,9 @@ async def handle_webapp_order(message: Message):
         
         result = await save_order(order_data)
         
-        if result["status"] == "ok":
+        if result["status"] == "pending":
+            await message.answer("⏳ Заказ уже обрабатывается, подождите немного")
+        elif result["status"] == "ok":
             await message.answer(
                 f"✅ <b>Заказ #{result['order_id']} принят!</b>\n\n"
                 f"💰 Итого: {order_data['total']}₸\n"
@@ -970,6 +1403,28 @@ async def handle_webapp_order(message: Message):
         await message.answer("❌ Ошибка при обработке заказа")
 
 
+@dp.message(Command("status"))
+async def cmd_status(message: Message, command: CommandObject):
+    if not command.args:
+        await message.answer("ℹ️ Укажите номер заказа: /status номер_заказа")
+        return
+    
+    order_id = command.args.strip().lstrip("#")
+    entry = await get_order_status(order_id)
+    
+    user = message.from_user
+    is_owner = entry and (
+        entry["telegram_user_id"] == user.id
+        or (user.username and (entry["telegram_username"] or "").lower() == user.username.lower())
+    )
+    if not entry or not (is_owner or has_permission(user.id, "view_orders")):
+        await message.answer(f"❌ Заказ #{order_id} не найден")
+        return
+    
+    emoji = STATUS_EMOJI.get(entry["status"], "⚪")
+    await message.answer(f"{emoji} <b>Заказ #{order_id}</b>\n\n📊 Статус: {entry['status']}")
+
+
 # ==================== НАВИГАЦИЯ ====================
 
 @dp.callback_query(F.data == "navigation")
@@ -986,7 +1441,8 @@ def cors_headers(origin: str | None) -> dict:
     return {
         "Access-Control-Allow-Origin": origin,
         "Access-Control-Allow-Methods": "POST, GET, OPTIONS",
-        "Access-Control-Allow-Headers": "Content-Type",
+        "Access-Control-Allow-Headers": "Content-Type, If-None-Match, If-Modified-Since, Idempotency-Key",
+        "Access-Control-Expose-Headers": "ETag, Last-Modified, X-Next-Cursor, Link",
     }
 
 
@@ -999,14 +1455,90 @@ async def handle_new_order(request: web.Request) -> web.Response:
     
     try:
         order_data = await request.json()
-        result = await save_order(order_data)
-        status = 200 if result["status"] == "ok" else 500
+        result = await save_order(order_data, request.headers.get("Idempotency-Key"))
+        status = {"ok": 200, "pending": 409}.get(result["status"], 500)
         return web.json_response(result, status=status, headers=headers)
     except Exception as e:
         logger.error(f"Ошибка webhook: {e}")
         return web.json_response({"status": "error", "message": str(e)}, status=500, headers=headers)
 
 
+async def handle_orders_batch(request: web.Request) -> web.Response:
+    """POST /api/orders/batch — массив заказов (или {"orders": [...]}) из офлайн-очереди"""
+    origin = request.headers.get("Origin")
+    headers = cors_headers(origin)
+    
+    if request.method == "OPTIONS":
+        return web.Response(status=204, headers=headers)
+    
+    try:
+        payload = await request.json()
+    except Exception:
+        return web.json_response({"status": "error", "message": "invalid JSON"}, status=400, headers=headers)
+    
+    orders = payload.get("orders") if isinstance(payload, dict) else payload
+    if not isinstance(orders, list) or not orders:
+        return web.json_response({"status": "error", "message": "orders must be a non-empty list"}, status=400, headers=headers)
+    if len(orders) > MAX_BATCH_ORDERS:
+        return web.json_response(
+            {"status": "error", "message": f"too many orders (max {MAX_BATCH_ORDERS})"},
+            status=413, headers=headers
+        )
+    
+    try:
+        results = await save_orders_batch(orders)
+        return web.json_response({"status": "ok", "results": results}, headers=headers)
+    except Exception as e:
+        logger.error(f"Ошибка пакетного приёма заказов: {e}")
+        return web.json_response({"status": "error", "message": str(e)}, status=500, headers=headers)
+
+
+async def get_order_status_endpoint(request: web.Request) -> web.Response:
+    """
+    GET /api/order/{order_id}/status
+    
+    Поддерживает If-None-Match (304) и long-polling: с ?wait=N запрос
+    с совпадающим ETag ждёт до N секунд, пока статус не изменится.
+    """
+    origin = request.headers.get("Origin")
+    headers = cors_headers(origin)
+    
+    if request.method == "OPTIONS":
+        return web.Response(status=204, headers=headers)
+    
+    order_id = request.match_info["order_id"]
+    try:
+        wait = min(max(float(request.query.get("wait", 0)), 0), STATUS_LONG_POLL_MAX)
+    except ValueError:
+        wait = 0
+    
+    try:
+        entry = await get_order_status(order_id)
+        if not entry:
+            return web.json_response({"status": "error", "message": "order not found"}, status=404, headers=headers)
+        
+        if_none_match = request.headers.get("If-None-Match")
+        deadline = asyncio.get_running_loop().time() + wait
+        while entry and entry["etag"] == if_none_match:
+            remaining = deadline - asyncio.get_running_loop().time()
+            if remaining <= 0:
+                break
+            entry = await order_status_cache.wait_for_change(order_id, if_none_match, remaining)
+            if entry is None:
+                entry = await get_order_status(order_id)
+        
+        if not entry:
+            return web.json_response({"status": "error", "message": "order not found"}, status=404, headers=headers)
+        
+        headers.update({"ETag": entry["etag"], "Cache-Control": "no-cache"})
+        if entry["etag"] == if_none_match:
+            return web.Response(status=304, headers=headers)
+        return web.Response(body=entry["body"], content_type="application/json", charset="utf-8", headers=headers)
+    except Exception as e:
+        logger.error(f"Ошибка API /order/{order_id}/status: {e}")
+        return web.json_response({"status": "error", "message": "Internal server error"}, status=500, headers=headers)
+
+
 async def get_reviews_endpoint(request: web.Request) -> web.Response:
     origin = request.headers.get("Origin")
     headers = cors_headers(origin)
@@ -1014,65 +1546,121 @@ async def get_reviews_endpoint(request: web.Request) -> web.Response:
     if request.method == "OPTIONS":
         return web.Response(status=204, headers=headers)
     
+    if any(param in request.query for param in REVIEW_QUERY_PARAMS):
+        return await get_reviews_page(request, headers)
+    
     try:
-        async with aiosqlite.connect(DB_FILE) as db:
-            db.row_factory = aiosqlite.Row
-            cursor = await db.execute("""
-                SELECT 
-                    display_name as name,
-                    room_number,
-                    cleanliness, comfort, location, facilities, staff, value_for_money,
-                    ROUND((cleanliness + comfort + location + facilities + staff + value_for_money) / 6.0, 1) as avg_score,
-                    pros, cons, comment,
-                    created_at as date
-                FROM reviews
-                WHERE is_published = 1 AND status = 'approved'
-                ORDER BY created_at DESC
-                LIMIT 50
-            """)
-            
-            reviews = []
-            async for row in cursor:
-                reviews.append({
-                    'name': row['name'],
-                    'room_number': row['room_number'],
-                    'cleanliness': row['cleanliness'],
-                    'comfort': row['comfort'],
-                    'location': row['location'],
-                    'facilities': row['facilities'],
-                    'staff': row['staff'],
-                    'value_for_money': row['value_for_money'],
-                    'avg_score': row['avg_score'],
-                    'pros': row['pros'],
-                    'cons': row['cons'],
-                    'comment': row['comment'],
-                    'date': row['date']
-                })
+        snapshot = await published_reviews_snapshot.get()
+        gzipped = accepts_gzip(request.headers.get("Accept-Encoding"))
+        headers.update(snapshot.http_headers(gzipped))
         
-        return web.json_response(reviews, headers=headers)
+        if snapshot.not_modified(request.headers.get("If-None-Match"), request.headers.get("If-Modified-Since")):
+            return web.Response(status=304, headers=headers)
+        
+        body = snapshot.body
+        if gzipped:
+            body = snapshot.gzip_body
+            headers["Content-Encoding"] = "gzip"
+        return web.Response(body=body, content_type="application/json", headers=headers)
     except Exception as e:
         logger.error(f"Ошибка API /reviews: {e}")
         return web.json_response({'error': 'Internal server error'}, status=500, headers=headers)
 
 
-async def start_webhook_server():
-    app = web.Application()
+REVIEW_QUERY_PARAMS = ("cursor", "limit", "min_score", "room_type", "date_from", "date_to")
+
+
+async def get_reviews_page(request: web.Request, headers: dict) -> web.Response:
+    """Страница /api/reviews с фильтрами; курсор следующей страницы — в X-Next-Cursor"""
+    try:
+        filters = parse_review_filters(request.query)
+    except (ValueError, UnicodeDecodeError):
+        return web.json_response({'error': 'Invalid query parameters'}, status=400, headers=headers)
+    
+    try:
+        reviews, next_cursor = await query_published_reviews(filters)
+        if next_cursor:
+            headers["X-Next-Cursor"] = next_cursor
+            headers["Link"] = f'<{request.rel_url.update_query(cursor=next_cursor)}>; rel="next"'
+        return web.json_response(reviews, headers=headers)
+    except Exception as e:
+        logger.error(f"Ошибка API /reviews (страница): {e}")
+        return web.json_response({'error': 'Internal server error'}, status=500, headers=headers)
+
+
+async def get_reviews_summary_endpoint(request: web.Request) -> web.Response:
+    origin = request.headers.get("Origin")
+    headers = cors_headers(origin)
+    
+    if request.method == "OPTIONS":
+        return web.Response(status=204, headers=headers)
+    
+    try:
+        summary = await get_reviews_summary()
+        headers["Cache-Control"] = f"public, max-age={REVIEWS_CACHE_MAX_AGE}"
+        return web.json_response(summary, headers=headers)
+    except Exception as e:
+        logger.error(f"Ошибка API /reviews/summary: {e}")
+        return web.json_response({'error': 'Internal server error'}, status=500, headers=headers)
+
+
+def build_web_app() -> web.Application:
+    app = web.Application(middlewares=[http_metrics_middleware])
     app.router.add_route("POST", "/api/order", handle_new_order)
     app.router.add_route("OPTIONS", "/api/order", handle_new_order)
+    app.router.add_route("POST", "/api/orders/batch", handle_orders_batch)
+    app.router.add_route("OPTIONS", "/api/orders/batch", handle_orders_batch)
+    app.router.add_route("GET", "/api/order/{order_id}/status", get_order_status_endpoint)
+    app.router.add_route("OPTIONS", "/api/order/{order_id}/status", get_order_status_endpoint)
     app.router.add_route("GET", "/api/reviews", get_reviews_endpoint)
     app.router.add_route("OPTIONS", "/api/reviews", get_reviews_endpoint)
-    
+    app.router.add_route("GET", "/api/reviews/summary", get_reviews_summary_endpoint)
+    app.router.add_route("OPTIONS", "/api/reviews/summary", get_reviews_summary_endpoint)
+    app.router.add_route("GET", "/metrics", metrics_endpoint)
+    app.router.add_route("GET", "/debug/profile", profile_endpoint)
+    return app
+
+
+def setup_telegram_webhook(app: web.Application):
+    """
+    Монтирует приём апдейтов Telegram в то же aiohttp-приложение, что и HTTP API.
+    
+    Telegram получает ответ сразу, апдейт обрабатывается в фоне
+    (handle_in_background), заголовок X-Telegram-Bot-Api-Secret-Token проверяется.
+    """
+    SimpleRequestHandler(
+        dispatcher=dp,
+        bot=bot,
+        secret_token=WEBHOOK_SECRET,
+        handle_in_background=True
+    ).register(app, path=TELEGRAM_WEBHOOK_PATH)
+    setup_application(app, dp, bot=bot)
+
+
+async def start_webhook_server(app: web.Application):
     runner = web.AppRunner(app)
     await runner.setup()
     site = web.TCPSite(runner, "0.0.0.0", WEBHOOK_PORT)
     await site.start()
-    logger.info(f"HTTP API запущен на порту {WEBHOOK_PORT} (/api/order, /api/reviews)")
+    logger.info(f"HTTP API запущен на порту {WEBHOOK_PORT} (/api/order, /api/orders/batch, /api/order/{{id}}/status, /api/reviews, /api/reviews/summary, /metrics)")
 
 
 # ==================== MAIN ====================
 
+async def purge_idempotency_keys():
+    """Удаление просроченных ключей идемпотентности (по расписанию)"""
+    async with aiosqlite.connect(DB_FILE) as db:
+        deleted = await purge_expired_idempotency_keys(db)
+    if deleted:
+        logger.info(f"Удалено просроченных ключей идемпотентности: {deleted}")
+
+
 async def main():
+    loop_monitor.start()
     await init_db()
+    if REPLICA_DIR:
+        # Первый снапшот реплики снимается при старте — в рабочем потоке
+        await asyncio.to_thread(replicator.start)
     
     for admin_id in ADMIN_IDS:
         try:
@@ -1083,20 +1671,56 @@ async def main():
     dp.include_router(reviews_router)
     dp.include_router(navigation_router)
     dp.include_router(analytics_router)
+    dp.include_router(perf_router)
+    dp.include_router(profile_router)
+    # qr_router последним: его хендлер F.text перехватывает любой текст
     dp.include_router(qr_router)
-    asyncio.create_task(start_webhook_server())
+    app = build_web_app()
+    if BOT_MODE == "webhook":
+        setup_telegram_webhook(app)
+    await start_webhook_server(app)
     scheduler = setup_scheduler(bot)  # Внутри main()!
+    scheduler.add_job(purge_idempotency_keys, trigger='interval', hours=1)
+    scheduler.add_job(cleanup_exports, trigger='interval', hours=1)
+    if RETENTION_HOUR:
+        scheduler.add_job(scheduled_retention, trigger='cron', hour=int(RETENTION_HOUR), minute=30)
+    # Новый учётный день: счётчики заново из базы (вместе с правками edit_orders.py)
+    scheduler.add_job(live_stats.rebuild, trigger='cron', hour=BUSINESS_DAY_CUTOFF_HOUR, minute=0, args=[DB_FILE])
     # Регистрируем команды бота
     commands = [
         BotCommand(command="start", description="🏠 Главное меню"),
+        BotCommand(command="status", description="📦 Статус заказа"),
         BotCommand(command="analytics", description="📊 Аналитика и отчеты"),
         BotCommand(command="test_report", description="🧪 Тестовая отправка отчета"),
         BotCommand(command="generate_qr", description="📱 Генерация QR-кодов"), 
+        BotCommand(command="export", description="📥 Выгрузка заказов за период"),
+        BotCommand(command="search", description="🔎 Поиск по отзывам и заказам"),
+        BotCommand(command="forecast", description="🔮 Прогноз заказов бара"),
+        BotCommand(command="perf", description="⚙️ Производительность"),
+        BotCommand(command="profile", description="🔬 Профилирование"),
         BotCommand(command="help", description="❓ Помощь")
     ]
     await bot.set_my_commands(commands)
+    register_commands(command.command for command in commands)
     logger.info(f"✅ Зарегистрировано {len(commands)} команд бота")
-    await dp.start_polling(bot)
+    
+    try:
+        if BOT_MODE == "webhook":
+            await bot.set_webhook(
+                f"{WEBHOOK_BASE_URL.rstrip('/')}{TELEGRAM_WEBHOOK_PATH}",
+                secret_token=WEBHOOK_SECRET,
+                allowed_updates=dp.resolve_used_update_types()
+            )
+            logger.info(f"✅ Webhook режим: {WEBHOOK_BASE_URL.rstrip('/')}{TELEGRAM_WEBHOOK_PATH}")
+            await asyncio.Event().wait()
+        else:
+            # Запасной режим: снимаем webhook, иначе getUpdates вернёт конфликт
+            await bot.delete_webhook()
+            await dp.start_polling(bot)
+    finally:
+        # Последняя синхронизация реплики перед выходом
+        if replicator.running:
+            await asyncio.to_thread(replicator.stop)
 
 if __name__ == "__main__":
     asyncio.run(main())
@@ -0,0 +1,133 @@
+# ==============================================================================
+# business_day.py - Учётный день (Asia/Almaty, с ночной сменой) для заказов и отзывов
+# ==============================================================================
+#
+# created_at пишется CURRENT_TIMESTAMP в UTC, а отчёты «за сегодня» считаются
+# по местному времени. Ночная смена бара закрывается после полуночи, поэтому
+# заказ в 02:00 относится к предыдущему дню: учётный день =
+# дата(местное время - BUSINESS_DAY_CUTOFF_HOUR).
+#
+# Столбец business_day хранится в orders и reviews, заполняется триггером
+# при вставке, досчитывается для старых строк и проиндексирован — дневные
+# отчёты фильтруют business_day = ? вместо неиндексируемого DATE(created_at).
+#
+# Только стандартная библиотека: используется ботом, retention.py и edit_orders.py.
+
+import os
+import sqlite3
+from datetime import date, datetime, timedelta, timezone
+from typing import Optional
+from zoneinfo import ZoneInfo
+
+BUSINESS_TZ = ZoneInfo(os.getenv("BUSINESS_TZ", "Asia/Almaty"))
+# Заказы до этого часа (местного) относятся к предыдущему дню
+BUSINESS_DAY_CUTOFF_HOUR = int(os.getenv("BUSINESS_DAY_CUTOFF_HOUR", "4"))
+BUSINESS_DAY_TABLES = ("orders", "reviews")
+# Строк за транзакцию при досчёте старых записей
+BUSINESS_DAY_BACKFILL_BATCH = 5000
+
+
+def business_day_of(created_at: Optional[str]) -> Optional[str]:
+    """'2026-07-14 21:30:00' (UTC) -> '2026-07-14' (02:30 по Алматы — ещё ночная смена 14-го)"""
+    if not created_at:
+        return None
+    try:
+        moment = datetime.fromisoformat(created_at)
+    except ValueError:
+        return None
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    local = moment.astimezone(BUSINESS_TZ) - timedelta(hours=BUSINESS_DAY_CUTOFF_HOUR)
+    return local.date().isoformat()
+
+
+def business_today() -> str:
+    """Текущий учётный день"""
+    return (datetime.now(BUSINESS_TZ) - timedelta(hours=BUSINESS_DAY_CUTOFF_HOUR)).date().isoformat()
+
+
+def business_days_ago(days: int) -> str:
+    return (date.fromisoformat(business_today()) - timedelta(days=days)).isoformat()
+
+
+def _trigger_sql(table: str) -> dict:
+    """
+    Триггеры заполнения. В SQL нет часовых поясов, поэтому в выражение
+    подставляется текущее смещение зоны (в Казахстане нет перехода на летнее
+    время); при смене зоны или часа отсечки триггеры пересоздаются, а
+    столбец пересчитывается через business_day_of.
+    """
+    offset = int(datetime.now(BUSINESS_TZ).utcoffset().total_seconds() // 60) - BUSINESS_DAY_CUTOFF_HOUR * 60
+    expression = f"date(NEW.created_at, '{offset:+d} minutes')"
+    return {
+        f"trg_{table}_business_day_insert": (
+            f"CREATE TRIGGER trg_{table}_business_day_insert AFTER INSERT ON {table} "
+            f"BEGIN UPDATE {table} SET business_day = {expression} WHERE rowid = NEW.rowid; END"
+        ),
+        f"trg_{table}_business_day_update": (
+            f"CREATE TRIGGER trg_{table}_business_day_update AFTER UPDATE OF created_at ON {table} "
+            f"BEGIN UPDATE {table} SET business_day = {expression} WHERE rowid = NEW.rowid; END"
+        ),
+    }
+
+
+def _backfill(conn: sqlite3.Connection, schema: str, table: str, recompute: bool) -> int:
+    """Досчитать business_day порциями по rowid — блокировка записи короткая"""
+    if not recompute and not conn.execute(
+        f"SELECT 1 FROM {schema}.{table} WHERE business_day IS NULL AND created_at IS NOT NULL LIMIT 1"
+    ).fetchone():
+        return 0
+    last = conn.execute(f"SELECT MAX(rowid) FROM {schema}.{table}").fetchone()[0] or 0
+    condition = "" if recompute else " AND business_day IS NULL"
+    updated = 0
+    for lower in range(0, last, BUSINESS_DAY_BACKFILL_BATCH):
+        updated += conn.execute(f"""
+            UPDATE {schema}.{table} SET business_day = business_day_of(created_at)
+            WHERE rowid > ? AND rowid <= ?{condition}
+        """, (lower, lower + BUSINESS_DAY_BACKFILL_BATCH)).rowcount
+        conn.commit()
+    return updated
+
+
+def ensure_business_day(conn: sqlite3.Connection, schema: str = "main", triggers: bool = True) -> int:
+    """
+    Столбец, индекс и триггеры business_day в таблицах schema (main или
+    подключённый архив — ему триггеры не нужны, triggers=False);
+    возвращает число досчитанных строк.
+    """
+    conn.create_function("business_day_of", 1, business_day_of, deterministic=True)
+    updated = 0
+    for table in BUSINESS_DAY_TABLES:
+        if not conn.execute(
+            f"SELECT 1 FROM {schema}.sqlite_master WHERE type = 'table' AND name = ?", (table,)
+        ).fetchone():
+            continue
+        columns = [row[1] for row in conn.execute(f"PRAGMA {schema}.table_info({table})")]
+        if "business_day" not in columns:
+            conn.execute(f"ALTER TABLE {schema}.{table} ADD COLUMN business_day TEXT")
+        conn.execute(f"CREATE INDEX IF NOT EXISTS {schema}.idx_{table}_business_day ON {table}(business_day)")
+
+        recompute = False
+        if triggers:
+            for name, sql in _trigger_sql(table).items():
+                row = conn.execute(
+                    f"SELECT sql FROM {schema}.sqlite_master WHERE type = 'trigger' AND name = ?", (name,)
+                ).fetchone()
+                if row and row[0] == sql:
+                    continue
+                # Триггер был с другими настройками — старые значения тоже неверны
+                recompute = recompute or row is not None
+                conn.execute(f"DROP TRIGGER IF EXISTS {schema}.{name}")
+                conn.execute(sql)
+        conn.commit()
+        updated += _backfill(conn, schema, table, recompute)
+    return updated
+
+
+def migrate_business_day(db_path: str) -> int:
+    """ensure_business_day для файла базы (init_db бота, запуск в рабочем потоке)"""
+    conn = sqlite3.connect(db_path, timeout=30)
+    try:
+        return ensure_business_day(conn)
+    finally:
+        conn.close()
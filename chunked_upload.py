@@ -0,0 +1,212 @@
+# ==============================================================================
+# chunked_upload.py - Отправка больших файлов в Telegram частями с манифестом
+# ==============================================================================
+#
+# Bot API не принимает документы больше 50 МБ. Файл сжимается gzip на лету
+# и режется на пронумерованные части меньше лимита; к частям прикладывается
+# манифест с SHA-256 каждой части и всего файла. Сборка на компьютере:
+#   python3 scripts/reassemble_parts.py orders_20260715_030000.db.gz.manifest.json
+
+import asyncio
+import gzip
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+import time
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramNetworkError, TelegramRetryAfter
+from aiogram.types import FSInputFile
+
+logger = logging.getLogger(__name__)
+
+# Лимит Bot API на отправку файлов (у локального Bot API сервера — 2000 МБ)
+TELEGRAM_UPLOAD_LIMIT = int(float(os.getenv("TELEGRAM_UPLOAD_LIMIT_MB", "50")) * 1024 * 1024)
+# Размер части с запасом на multipart-обёртку
+CHUNK_SIZE = int(float(os.getenv("CHUNK_SIZE_MB", "45")) * 1024 * 1024)
+CHUNK_UPLOAD_CONCURRENCY = int(os.getenv("CHUNK_UPLOAD_CONCURRENCY", "3"))
+# Не чаще одного сообщения в чат за интервал (лимит Telegram ~1 сообщение/с на чат)
+CHUNK_UPLOAD_INTERVAL = float(os.getenv("CHUNK_UPLOAD_INTERVAL", "1.0"))
+CHUNK_UPLOAD_RETRIES = 3
+
+
+class _PartWriter:
+    """
+    Файлоподобный приёмник для GzipFile: пишет поток в part001, part002, ...
+    не больше chunk_size байт каждая и считает SHA-256 частей и всего потока.
+    """
+
+    def __init__(self, directory: str, name: str, chunk_size: int):
+        self.directory = directory
+        self.name = name
+        self.chunk_size = chunk_size
+        self.parts: List[Dict] = []
+        self.total = hashlib.sha256()
+        self.size = 0
+        self._file = None
+        self._hash = None
+        self._written = 0
+
+    def _open_next(self):
+        self._close_current()
+        part_name = f"{self.name}.part{len(self.parts) + 1:03d}"
+        self._file = open(os.path.join(self.directory, part_name), "wb")
+        self._hash = hashlib.sha256()
+        self._written = 0
+        self.parts.append({"name": part_name})
+
+    def _close_current(self):
+        if self._file:
+            self._file.close()
+            self.parts[-1].update(size=self._written, sha256=self._hash.hexdigest())
+            self._file = None
+
+    def write(self, data: bytes) -> int:
+        view = memoryview(data)
+        while view:
+            if self._file is None or self._written >= self.chunk_size:
+                self._open_next()
+            piece = view[:self.chunk_size - self._written]
+            self._file.write(piece)
+            self._hash.update(piece)
+            self.total.update(piece)
+            self._written += len(piece)
+            self.size += len(piece)
+            view = view[len(piece):]
+        return len(data)
+
+    def flush(self):
+        if self._file:
+            self._file.flush()
+
+    def close(self):
+        self._close_current()
+
+
+def split_file(path: str, directory: str, chunk_size: int = CHUNK_SIZE, compress: Optional[bool] = None) -> Dict:
+    """
+    Разрезать файл на части в directory и записать манифест.
+    compress=None — сжимать всё, кроме уже сжатого (.gz). Возвращает манифест
+    с полем manifest_path.
+    """
+    if compress is None:
+        compress = not path.endswith(".gz")
+    name = os.path.basename(path) + (".gz" if compress else "")
+    writer = _PartWriter(directory, name, chunk_size)
+    original = hashlib.sha256()
+
+    with open(path, "rb") as src:
+        sink = gzip.GzipFile(filename=os.path.basename(path), mode="wb", fileobj=writer,
+                             compresslevel=6) if compress else writer
+        while True:
+            block = src.read(1024 * 1024)
+            if not block:
+                break
+            original.update(block)
+            sink.write(block)
+        if compress:
+            sink.close()
+    writer.close()
+
+    manifest = {
+        "file": name,
+        "original_file": os.path.basename(path),
+        "original_size": os.path.getsize(path),
+        "original_sha256": original.hexdigest(),
+        "compressed": compress,
+        "size": writer.size,
+        "sha256": writer.total.hexdigest(),
+        "parts": writer.parts,
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+    }
+    manifest_path = os.path.join(directory, f"{name}.manifest.json")
+    with open(manifest_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    return {**manifest, "manifest_path": manifest_path}
+
+
+class _ChatThrottle:
+    """Интервал между отправками в один чат при параллельной загрузке частей"""
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._lock = asyncio.Lock()
+        self._last = 0.0
+
+    async def wait(self):
+        async with self._lock:
+            delay = self._last + self.interval - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            self._last = time.monotonic()
+
+
+async def _send_part(bot: Bot, chat_id: int, path: str, caption: str,
+                     semaphore: asyncio.Semaphore, throttle: _ChatThrottle):
+    async with semaphore:
+        for attempt in range(1, CHUNK_UPLOAD_RETRIES + 1):
+            await throttle.wait()
+            try:
+                return await bot.send_document(chat_id, document=FSInputFile(path), caption=caption)
+            except TelegramRetryAfter as e:
+                logger.warning(f"Flood control при отправке {os.path.basename(path)}: ждём {e.retry_after} с")
+                await asyncio.sleep(e.retry_after)
+            except TelegramNetworkError as e:
+                if attempt == CHUNK_UPLOAD_RETRIES:
+                    raise
+                logger.warning(f"Сеть при отправке {os.path.basename(path)} (попытка {attempt}): {e}")
+                await asyncio.sleep(2 ** attempt)
+        raise RuntimeError(f"Не удалось отправить {os.path.basename(path)}")
+
+
+async def send_file_chunked(bot: Bot, chat_id: int, path: str, caption: str = "",
+                            limit: int = TELEGRAM_UPLOAD_LIMIT, chunk_size: int = CHUNK_SIZE) -> int:
+    """
+    Отправить файл документом; если он больше лимита — частями с манифестом.
+    Возвращает число отправленных документов.
+    """
+    if os.path.getsize(path) <= limit:
+        await bot.send_document(chat_id, document=FSInputFile(path), caption=caption)
+        return 1
+
+    work_dir = tempfile.mkdtemp(prefix="parts_", dir=os.path.dirname(os.path.abspath(path)))
+    try:
+        manifest = await asyncio.to_thread(split_file, path, work_dir, chunk_size)
+        count = len(manifest["parts"])
+        logger.info(
+            f"{manifest['original_file']}: {manifest['original_size'] / 1024 / 1024:.1f} МБ → "
+            f"{count} частей по ≤{chunk_size / 1024 / 1024:.0f} МБ"
+        )
+
+        semaphore = asyncio.Semaphore(CHUNK_UPLOAD_CONCURRENCY)
+        throttle = _ChatThrottle(CHUNK_UPLOAD_INTERVAL)
+        tasks = [
+            asyncio.create_task(_send_part(bot, chat_id, os.path.join(work_dir, part["name"]),
+                                           f"📦 Часть {index}/{count}", semaphore, throttle))
+            for index, part in enumerate(manifest["parts"], start=1)
+        ]
+        try:
+            await asyncio.gather(*tasks)
+        except BaseException:
+            # Остальные части ещё читают файлы из work_dir — дождаться их
+            # отмены до удаления каталога в finally
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
+        # Манифест последним: его появление означает, что все части дошли
+        await _send_part(
+            bot, chat_id, manifest["manifest_path"],
+            (f"{caption}\n\n" if caption else "")
+            + f"🧩 Файл разбит на {count} частей ({manifest['size'] / 1024 / 1024:.1f} МБ)\n"
+              f"Сборка: python3 reassemble_parts.py {os.path.basename(manifest['manifest_path'])}",
+            semaphore, throttle
+        )
+        return count + 1
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
@@ -0,0 +1,353 @@
+# ==============================================================================
+# demand_forecast.py - Прогноз заказов бара по часам на ближайшие дни
+# ==============================================================================
+#
+# Модель — сезонный профиль «день недели x час» по истории заказов за
+# FORECAST_WEEKS недель (рабочая база и помесячные архивы retention.py):
+#   • дни разбиты по учётному дню (business_day.py), часы — местные;
+#   • недели взвешены экспоненциально (FORECAST_DECAY за неделю назад),
+#     чтобы начало сезона быстрее вытесняло межсезонье;
+#   • редкие ячейки сглаживаются к среднему того же часа по всем дням;
+#   • верхняя граница — среднее + 1.28 стандартного отклонения (≈80-й
+#     перцентиль): по ней удобно ставить смену;
+#   • топ позиций — ожидаемое количество на день недели.
+#
+# Модель обучается за доли секунды (NumPy), хранится в forecast_model и
+# переобучается ночью планировщиком analytics_handler.setup_scheduler.
+# /forecast в боте показывает прогноз и график.
+#
+#   python3 demand_forecast.py --days 3
+#   python3 demand_forecast.py --train
+#
+# Используется ботом (/forecast, планировщик) и из командной строки.
+# Столбец business_day в базе и архивах должен уже быть: его добавляют
+# init_db бота и retention.py, здесь схема заказов не меняется.
+
+import argparse
+import asyncio
+import io
+import json
+import os
+import sqlite3
+import sys
+import time
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from typing import Dict, Optional
+
+import matplotlib
+matplotlib.use('Agg')  # Для работы без GUI
+import matplotlib.pyplot as plt
+import numpy as np
+
+from business_day import BUSINESS_DAY_CUTOFF_HOUR, BUSINESS_TZ, business_today
+from order_history import archives_between
+from retention import ARCHIVE_DIR, DB_FILE
+
+FORECAST_WEEKS = int(os.getenv("FORECAST_WEEKS", "8"))
+FORECAST_DAYS = int(os.getenv("FORECAST_DAYS", "3"))
+FORECAST_DECAY = float(os.getenv("FORECAST_DECAY", "0.85"))
+FORECAST_TOP_ITEMS = int(os.getenv("FORECAST_TOP_ITEMS", "5"))
+# Ночное переобучение по планировщику (часы по Asia/Almaty, пусто — только по /forecast)
+FORECAST_HOUR = os.getenv("FORECAST_HOUR", "5")
+
+# Вес среднего по часу при сглаживании: столько «виртуальных недель»
+FORECAST_SMOOTHING = 2.0
+# z для верхней границы (~80-й перцентиль)
+FORECAST_UPPER_Z = 1.28
+# Модель старше этого переобучается при запросе прогноза
+FORECAST_MAX_AGE_HOURS = 36
+
+WEEKDAYS = ["Пн", "Вт", "Ср", "Чт", "Пт", "Сб", "Вс"]
+# Часы учётного дня по порядку: с часа отсечки до следующей ночи
+BUSINESS_HOURS = [(BUSINESS_DAY_CUTOFF_HOUR + offset) % 24 for offset in range(24)]
+
+FORECAST_SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS forecast_model (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        trained_at TIMESTAMP NOT NULL,
+        trained_through TEXT NOT NULL,
+        weeks INTEGER NOT NULL,
+        orders INTEGER NOT NULL,
+        hourly_mean TEXT NOT NULL,
+        hourly_upper TEXT NOT NULL,
+        daily_upper TEXT NOT NULL,
+        items TEXT NOT NULL
+    )
+    """,
+]
+
+
+class ForecastError(Exception):
+    pass
+
+
+def _utc_offset() -> int:
+    """Смещение BUSINESS_TZ в секундах (в Казахстане нет летнего времени)"""
+    return int(datetime.now(BUSINESS_TZ).utcoffset().total_seconds())
+
+
+def _day_number(day: str) -> int:
+    return (date.fromisoformat(day) - date(1970, 1, 1)).days
+
+
+def _weekday(day_number) -> np.ndarray:
+    """Номер дня от 1970-01-01 (четверг) -> 0 = понедельник"""
+    return (np.asarray(day_number) + 3) % 7
+
+# ===== ИСТОРИЯ =====
+
+def _load_orders(conn: sqlite3.Connection, first_day: str, archive_dir: str):
+    """(секунды UTC, items JSON) заказов с учётного дня first_day: рабочая база + архивы"""
+    query = """
+        SELECT CAST(strftime('%s', created_at) AS INTEGER), items
+        FROM {schema}.orders
+        WHERE business_day >= ? AND created_at IS NOT NULL
+    """
+    rows = conn.execute(query.format(schema="main"), (first_day,)).fetchall()
+    for _, path in archives_between(first_day, "9999-12-31", archive_dir):
+        conn.execute("ATTACH DATABASE ? AS arch", (f"file:{path}?mode=ro",))
+        try:
+            rows += conn.execute(query.format(schema="arch"), (first_day,)).fetchall()
+        finally:
+            conn.execute("DETACH DATABASE arch")
+    return rows
+
+# ===== ОБУЧЕНИЕ =====
+
+def fit_forecast(conn: sqlite3.Connection, weeks: int = FORECAST_WEEKS, archive_dir: str = ARCHIVE_DIR) -> Dict:
+    """
+    Профиль по полным учётным дням [сегодня - weeks недель, сегодня):
+        {"hourly_mean": [[7 x 24]], "hourly_upper": [[7 x 24]], "daily_upper": [7],
+         "items": {день недели: [[позиция, в день]]}, "orders", "weeks", "trained_through"}
+    Часы в матрицах — местные часы 0..23.
+    """
+    today = _day_number(business_today())
+    first = today - weeks * 7
+    rows = _load_orders(conn, (date(1970, 1, 1) + timedelta(days=first)).isoformat(), archive_dir)
+    if not rows:
+        raise ForecastError("Нет заказов для обучения прогноза")
+
+    local = np.array([row[0] for row in rows], dtype=np.int64) + _utc_offset()
+    day = (local - BUSINESS_DAY_CUTOFF_HOUR * 3600) // 86400
+    hour = (local // 3600) % 24
+    inside = (day >= first) & (day < today)
+    if not inside.any():
+        raise ForecastError("Нет заказов за полные дни периода")
+
+    # Куб «день x час»; дни до первого заказа (бот ещё не работал) не считаются нулями
+    days = today - first
+    counts = np.zeros((days, 24))
+    np.add.at(counts, (day[inside] - first, hour[inside]), 1)
+    observed = np.arange(days) >= day[inside].min() - first
+    weekday = _weekday(np.arange(first, today))
+    weight = FORECAST_DECAY ** ((days - 1 - np.arange(days)) // 7) * observed
+
+    onehot = np.eye(7)[weekday]                        # день x день недели
+    total_weight = onehot.T @ weight                   # вес каждого дня недели
+    weighted = onehot.T @ (weight[:, None] * counts)   # день недели x час
+    squares = onehot.T @ (weight[:, None] * counts ** 2)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = np.nan_to_num(weighted / total_weight[:, None])
+        variance = np.nan_to_num(squares / total_weight[:, None]) - mean ** 2
+    hour_mean = (weight @ counts) / weight.sum()
+
+    # Сглаживание к среднему часа: дни недели с малой историей тянутся к нему сильнее
+    seen = (onehot.T @ observed)[:, None]
+    mean = (seen * mean + FORECAST_SMOOTHING * hour_mean) / (seen + FORECAST_SMOOTHING)
+    # Не меньше пуассоновского разброса — на малых числах выборочная дисперсия занижена
+    upper = mean + FORECAST_UPPER_Z * np.sqrt(np.maximum(variance, mean))
+    # Граница на день — по разбросу дневных сумм, а не сумма часовых границ
+    totals = counts.sum(axis=1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        daily_mean = weighted.sum(axis=1) / total_weight
+        daily_variance = np.nan_to_num((onehot.T @ (weight * totals ** 2)) / total_weight - daily_mean ** 2)
+    daily_upper = mean.sum(axis=1) + FORECAST_UPPER_Z * np.sqrt(np.maximum(daily_variance, mean.sum(axis=1)))
+
+    # Позиции: ожидаемое количество в день по дню недели
+    quantities = defaultdict(lambda: defaultdict(float))
+    kept = np.flatnonzero(inside)
+    for index, w, wd in zip(kept, weight[day[kept] - first], _weekday(day[kept])):
+        items_json = rows[index][1]
+        try:
+            items = json.loads(items_json or "[]")
+        except ValueError:
+            continue
+        for item in items:
+            if isinstance(item, dict) and item.get("name"):
+                quantities[int(wd)][item["name"]] += w * (item.get("quantity") or 1)
+    items = {}
+    for wd in range(7):
+        ranked = sorted(quantities[wd].items(), key=lambda pair: -pair[1])[:FORECAST_TOP_ITEMS * 2]
+        items[wd] = [[name, qty / total_weight[wd]] for name, qty in ranked] if total_weight[wd] else []
+
+    return {
+        "hourly_mean": np.round(mean, 3).tolist(),
+        "hourly_upper": np.round(upper, 3).tolist(),
+        "daily_upper": np.round(daily_upper, 3).tolist(),
+        "items": items,
+        "orders": int(inside.sum()),
+        "weeks": weeks,
+        "trained_through": (date(1970, 1, 1) + timedelta(days=today - 1)).isoformat(),
+    }
+
+
+def ensure_forecast_schema(conn: sqlite3.Connection):
+    for statement in FORECAST_SCHEMA:
+        conn.execute(statement)
+    conn.commit()
+
+
+def train_forecast(db_path: str = DB_FILE, archive_dir: str = ARCHIVE_DIR, weeks: int = FORECAST_WEEKS) -> Dict:
+    """Обучить модель и сохранить в forecast_model; возвращает модель"""
+    started = time.monotonic()
+    # uri=True — чтобы ATTACH принимал file:...?mode=ro
+    conn = sqlite3.connect(f"file:{db_path}", uri=True, timeout=30)
+    try:
+        ensure_forecast_schema(conn)
+        model = fit_forecast(conn, weeks, archive_dir)
+        conn.execute("""
+            INSERT OR REPLACE INTO forecast_model
+                (id, trained_at, trained_through, weeks, orders, hourly_mean, hourly_upper, daily_upper, items)
+            VALUES (1, CURRENT_TIMESTAMP, ?, ?, ?, ?, ?, ?, ?)
+        """, (model["trained_through"], model["weeks"], model["orders"], json.dumps(model["hourly_mean"]),
+              json.dumps(model["hourly_upper"]), json.dumps(model["daily_upper"]),
+              json.dumps(model["items"], ensure_ascii=False)))
+        conn.commit()
+    finally:
+        conn.close()
+    model["seconds"] = round(time.monotonic() - started, 3)
+    return model
+
+
+async def train_forecast_async(db_path: str = DB_FILE) -> Dict:
+    """train_forecast в рабочем потоке (ночной запуск планировщиком)"""
+    return await asyncio.to_thread(train_forecast, db_path)
+
+
+def load_forecast_model(db_path: str = DB_FILE) -> Optional[Dict]:
+    """Сохранённая модель, если она не старше FORECAST_MAX_AGE_HOURS"""
+    conn = sqlite3.connect(db_path, timeout=30)
+    try:
+        ensure_forecast_schema(conn)
+        row = conn.execute(f"""
+            SELECT trained_through, weeks, orders, hourly_mean, hourly_upper, daily_upper, items
+            FROM forecast_model
+            WHERE id = 1 AND trained_at >= datetime('now', '-{FORECAST_MAX_AGE_HOURS} hours')
+        """).fetchone()
+    finally:
+        conn.close()
+    if not row:
+        return None
+    return {
+        "trained_through": row[0], "weeks": row[1], "orders": row[2],
+        "hourly_mean": json.loads(row[3]), "hourly_upper": json.loads(row[4]), "daily_upper": json.loads(row[5]),
+        "items": {int(wd): ranked for wd, ranked in json.loads(row[6]).items()},
+    }
+
+# ===== ПРОГНОЗ =====
+
+def forecast(days: int = FORECAST_DAYS, db_path: str = DB_FILE, archive_dir: str = ARCHIVE_DIR) -> Dict:
+    """
+    Прогноз на учётные дни начиная с сегодняшнего:
+        {"model": {...}, "days": [{"day", "weekday", "orders", "upper", "peak_hour",
+                                   "hours": [(час, среднее, верх)], "items": [(позиция, штук)]}]}
+    Модели нет или она устарела — обучается заново.
+    """
+    model = load_forecast_model(db_path) or train_forecast(db_path, archive_dir)
+    mean, upper = np.array(model["hourly_mean"]), np.array(model["hourly_upper"])
+    start = date.fromisoformat(business_today())
+    result = []
+    for offset in range(days):
+        day = start + timedelta(days=offset)
+        wd = day.weekday()
+        hours = [(hour, float(mean[wd, hour]), float(upper[wd, hour])) for hour in BUSINESS_HOURS]
+        peak = max(hours, key=lambda entry: entry[1])
+        result.append({
+            "day": day.isoformat(),
+            "weekday": WEEKDAYS[wd],
+            "orders": float(mean[wd].sum()),
+            "upper": float(model["daily_upper"][wd]),
+            "peak_hour": peak[0],
+            "hours": hours,
+            "items": [(name, qty) for name, qty in model["items"].get(wd, [])[:FORECAST_TOP_ITEMS]],
+        })
+    return {"model": model, "days": result}
+
+
+async def forecast_async(days: int = FORECAST_DAYS, db_path: str = DB_FILE) -> Dict:
+    """forecast в рабочем потоке — event loop бота не блокируется"""
+    return await asyncio.to_thread(forecast, days, db_path)
+
+
+def format_forecast(result: Dict) -> str:
+    """Текст для /forecast (HTML)"""
+    model = result["model"]
+    lines = [f"🔮 <b>Прогноз заказов бара</b>\n<i>по {model['orders']} заказам за {model['weeks']} нед.</i>"]
+    for entry in result["days"]:
+        busy = sorted(entry["hours"], key=lambda hour: -hour[1])[:3]
+        lines.append(
+            f"\n📅 <b>{entry['weekday']} {entry['day'][8:]}.{entry['day'][5:7]}</b>: "
+            f"~{entry['orders']:.0f} заказов\n"
+            "  ⏰ Пик: " + ", ".join(f"{hour:02d}:00 (~{avg:.1f}, до {top:.0f})" for hour, avg, top in busy)
+        )
+        if entry["items"]:
+            lines.append("  🍽️ " + ", ".join(f"{name} ~{qty:.0f}" for name, qty in entry["items"]))
+    return "\n".join(lines)
+
+
+def generate_forecast_chart(result: Dict) -> io.BytesIO:
+    """Заказы по часам учётного дня: среднее и верхняя граница на каждый день"""
+    fig, ax = plt.subplots(figsize=(12, 6))
+    positions = np.arange(len(BUSINESS_HOURS))
+    for entry in result["days"]:
+        avg = [value for _, value, _ in entry["hours"]]
+        top = [value for _, _, value in entry["hours"]]
+        line, = ax.plot(positions, avg, marker='o', linewidth=2,
+                        label=f"{entry['weekday']} {entry['day'][8:]}.{entry['day'][5:7]}")
+        ax.fill_between(positions, avg, top, color=line.get_color(), alpha=0.15)
+
+    ax.set_xticks(positions)
+    ax.set_xticklabels([f"{hour:02d}" for hour in BUSINESS_HOURS])
+    ax.set_xlabel('Час (местное время)', fontsize=12)
+    ax.set_ylabel('Заказов в час', fontsize=12)
+    ax.set_title('Прогноз заказов бара (заливка — до 80-го перцентиля)', fontsize=14, fontweight='bold')
+    ax.grid(True, alpha=0.3)
+    ax.legend()
+    plt.tight_layout()
+
+    buf = io.BytesIO()
+    plt.savefig(buf, format='png', dpi=100, bbox_inches='tight')
+    buf.seek(0)
+    plt.close()
+    return buf
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Прогноз заказов бара Pelikan Bot")
+    parser.add_argument("--db", default=DB_FILE, help="путь к базе")
+    parser.add_argument("--archive-dir", default=ARCHIVE_DIR, help="каталог помесячных архивов")
+    parser.add_argument("--days", type=int, default=FORECAST_DAYS, help="дней вперёд")
+    parser.add_argument("--train", action="store_true", help="переобучить модель")
+    args = parser.parse_args()
+
+    try:
+        if args.train:
+            model = train_forecast(args.db, args.archive_dir)
+            print(f"✅ Модель обучена: {model['orders']} заказов за {model['weeks']} нед. ({model['seconds']} с)")
+        result = forecast(args.days, args.db, args.archive_dir)
+    except ForecastError as e:
+        print(f"❌ {e}")
+        return 1
+
+    for entry in result["days"]:
+        print(f"\n{entry['weekday']} {entry['day']}: ~{entry['orders']:.0f} заказов (до {entry['upper']:.0f})")
+        print("  " + " ".join(f"{hour:02d}:{avg:4.1f}" for hour, avg, _ in entry["hours"]))
+        for name, qty in entry["items"]:
+            print(f"  • {name}: ~{qty:.1f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
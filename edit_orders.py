@@ -15,7 +15,7 @@
     - Редактирование имён, комнат, статусов, сумм
     - Удаление ошибочных заказов
     - Анализ продаж (статистика, топ клиентов, средний чек)
-    - Очистка старых заказов
+    - Архивация старых заказов (data/archive/orders_YYYY-MM.db)
 
 КАК ПОЛЬЗОВАТЬСЯ:
     1. Подключитесь к VPS:
@@ -30,7 +30,8 @@
        3 - Редактировать заказ
        4 - Удалить заказ
        5 - Статистика и аналитика
-       6 - Очистка старых заказов (>30 дней)
+       6 - Архивация старых заказов (>30 дней)
+       7 - Поиск заказов (по имени клиента и блюдам)
        0 - Выход
 
 СТАТУСЫ ЗАКАЗОВ:
@@ -60,25 +61,36 @@
     Выберите: 5
     Выберите: 1
     
-    # Удалить старые заказы
+    # Архивировать старые заказы
     Выберите: 6
+    
+    # Найти заказы гостя
+    Выберите: 7
+    Что ищем: Иванов
 
 АВТОР: Создано для Pelikan Alakol Hotel Bot
 ДАТА: Январь 2026
 ================================================================================
 """
 
+import os
 import sqlite3
 import sys
 import json
-from datetime import datetime, timedelta
+
+from business_day import business_days_ago, business_today
+from order_history import OrderHistory, parse_period, shift_year
+from retention import RETENTION_DAYS, RetentionError, run_retention
+from search_index import SearchError, migrate_search_index, print_orders, search
 
 DB_PATH = '/root/pelikan-bot/data/orders.db'
+ARCHIVE_PATH = os.path.join(os.path.dirname(DB_PATH), 'archive')
 
 def show_orders(filter_type='all'):
     """Показать заказы с фильтром"""
     conn = sqlite3.connect(DB_PATH)
     cursor = conn.cursor()
+    params = ()
     
     if filter_type == 'active':
         query = """
@@ -88,13 +100,13 @@ def show_orders(filter_type='all'):
             ORDER BY created_at DESC
         """
     elif filter_type == 'today':
-        today = datetime.now().date().isoformat()
-        query = f"""
+        query = """
             SELECT order_id, client_name, room, status, total, created_at 
             FROM orders 
-            WHERE DATE(created_at) = '{today}'
+            WHERE business_day = ?
             ORDER BY created_at DESC
         """
+        params = (business_today(),)
     else:  # all
         query = """
             SELECT order_id, client_name, room, status, total, created_at 
@@ -103,7 +115,7 @@ def show_orders(filter_type='all'):
             LIMIT 50
         """
     
-    cursor.execute(query)
+    cursor.execute(query, params)
     orders = cursor.fetchall()
     
     if not orders:
@@ -238,10 +250,12 @@ def show_statistics():
         print("4. Топ-10 клиентов")
         print("5. Средний чек")
         print("6. Статистика по статусам")
+        print("7. Произвольный период / сезон (с архивом)")
+        print("8. Год к году по месяцам")
         print("0. Назад")
         print("="*50)
         
-        choice = input("\nВыберите (0-6): ").strip()
+        choice = input("\nВыберите (0-8): ").strip()
         
         if choice == '1':
             stats_for_period(1)
@@ -255,60 +269,76 @@ def show_statistics():
             average_check()
         elif choice == '6':
             status_statistics()
+        elif choice == '7':
+            custom_period_statistics()
+        elif choice == '8':
+            year_over_year()
         elif choice == '0':
             break
 
+def history():
+    """Рабочая база + помесячные архивы (order_history.py)"""
+    return OrderHistory(DB_PATH, ARCHIVE_PATH)
+
+def print_period_stats(title, stats):
+    print(f"\n📊 Статистика за {title}:")
+    print("="*50)
+    print(f"Всего заказов: {stats['orders']}")
+    print(f"Общая сумма: {stats['total']}₸")
+    print(f"Средний чек: {int(stats['avg_total'])}₸")
+    print(f"Минимальный чек: {stats['min_total'] or 0}₸")
+    print(f"Максимальный чек: {stats['max_total'] or 0}₸")
+    print("="*50)
+
 def stats_for_period(days):
     """Статистика за период"""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    
-    date_from = (datetime.now() - timedelta(days=days-1)).date().isoformat()
+    date_from = business_days_ago(days - 1)
     
-    cursor.execute("""
-        SELECT 
-            COUNT(*) as total_orders,
-            SUM(total) as total_sum,
-            AVG(total) as avg_check,
-            MIN(total) as min_check,
-            MAX(total) as max_check
-        FROM orders 
-        WHERE DATE(created_at) >= ?
-    """, (date_from,))
-    
-    stats = cursor.fetchone()
+    with history() as h:
+        stats = h.period(date_from)
     
     period_name = {1: "сегодня", 7: "последние 7 дней", 30: "последние 30 дней"}
+    print_period_stats(period_name.get(days, f'{days} дней'), stats)
+
+def custom_period_statistics():
+    """Период или сезон и тот же период годом раньше"""
+    raw = input("Период (2025-06-01 2025-08-31, 01.07.2025 или 'сезон 2025'): ").strip()
+    try:
+        date_from, date_to = parse_period(raw.split())
+    except ValueError:
+        print("❌ Неверный период")
+        return
     
-    print(f"\n📊 Статистика за {period_name.get(days, f'{days} дней')}:")
-    print("="*50)
-    print(f"Всего заказов: {stats[0] or 0}")
-    print(f"Общая сумма: {stats[1] or 0}₸")
-    print(f"Средний чек: {int(stats[2]) if stats[2] else 0}₸")
-    print(f"Минимальный чек: {stats[3] or 0}₸")
-    print(f"Максимальный чек: {stats[4] or 0}₸")
-    print("="*50)
+    with history() as h:
+        current = h.period(date_from, date_to)
+        previous = h.period(shift_year(date_from), shift_year(date_to))
     
-    conn.close()
+    print_period_stats(f"{date_from} — {date_to}", current)
+    if previous['orders']:
+        change = (current['total'] - previous['total']) / previous['total'] * 100 if previous['total'] else 0
+        print(f"Год назад: {previous['orders']} заказов на {previous['total']}₸ ({change:+.1f}% по сумме)")
+    else:
+        print("Год назад: нет данных")
+
+def year_over_year():
+    """Помесячное сравнение с прошлым годом"""
+    year = int(business_today()[:4])
+    with history() as h:
+        current = h.monthly(year)
+        previous = h.monthly(year - 1)
+    
+    print(f"\n📅 {year} vs {year - 1}:")
+    print("="*60)
+    print(f"Месяц | {year} заказов | {year} сумма | {year - 1} заказов | {year - 1} сумма")
+    print("="*60)
+    for now, before in zip(current, previous):
+        print(f"{now['month'][5:]:<5} | {now['orders']:<11} | {now['total']:<10} | {before['orders']:<11} | {before['total']}")
+    print("="*60 + "\n")
 
 def top_clients():
     """Топ клиентов по количеству заказов"""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    
-    cursor.execute("""
-        SELECT 
-            client_name,
-            room,
-            COUNT(*) as order_count,
-            SUM(total) as total_spent
-        FROM orders
-        GROUP BY client_name, room
-        ORDER BY order_count DESC, total_spent DESC
-        LIMIT 10
-    """)
-    
-    clients = cursor.fetchall()
+    with history() as h:
+        clients = h.top_clients(limit=10)
     
     print("\n🏆 ТОП-10 КЛИЕНТОВ:")
     print("="*70)
@@ -319,25 +349,23 @@ def top_clients():
         print(f"{i:<5} | {row[0]:<14} | {row[1]:<7} | {row[2]:<7} | {row[3]}₸")
     
     print("="*70 + "\n")
-    conn.close()
 
 def average_check():
     """Средний чек"""
     conn = sqlite3.connect(DB_PATH)
     cursor = conn.cursor()
     
-    # Общий средний чек
-    cursor.execute("SELECT AVG(total) FROM orders")
-    avg_all = cursor.fetchone()[0]
+    # Общий средний чек (с архивом)
+    with history() as h:
+        avg_all = h.period()['avg_total']
     
     # Средний чек за последние 7 дней
-    date_from = (datetime.now() - timedelta(days=6)).date().isoformat()
-    cursor.execute("SELECT AVG(total) FROM orders WHERE DATE(created_at) >= ?", (date_from,))
+    date_from = business_days_ago(6)
+    cursor.execute("SELECT AVG(total) FROM orders WHERE business_day >= ?", (date_from,))
     avg_week = cursor.fetchone()[0]
     
     # Средний чек за сегодня
-    today = datetime.now().date().isoformat()
-    cursor.execute("SELECT AVG(total) FROM orders WHERE DATE(created_at) = ?", (today,))
+    cursor.execute("SELECT AVG(total) FROM orders WHERE business_day = ?", (business_today(),))
     avg_today = cursor.fetchone()[0]
     
     print("\n💰 СРЕДНИЙ ЧЕК:")
@@ -351,66 +379,71 @@ def average_check():
 
 def status_statistics():
     """Статистика по статусам"""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    
-    cursor.execute("""
-        SELECT 
-            status,
-            COUNT(*) as count,
-            SUM(total) as total_sum
-        FROM orders
-        GROUP BY status
-        ORDER BY count DESC
-    """)
+    with history() as h:
+        stats = h.period()
     
-    statuses = cursor.fetchall()
+    statuses = sorted(stats['statuses'].items(), key=lambda item: -item[1][0])
     
     print("\n📋 СТАТИСТИКА ПО СТАТУСАМ:")
     print("="*60)
     print("Статус      | Количество | Сумма")
     print("="*60)
     
-    for row in statuses:
-        print(f"{row[0]:<11} | {row[1]:<10} | {row[2]}₸")
+    for status, (count, total_sum) in statuses:
+        print(f"{status:<11} | {count:<10} | {total_sum}₸")
     
     print("="*60 + "\n")
-    conn.close()
 
 def cleanup_old_orders():
-    """Очистка старых заказов"""
-    print("\n⚠️  ОЧИСТКА СТАРЫХ ЗАКАЗОВ")
+    """Архивация старых заказов: перенос в data/archive/orders_YYYY-MM.db"""
+    print("\n⚠️  АРХИВАЦИЯ СТАРЫХ ЗАКАЗОВ")
     print("="*50)
     
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    
-    # Показать сколько будет удалено
-    cursor.execute("""
-        SELECT COUNT(*), SUM(total) 
-        FROM orders 
-        WHERE created_at < datetime('now', '-30 days')
-    """)
-    count, total = cursor.fetchone()
+    # Показать сколько будет перенесено
+    try:
+        preview = run_retention(DB_PATH, ARCHIVE_PATH, RETENTION_DAYS, dry_run=True)
+    except RetentionError as e:
+        print(f"❌ {e}")
+        return
     
-    if count == 0:
-        print("✅ Нет заказов старше 30 дней")
-        conn.close()
+    if not preview['months']:
+        print(f"✅ Нет заказов старше {RETENTION_DAYS} дней")
         return
     
-    print(f"Будет удалено заказов: {count}")
-    print(f"На общую сумму: {total or 0}₸")
+    for month in preview['months']:
+        print(f"  {month['month']}: {month['orders']} заказов на {month['total']}₸")
+    print(f"Будет перенесено в архив: {sum(m['orders'] for m in preview['months'])} заказов")
+    print(f"Архив: {ARCHIVE_PATH}")
     
-    confirm = input("\nПродолжить удаление? (yes/no): ").strip().lower()
+    confirm = input("\nПродолжить архивацию? (yes/no): ").strip().lower()
     
     if confirm == 'yes':
-        cursor.execute("DELETE FROM orders WHERE created_at < datetime('now', '-30 days')")
-        conn.commit()
-        print(f"✅ Удалено {count} заказов")
+        try:
+            result = run_retention(DB_PATH, ARCHIVE_PATH, RETENTION_DAYS)
+        except RetentionError as e:
+            print(f"❌ {e}")
+            return
+        print(f"✅ Перенесено в архив {result['archived']} заказов "
+              f"(освобождено {result['freed_pages'] * result['page_size'] / 1024 / 1024:.1f} МБ)")
     else:
         print("❌ Отмена")
-    
-    conn.close()
+
+def search_orders():
+    """Поиск заказов по имени клиента и названиям позиций"""
+    query = input("Что ищем (имя клиента, блюдо): ").strip()
+    if not query:
+        print("❌ Пустой запрос")
+        return
+    migrate_search_index(DB_PATH)
+    try:
+        results = search(query, DB_PATH, reviews=False)
+    except SearchError as e:
+        print(f"❌ {e}")
+        return
+    if not results["orders"]:
+        print("\n📭 Ничего не найдено (архивные заказы в поиск не входят)")
+        return
+    print_orders(results["orders"])
 
 def main():
     while True:
@@ -422,11 +455,12 @@ def main():
         print("3. Редактировать заказ")
         print("4. Удалить заказ")
         print("5. Статистика и аналитика")
-        print("6. Очистка старых заказов (>30 дней)")
+        print(f"6. Архивация старых заказов (>{RETENTION_DAYS} дней)")
+        print("7. Поиск заказов")
         print("0. Выход")
         print("="*50)
         
-        choice = input("\nВыберите действие (0-6): ").strip()
+        choice = input("\nВыберите действие (0-7): ").strip()
         
         if choice == '1':
             print("\nФильтр:")
@@ -455,6 +489,9 @@ def main():
         elif choice == '6':
             cleanup_old_orders()
         
+        elif choice == '7':
+            search_orders()
+        
         elif choice == '0':
             print("👋 До свидания!")
             sys.exit(0)
@@ -29,6 +29,7 @@
        2 - Посмотреть полный отзыв (введите ID)
        3 - Редактировать отзыв (введите ID)
        4 - Удалить отзыв (введите ID)
+       5 - Поиск по отзывам (например, «холодный душ»)
        0 - Выход
     
     4. При редактировании можно изменить:
@@ -38,7 +39,7 @@
        - Минусы (что не понравилось)
        - Комментарий (общий отзыв)
        - Публикацию (показывать на сайте или нет)
-       - Статус (pending/approved/rejected)
+       - Статус (pending/approved/rejected/flagged)
 
 ВАЖНО:
     - База данных: /root/pelikan-bot/data/orders.db
@@ -50,6 +51,8 @@
     - pending: На модерации (не виден на сайте)
     - approved: Одобрен (может быть опубликован)
     - rejected: Отклонён (не виден на сайте)
+    - flagged: Похож на дубликат или флуд (review_guard.py) — ждёт модерации,
+      не учитывается в аналитике; причина показывается в карточке отзыва
 
 ПУБЛИКАЦИЯ:
     - is_published = 0: Отзыв НЕ показывается на сайте
@@ -82,6 +85,10 @@
     Выберите: 4
     ID отзыва: 3
     Подтверждение: yes
+    
+    # Найти жалобы на уборку
+    Выберите: 5
+    Что ищем: грязно
 
 АВТОР: Создано для Pelikan Alakol Hotel Bot
 ДАТА: Январь 2026
@@ -91,6 +98,8 @@
 import sqlite3
 import sys
 
+from search_index import SearchError, migrate_search_index, print_reviews, search
+
 DB_PATH = '/root/pelikan-bot/data/orders.db'
 
 def show_reviews():
@@ -147,6 +156,9 @@ def view_review(review_id):
 ║  Дата создания: {row[15]}
 ╚════════════════════════════════════════════════════════════════╝
     """)
+    spam_reason = cursor.execute("SELECT spam_reason FROM reviews WHERE id = ?", (review_id,)).fetchone()[0]
+    if spam_reason:
+        print(f"⚠️  На проверке: {spam_reason}")
     conn.close()
 
 def edit_review(review_id):
@@ -227,6 +239,23 @@ def delete_review(review_id):
     else:
         print("❌ Отмена")
 
+def search_reviews():
+    """Поиск по тексту отзывов (имя, плюсы, минусы, комментарий)"""
+    query = input("Что ищем (например: холодный душ): ").strip()
+    if not query:
+        print("❌ Пустой запрос")
+        return
+    migrate_search_index(DB_PATH)
+    try:
+        results = search(query, DB_PATH, orders=False)
+    except SearchError as e:
+        print(f"❌ {e}")
+        return
+    if not results["reviews"]:
+        print("\n📭 Ничего не найдено")
+        return
+    print_reviews(results["reviews"])
+
 def main():
     while True:
         print("\n" + "="*50)
@@ -236,10 +265,11 @@ def main():
         print("2. Посмотреть отзыв")
         print("3. Редактировать отзыв")
         print("4. Удалить отзыв")
+        print("5. Поиск по отзывам")
         print("0. Выход")
         print("="*50)
         
-        choice = input("\nВыберите действие (0-4): ").strip()
+        choice = input("\nВыберите действие (0-5): ").strip()
         
         if choice == '1':
             show_reviews()
@@ -265,6 +295,9 @@ def main():
             else:
                 print("❌ Введите число")
         
+        elif choice == '5':
+            search_reviews()
+        
         elif choice == '0':
             print("👋 До свидания!")
             sys.exit(0)
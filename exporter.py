@@ -0,0 +1,255 @@
+# ==============================================================================
+# exporter.py - Потоковая выгрузка заказов в CSV / XLSX / Parquet за период
+# ==============================================================================
+#
+# Строки читаются курсором порциями по EXPORT_BATCH (сначала помесячные
+# архивы retention.py, затем рабочая база) и сразу пишутся в файл, поэтому
+# память не зависит от длины периода. Каждая позиция из items — отдельная
+# строка (данные заказа повторяются), в XLSX дополнительно лист с заказами
+# целиком. Выгрузка идёт в рабочем потоке, файлы старше EXPORT_TTL_HOURS
+# удаляются.
+
+import asyncio
+import csv
+import json
+import logging
+import os
+import sqlite3
+import tempfile
+import time
+from datetime import date, timedelta
+from typing import Dict, Iterator, Optional, Tuple
+
+from aiogram import Bot
+
+from chunked_upload import send_file_chunked
+from order_history import archives_between, parse_period
+
+logger = logging.getLogger(__name__)
+
+DB_FILE = os.getenv("DB_FILE", "orders.db")
+DATA_DIR = os.getenv("DATA_DIR", "/app/data")
+EXPORT_DIR = f"{DATA_DIR}/exports"
+EXPORT_TTL_HOURS = float(os.getenv("EXPORT_TTL_HOURS", "24"))
+EXPORT_BATCH = int(os.getenv("EXPORT_BATCH", "1000"))
+# Сколько выгрузок готовится одновременно (остальные ждут очереди)
+EXPORT_CONCURRENCY = int(os.getenv("EXPORT_CONCURRENCY", "1"))
+
+EXPORT_FORMATS = ("csv", "xlsx", "parquet")
+
+# Порядок строк — по created_at; период выбирается по индексу business_day
+EXPORT_SCHEMA = [
+    "CREATE INDEX IF NOT EXISTS idx_orders_created_at ON orders(created_at)",
+]
+
+ORDER_COLUMNS = ['ID', 'Дата', 'Клиент', 'Комната', 'Telegram ID', 'Username', 'Статус', 'Сумма']
+LINE_COLUMNS = ORDER_COLUMNS[:-1] + ['Сумма заказа', 'Позиция', 'Цена', 'Кол-во', 'Сумма позиции']
+
+_export_semaphore = asyncio.Semaphore(EXPORT_CONCURRENCY)
+# Ссылки на фоновые задачи, чтобы их не собрал сборщик мусора
+_export_tasks = set()
+
+# ===== ЧТЕНИЕ =====
+
+def parse_export_args(args: Optional[str]) -> Tuple[str, str, str]:
+    """
+    '/export 2026-07-01 2026-07-31 xlsx' -> ('2026-07-01', '2026-07-31', 'xlsx').
+    Период — как в order_history.parse_period (даты, 'season 2025').
+    ValueError при неверных аргументах.
+    """
+    parts = (args or "").split()
+    fmt = "csv"
+    if parts and parts[-1].lower() in EXPORT_FORMATS:
+        fmt = parts.pop().lower()
+    return (*parse_period(parts), fmt)
+
+
+def iter_order_lines(db_path: str, date_from: str, date_to: str) -> Iterator[Tuple[tuple, list]]:
+    """
+    (заказ, позиции) за учётные дни периода по порядку created_at; курсор
+    читается порциями. Сначала помесячные архивы (retention.py), затем рабочая база.
+    """
+    date_end = (date.fromisoformat(date_to) + timedelta(days=1)).isoformat()
+    sources = [path for _, path in archives_between(date_from, date_end)] + [db_path]
+    for path in sources:
+        conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+        try:
+            cursor = conn.execute("""
+                SELECT order_id, created_at, client_name, room, telegram_user_id,
+                       telegram_username, status, total, items
+                FROM orders
+                WHERE business_day >= ? AND business_day < ?
+                ORDER BY created_at
+            """, (date_from, date_end))
+            while True:
+                rows = cursor.fetchmany(EXPORT_BATCH)
+                if not rows:
+                    break
+                for row in rows:
+                    try:
+                        items = json.loads(row[8] or "[]")
+                    except ValueError:
+                        items = []
+                    yield row[:8], items if isinstance(items, list) else []
+        finally:
+            conn.close()
+
+
+def _line_rows(order: tuple, items: list) -> Iterator[list]:
+    """Строки позиций заказа; заказ без позиций — одна строка с пустыми полями"""
+    if not items:
+        yield [*order, None, None, None, None]
+        return
+    for item in items:
+        if not isinstance(item, dict):
+            continue
+        price = item.get("price") or 0
+        quantity = item.get("quantity", 1)
+        yield [*order, item.get("name"), price, quantity, price * quantity]
+
+# ===== ФОРМАТЫ =====
+
+def _write_csv(path: str, source: Iterator) -> Tuple[int, int]:
+    orders = lines = 0
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(LINE_COLUMNS)
+        for order, items in source:
+            orders += 1
+            for row in _line_rows(order, items):
+                writer.writerow(row)
+                lines += 1
+    return orders, lines
+
+
+def _write_xlsx(path: str, source: Iterator) -> Tuple[int, int]:
+    # write_only: строки сразу уходят во временный файл листа, а не в память
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    orders_sheet = workbook.create_sheet("Заказы")
+    lines_sheet = workbook.create_sheet("Позиции")
+    orders_sheet.append(ORDER_COLUMNS)
+    lines_sheet.append(LINE_COLUMNS)
+    orders = lines = 0
+    for order, items in source:
+        orders_sheet.append(list(order))
+        orders += 1
+        for row in _line_rows(order, items):
+            lines_sheet.append(row)
+            lines += 1
+    workbook.save(path)
+    return orders, lines
+
+
+def _write_parquet(path: str, source: Iterator) -> Tuple[int, int]:
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise RuntimeError("Parquet недоступен: установите pyarrow")
+
+    schema = pa.schema([
+        ("order_id", pa.string()), ("created_at", pa.string()), ("client_name", pa.string()),
+        ("room", pa.string()), ("telegram_user_id", pa.int64()), ("telegram_username", pa.string()),
+        ("status", pa.string()), ("order_total", pa.int64()), ("item_name", pa.string()),
+        ("item_price", pa.int64()), ("item_quantity", pa.int64()), ("line_total", pa.int64()),
+    ])
+
+    def table(rows: list):
+        if not rows:
+            return schema.empty_table()
+        return pa.Table.from_arrays(
+            [pa.array(column, type=field.type) for column, field in zip(zip(*rows), schema)], schema=schema
+        )
+
+    orders = lines = 0
+    batch = []
+    # Одна группа строк на порцию — в памяти не больше EXPORT_BATCH * 10 строк
+    with pq.ParquetWriter(path, schema, compression="zstd") as writer:
+        for order, items in source:
+            orders += 1
+            batch.extend(_line_rows(order, items))
+            if len(batch) >= EXPORT_BATCH * 10:
+                writer.write_table(table(batch))
+                lines += len(batch)
+                batch = []
+        if batch or not lines:
+            writer.write_table(table(batch))
+            lines += len(batch)
+    return orders, lines
+
+
+WRITERS = {"csv": _write_csv, "xlsx": _write_xlsx, "parquet": _write_parquet}
+
+
+def export_orders(date_from: str, date_to: str, fmt: str = "csv",
+                  db_path: str = DB_FILE, export_dir: str = EXPORT_DIR) -> Dict:
+    """Выгрузить заказы за период [date_from, date_to] в файл формата fmt"""
+    os.makedirs(export_dir, exist_ok=True)
+    started = time.monotonic()
+    period = date_from if date_from == date_to else f"{date_from}_{date_to}"
+    path = os.path.join(export_dir, f"orders_{period}.{fmt}")
+    fd, partial = tempfile.mkstemp(dir=export_dir, suffix=".partial")
+    os.close(fd)
+    try:
+        orders, lines = WRITERS[fmt](partial, iter_order_lines(db_path, date_from, date_to))
+        os.replace(partial, path)
+    finally:
+        if os.path.exists(partial):
+            os.remove(partial)
+    return {
+        "path": path,
+        "orders": orders,
+        "lines": lines,
+        "size": os.path.getsize(path),
+        "seconds": round(time.monotonic() - started, 2),
+    }
+
+
+def cleanup_exports(export_dir: str = EXPORT_DIR, ttl_hours: float = EXPORT_TTL_HOURS) -> int:
+    """Удалить выгрузки старше ttl_hours"""
+    if not os.path.isdir(export_dir):
+        return 0
+    cutoff = time.time() - ttl_hours * 3600
+    removed = 0
+    for name in os.listdir(export_dir):
+        path = os.path.join(export_dir, name)
+        if os.path.isfile(path) and os.path.getmtime(path) < cutoff:
+            os.remove(path)
+            removed += 1
+    if removed:
+        logger.info(f"Удалено старых выгрузок: {removed}")
+    return removed
+
+# ===== ФОНОВАЯ ВЫГРУЗКА =====
+
+async def _run_export(bot: Bot, chat_id: int, date_from: str, date_to: str, fmt: str):
+    period = date_from if date_from == date_to else f"{date_from} — {date_to}"
+    try:
+        async with _export_semaphore:
+            result = await asyncio.to_thread(export_orders, date_from, date_to, fmt)
+        if not result["orders"]:
+            await bot.send_message(chat_id, f"📭 Нет заказов за {period}")
+            return
+        await send_file_chunked(
+            bot, chat_id, result["path"],
+            caption=f"📊 Отчёт за {period}\n"
+                    f"Всего заказов: {result['orders']} · позиций: {result['lines']}"
+        )
+        logger.info(
+            f"Выгрузка {fmt} за {period}: {result['orders']} заказов, "
+            f"{result['size'] / 1024:.1f} KB, {result['seconds']} с"
+        )
+    except Exception as e:
+        logger.error(f"Ошибка выгрузки {fmt} за {period}: {e}")
+        await bot.send_message(chat_id, f"❌ Ошибка выгрузки: {e}")
+    finally:
+        await asyncio.to_thread(cleanup_exports)
+
+
+def start_export(bot: Bot, chat_id: int, date_from: str, date_to: str, fmt: str = "csv"):
+    """Запустить выгрузку фоном — хендлер отвечает сразу"""
+    task = asyncio.create_task(_run_export(bot, chat_id, date_from, date_to, fmt))
+    _export_tasks.add(task)
+    task.add_done_callback(_export_tasks.discard)
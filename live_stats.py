@@ -0,0 +1,127 @@
+# ==============================================================================
+# live_stats.py - Счётчики заказов за текущий учётный день в памяти процесса
+# ==============================================================================
+#
+# «📊 Статистика за день» и /stats без аргументов читают отсюда, а не из
+# SQLite. save_order и handle_status_button обновляют счётчики за O(1) сразу
+# после коммита; при старте бота и после смены учётного дня они пересчитываются
+# из базы одним запросом (так подтягиваются и правки через edit_orders.py).
+# LIVE_STATS_VERIFY=1 — каждое чтение сверяется с SQL, расхождение пишется
+# в лог и счётчики пересобираются.
+
+import logging
+import os
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+import aiosqlite
+
+from business_day import business_today
+
+logger = logging.getLogger(__name__)
+
+LIVE_STATS_VERIFY = os.getenv("LIVE_STATS_VERIFY", "0") == "1"
+
+
+class LiveDayStats:
+    """
+    Заказов, сумма и разбивка по статусам за учётный день.
+
+    Для заказов дня хранится (статус, сумма) — смена статуса переносит
+    заказ между счётчиками без запроса к базе. Заказы прошлых дней не
+    отслеживаются: их смена статуса на сегодняшнюю статистику не влияет.
+    """
+
+    def __init__(self):
+        self.day: Optional[str] = None
+        self.count = 0
+        self.revenue = 0
+        self.statuses: Counter = Counter()
+        self._orders: Dict[str, Tuple[str, int]] = {}
+
+    def __len__(self) -> int:
+        return len(self._orders)
+
+    def _reset(self, day: str):
+        self.day = day
+        self.count = 0
+        self.revenue = 0
+        self.statuses = Counter()
+        self._orders = {}
+
+    def _roll(self):
+        """Новый учётный день начинается с нуля до пересчёта из базы"""
+        today = business_today()
+        if self.day != today:
+            self._reset(today)
+
+    @property
+    def stale(self) -> bool:
+        return self.day != business_today()
+
+    # ===== ОБНОВЛЕНИЕ =====
+
+    def record_order(self, order_id: str, total, status: str = "принят"):
+        """Новый заказ (после коммита INSERT)"""
+        self._roll()
+        if order_id in self._orders:
+            return
+        total = total or 0
+        self._orders[order_id] = (status, total)
+        self.count += 1
+        self.revenue += total
+        self.statuses[status] += 1
+
+    def record_status(self, order_id: str, status: str):
+        """Смена статуса (после коммита UPDATE)"""
+        self._roll()
+        entry = self._orders.get(order_id)
+        if entry is None or entry[0] == status:
+            return
+        old_status, total = entry
+        self._orders[order_id] = (status, total)
+        self.statuses[old_status] -= 1
+        if not self.statuses[old_status]:
+            del self.statuses[old_status]
+        self.statuses[status] += 1
+
+    async def rebuild(self, db_path: str):
+        """Пересчитать счётчики текущего учётного дня из базы"""
+        day = business_today()
+        async with aiosqlite.connect(db_path) as db:
+            cursor = await db.execute(
+                "SELECT order_id, status, total FROM orders WHERE business_day = ?", (day,)
+            )
+            rows = await cursor.fetchall()
+        self._reset(day)
+        for order_id, status, total in rows:
+            self.record_order(order_id, total, status)
+        logger.info(f"Счётчики за {day} пересчитаны: {self.count} заказов, {self.revenue}₸")
+
+    # ===== ЧТЕНИЕ =====
+
+    def snapshot(self) -> Tuple[int, int, List[Tuple[str, int]]]:
+        """(заказов, сумма, [(статус, заказов)]) — в формате get_day_stats"""
+        return self.count, self.revenue, sorted(self.statuses.items())
+
+    async def verify(self, db_path: str) -> bool:
+        """Сверить счётчики с SQL; при расхождении — лог и пересчёт"""
+        async with aiosqlite.connect(db_path) as db:
+            cursor = await db.execute(
+                "SELECT COUNT(*), COALESCE(SUM(total), 0) FROM orders WHERE business_day = ?", (self.day,)
+            )
+            count, revenue = await cursor.fetchone()
+            cursor = await db.execute(
+                "SELECT status, COUNT(*) FROM orders WHERE business_day = ? GROUP BY status ORDER BY status",
+                (self.day,)
+            )
+            statuses = [tuple(row) for row in await cursor.fetchall()]
+        expected = (count, revenue, statuses)
+        if self.snapshot() == expected:
+            return True
+        logger.warning(f"Счётчики за {self.day} разошлись с базой: {self.snapshot()} != {expected}")
+        await self.rebuild(db_path)
+        return False
+
+
+live_stats = LiveDayStats()
@@ -0,0 +1,208 @@
+# ==============================================================================
+# loop_monitor.py - Задержка event loop и поиск блокирующих вызовов (/perf)
+# ==============================================================================
+
+import asyncio
+import html
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from aiogram import Router
+from aiogram.filters import Command
+from aiogram.types import Message
+
+from metrics import registry, HANDLER_DURATION
+
+logger = logging.getLogger(__name__)
+
+ADMIN_IDS = list(map(int, os.getenv("ADMIN_IDS", "").split(","))) if os.getenv("ADMIN_IDS") else []
+
+# Период замера задержки планирования (сек)
+LOOP_LAG_INTERVAL = float(os.getenv("LOOP_LAG_INTERVAL", "0.5"))
+# Debug-режим: поток-сторож снимает стек, если loop занят дольше порога
+LOOP_WATCHDOG = os.getenv("LOOP_WATCHDOG", "0") == "1"
+LOOP_BLOCK_THRESHOLD = float(os.getenv("LOOP_BLOCK_THRESHOLD_MS", "200")) / 1000
+
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+LOOP_LAG = registry.histogram(
+    "event_loop_lag_seconds", "Задержка планирования event loop",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0))
+LOOP_LAG_MAX = registry.gauge(
+    "event_loop_lag_max_seconds", "Максимальная задержка event loop за последние замеры")
+LOOP_BLOCKS = registry.counter(
+    "event_loop_blocked_total", "Случаи блокировки loop дольше порога (debug-режим)", ("location",))
+
+perf_router = Router()
+
+
+class LoopMonitor:
+    """
+    Сэмплер задержки event loop и (в debug-режиме) поток-сторож.
+
+    Сэмплер спит LOOP_LAG_INTERVAL и меряет, насколько позже его разбудили.
+    Сторож смотрит на «сердцебиение» loop из отдельного потока: если loop не
+    отвечает дольше порога, снимает стек потока loop через sys._current_frames()
+    — это и есть код, который держит loop.
+    """
+
+    def __init__(self, interval: float = LOOP_LAG_INTERVAL, threshold: float = LOOP_BLOCK_THRESHOLD,
+                 history: int = 1200):
+        self.interval = interval
+        self.threshold = threshold
+        self.samples: deque = deque(maxlen=history)
+        self.blocks: deque = deque(maxlen=20)
+        self.started_at: Optional[float] = None
+        self._task: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread_id: Optional[int] = None
+        self._last_beat = time.monotonic()
+        self._stall_captured = False
+        self._watchdog: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    def start(self, watchdog: bool = LOOP_WATCHDOG):
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread_id = threading.get_ident()
+        self.started_at = time.time()
+        self._task = asyncio.create_task(self._sample())
+        if watchdog:
+            self._beat()
+            self._watchdog = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+            self._watchdog.start()
+            logger.info(f"Сторож event loop включён: порог {self.threshold * 1000:.0f} мс")
+
+    def stop(self):
+        self._stop.set()
+        if self._task:
+            self._task.cancel()
+
+    @property
+    def watchdog_enabled(self) -> bool:
+        return self._watchdog is not None
+
+    # ===== СЭМПЛЕР =====
+
+    async def _sample(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, loop.time() - expected)
+            self.samples.append(lag)
+            LOOP_LAG.observe(lag)
+            LOOP_LAG_MAX.set(max(self.samples))
+
+    # ===== СТОРОЖ =====
+
+    def _beat(self):
+        now = time.monotonic()
+        if self._stall_captured:
+            # Loop освободился — дописываем полную длительность блокировки
+            self.blocks[-1]["duration"] = now - self._last_beat
+            self._stall_captured = False
+        self._last_beat = now
+        if not self._stop.is_set():
+            self._loop.call_later(self.threshold / 4, self._beat)
+
+    def _watch(self):
+        while not self._stop.wait(self.threshold / 4):
+            stalled = time.monotonic() - self._last_beat
+            if stalled < self.threshold or self._stall_captured:
+                continue
+            frame = sys._current_frames().get(self._loop_thread_id)
+            if frame is None:
+                continue
+            stack = traceback.extract_stack(frame)
+            location = self._project_location(stack)
+            self.blocks.append({
+                "at": datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+                "duration": stalled,
+                "location": location,
+                "stack": "".join(traceback.format_list(stack[-12:])),
+            })
+            self._stall_captured = True
+            LOOP_BLOCKS.labels(location).inc()
+            logger.warning(
+                f"Event loop заблокирован >{self.threshold * 1000:.0f} мс в {location}:\n"
+                f"{self.blocks[-1]['stack']}"
+            )
+
+    @staticmethod
+    def _project_location(stack: traceback.StackSummary) -> str:
+        """Самый глубокий кадр из кода бота — его и чиним"""
+        for frame in reversed(stack):
+            if (frame.filename.startswith(PROJECT_DIR) and frame.name != "<module>"
+                    and not frame.filename.endswith("loop_monitor.py")):
+                return f"{os.path.basename(frame.filename)}:{frame.name}"
+        return f"{os.path.basename(stack[-1].filename)}:{stack[-1].name}" if stack else "-"
+
+    # ===== ОТЧЁТ =====
+
+    def lag_stats(self) -> Dict[str, float]:
+        if not self.samples:
+            return {}
+        ordered = sorted(self.samples)
+
+        def pick(pct: float) -> float:
+            return ordered[min(len(ordered) - 1, int(pct / 100 * len(ordered)))]
+
+        return {"p50": pick(50), "p99": pick(99), "max": ordered[-1], "count": len(ordered)}
+
+
+loop_monitor = LoopMonitor()
+
+
+def slowest_handlers(limit: int = 5) -> List[tuple]:
+    """Хендлеры с наибольшим средним временем из метрик"""
+    rows = []
+    for (router, handler, event, route), child in HANDLER_DURATION._children.items():
+        if child.count:
+            rows.append((child.sum / child.count, child.count, f"{router}.{handler}", route))
+    return sorted(rows, reverse=True)[:limit]
+
+
+@perf_router.message(Command("perf"))
+async def cmd_perf(message: Message):
+    if message.from_user.id not in ADMIN_IDS:
+        await message.answer("❌ Недостаточно прав")
+        return
+
+    stats = loop_monitor.lag_stats()
+    lines = ["⚙️ <b>Производительность</b>\n"]
+    if stats:
+        window = stats["count"] * loop_monitor.interval / 60
+        lines.append(
+            f"⏱ Задержка event loop (последние {window:.0f} мин):\n"
+            f"p50 {stats['p50'] * 1000:.1f} мс · p99 {stats['p99'] * 1000:.1f} мс · max {stats['max'] * 1000:.1f} мс"
+        )
+    else:
+        lines.append("⏱ Задержка event loop: нет замеров")
+
+    handlers = slowest_handlers()
+    if handlers:
+        lines.append("\n🐢 <b>Самые медленные хендлеры (среднее):</b>")
+        for mean, count, name, route in handlers:
+            lines.append(f"• {html.escape(name)} [{html.escape(route)}] — {mean * 1000:.0f} мс × {count}")
+
+    if not loop_monitor.watchdog_enabled:
+        lines.append("\n🔍 Сторож блокировок выключен (LOOP_WATCHDOG=1)")
+    elif not loop_monitor.blocks:
+        lines.append(f"\n✅ Блокировок дольше {loop_monitor.threshold * 1000:.0f} мс не было")
+    else:
+        lines.append(f"\n🚧 <b>Блокировки &gt;{loop_monitor.threshold * 1000:.0f} мс:</b>")
+        for block in list(loop_monitor.blocks)[-3:]:
+            lines.append(
+                f"{block['at']} — {block['duration'] * 1000:.0f} мс в <code>{html.escape(block['location'])}</code>"
+            )
+        last = loop_monitor.blocks[-1]["stack"]
+        lines.append(f"\nПоследний стек:\n<pre>{html.escape(last[-2500:])}</pre>")
+
+    await message.answer("\n".join(lines))
@@ -0,0 +1,397 @@
+# ==============================================================================
+# metrics.py - Метрики в формате Prometheus: хендлеры, HTTP API, SQLite, Telegram
+# ==============================================================================
+
+import os
+import re
+import time
+from bisect import bisect_left
+from typing import Any, Awaitable, Callable, Dict, Tuple
+
+import aiosqlite
+from aiosqlite.context import Result
+from aiogram import BaseMiddleware
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.types import CallbackQuery, Message, TelegramObject, Update
+from aiohttp import web
+
+# Если задан — /metrics требует заголовок Authorization: Bearer <токен>
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# ===== РЕЕСТР =====
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], Any] = {}
+
+    def labels(self, *values, **kwargs):
+        if kwargs:
+            values = tuple(kwargs[name] for name in self.labelnames)
+        key = tuple(str(value) for value in values)
+        child = self._children.get(key)
+        if child is None:
+            child = self._children[key] = self._new_child()
+        return child
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for key, child in sorted(self._children.items()):
+            lines.extend(self._render_child(key, child))
+        return "\n".join(lines)
+
+    def _render_child(self, key, child):
+        yield f"{self.name}{_format_labels(self.labelnames, key)} {child.value}"
+
+
+class _Value:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0):
+        self.value += amount
+
+    def dec(self, amount: float = 1.0):
+        self.value -= amount
+
+    def set(self, value: float):
+        self.value = value
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def _new_child(self):
+        return _Value()
+
+    def inc(self, amount: float = 1.0):
+        self.labels().inc(amount)
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def _new_child(self):
+        return _Value()
+
+    def set(self, value: float):
+        self.labels().set(value)
+
+    def inc(self, amount: float = 1.0):
+        self.labels().inc(amount)
+
+    def dec(self, amount: float = 1.0):
+        self.labels().dec(amount)
+
+
+class _HistogramValue:
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        index = bisect_left(self.buckets, value)
+        if index < len(self.counts):
+            self.counts[index] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self):
+        return _HistogramValue(self.buckets)
+
+    def observe(self, value: float):
+        self.labels().observe(value)
+
+    def _render_child(self, key, child):
+        cumulative = 0
+        for bound, count in zip(self.buckets, child.counts):
+            cumulative += count
+            le = 'le="%s"' % bound
+            yield f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}"
+        le = 'le="+Inf"'
+        yield f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {child.count}"
+        yield f"{self.name}_sum{_format_labels(self.labelnames, key)} {child.sum}"
+        yield f"{self.name}_count{_format_labels(self.labelnames, key)} {child.count}"
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}
+
+    def register(self, metric: Metric) -> Metric:
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, documentation, labelnames=()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=()) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        return "\n".join(metric.render() for metric in self._metrics.values()) + "\n"
+
+
+registry = Registry()
+
+# ===== МЕТРИКИ =====
+
+UPDATES_IN_FLIGHT = registry.gauge(
+    "bot_updates_in_flight", "Апдейты Telegram в обработке", ("update_type",))
+UPDATE_DURATION = registry.histogram(
+    "bot_update_duration_seconds", "Полное время обработки апдейта", ("update_type",))
+UPDATE_ERRORS = registry.counter(
+    "bot_update_errors_total", "Апдейты, завершившиеся исключением", ("update_type", "exception"))
+
+HANDLER_IN_FLIGHT = registry.gauge(
+    "bot_handler_in_flight", "Выполняющиеся хендлеры", ("router", "handler"))
+HANDLER_DURATION = registry.histogram(
+    "bot_handler_duration_seconds", "Время выполнения хендлера", ("router", "handler", "event", "route"))
+HANDLER_ERRORS = registry.counter(
+    "bot_handler_errors_total", "Исключения в хендлерах", ("router", "handler", "event", "route", "exception"))
+
+HTTP_IN_FLIGHT = registry.gauge(
+    "http_requests_in_flight", "HTTP запросы в обработке", ("route",))
+HTTP_DURATION = registry.histogram(
+    "http_request_duration_seconds", "Время обработки HTTP запроса", ("method", "route", "status"))
+HTTP_ERRORS = registry.counter(
+    "http_request_errors_total", "HTTP запросы, завершившиеся исключением", ("method", "route", "exception"))
+
+SQLITE_DURATION = registry.histogram(
+    "sqlite_query_duration_seconds", "Время выполнения SQL через aiosqlite", ("operation", "table"),
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0))
+SQLITE_ERRORS = registry.counter(
+    "sqlite_query_errors_total", "Ошибки SQL через aiosqlite", ("operation", "table"))
+
+TELEGRAM_DURATION = registry.histogram(
+    "telegram_api_duration_seconds", "Время исходящих запросов к Bot API", ("method", "result"))
+
+# ===== AIOGRAM =====
+
+# Префиксы callback_data с идентификаторами внутри: одна серия на префикс
+CALLBACK_PREFIXES = [
+    (re.compile(r"^score_"), "score_*"),
+    (re.compile(r"^analytics_"), "analytics_*"),
+    (re.compile(r"^nav_"), "nav_*"),
+]
+
+
+def callback_route(data: str) -> str:
+    if not data:
+        return "-"
+    if ":" in data:
+        return data.split(":", 1)[0] + ":"
+    for pattern, route in CALLBACK_PREFIXES:
+        if pattern.match(data):
+            return route
+    return data
+
+
+# Команды из меню бота (register_commands); любой другой "/текст" — одна серия,
+# иначе каждый набранный гостем "/что-угодно" стал бы новым значением метки
+KNOWN_COMMANDS = set()
+
+
+def register_commands(commands):
+    """Имена команд (без "/") из списка BotCommand, которые получают свою серию"""
+    KNOWN_COMMANDS.update(command.lstrip("/") for command in commands)
+
+
+def message_route(message: Message) -> str:
+    if message.text and message.text.startswith("/"):
+        command = message.text.split()[0].split("@")[0][1:]
+        return f"/{command}" if command in KNOWN_COMMANDS else "command_other"
+    if message.web_app_data:
+        return "web_app_data"
+    return getattr(message.content_type, "value", message.content_type)
+
+
+class UpdateMetricsMiddleware(BaseMiddleware):
+    """Outer-middleware на dp.update: апдейты в обработке, полное время и ошибки"""
+
+    async def __call__(self, handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+                       event: Update, data: Dict[str, Any]) -> Any:
+        update_type = event.event_type
+        in_flight = UPDATES_IN_FLIGHT.labels(update_type)
+        in_flight.inc()
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        except Exception as e:
+            UPDATE_ERRORS.labels(update_type, type(e).__name__).inc()
+            raise
+        finally:
+            UPDATE_DURATION.labels(update_type).observe(time.perf_counter() - started)
+            in_flight.dec()
+
+
+class HandlerMetricsMiddleware(BaseMiddleware):
+    """
+    Inner-middleware на message/callback_query: вызывается уже для найденного
+    хендлера, поэтому знает модуль (router) и имя функции.
+    """
+
+    async def __call__(self, handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+                       event: TelegramObject, data: Dict[str, Any]) -> Any:
+        handler_object = data.get("handler")
+        callback = getattr(handler_object, "callback", None)
+        # bot.py запускается как скрипт — его хендлеры живут в __main__
+        router = getattr(callback, "__module__", "-").replace("__main__", "bot")
+        name = getattr(callback, "__name__", "-")
+        if isinstance(event, CallbackQuery):
+            event_name, route = "callback_query", callback_route(event.data)
+        elif isinstance(event, Message):
+            event_name, route = "message", message_route(event)
+        else:
+            event_name, route = type(event).__name__, "-"
+
+        in_flight = HANDLER_IN_FLIGHT.labels(router, name)
+        in_flight.inc()
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        except Exception as e:
+            HANDLER_ERRORS.labels(router, name, event_name, route, type(e).__name__).inc()
+            raise
+        finally:
+            HANDLER_DURATION.labels(router, name, event_name, route).observe(time.perf_counter() - started)
+            in_flight.dec()
+
+
+class TelegramMetricsMiddleware(BaseRequestMiddleware):
+    """Middleware сессии Bot: время каждого исходящего вызова Bot API"""
+
+    async def __call__(self, make_request, bot, method):
+        started = time.perf_counter()
+        result = "error"
+        try:
+            response = await make_request(bot, method)
+            result = "ok"
+            return response
+        finally:
+            TELEGRAM_DURATION.labels(method.__api_method__, result).observe(time.perf_counter() - started)
+
+
+def setup_bot_metrics(dp, bot):
+    dp.update.outer_middleware(UpdateMetricsMiddleware())
+    dp.message.middleware(HandlerMetricsMiddleware())
+    dp.callback_query.middleware(HandlerMetricsMiddleware())
+    bot.session.middleware(TelegramMetricsMiddleware())
+
+# ===== AIOHTTP =====
+
+HTTP_METHODS = {"GET", "HEAD", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"}
+
+
+@web.middleware
+async def http_metrics_middleware(request: web.Request, handler):
+    resource = request.match_info.route.resource
+    route = resource.canonical if resource is not None else "unmatched"
+    method = request.method if request.method in HTTP_METHODS else "other"
+    in_flight = HTTP_IN_FLIGHT.labels(route)
+    in_flight.inc()
+    started = time.perf_counter()
+    status = 500
+    try:
+        response = await handler(request)
+        status = response.status
+        return response
+    except web.HTTPException as e:
+        status = e.status
+        raise
+    except Exception as e:
+        HTTP_ERRORS.labels(method, route, type(e).__name__).inc()
+        raise
+    finally:
+        HTTP_DURATION.labels(method, route, status).observe(time.perf_counter() - started)
+        in_flight.dec()
+
+
+async def metrics_endpoint(request: web.Request) -> web.Response:
+    if METRICS_TOKEN and request.headers.get("Authorization") != f"Bearer {METRICS_TOKEN}":
+        return web.Response(status=401, text="unauthorized")
+    return web.Response(
+        body=registry.render().encode("utf-8"),
+        headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"}
+    )
+
+# ===== SQLITE =====
+
+SQL_TABLE_RE = re.compile(r"\b(?:FROM|INTO|UPDATE|JOIN|TABLE)\s+(?:IF\s+(?:NOT\s+)?EXISTS\s+)?(?!ON\b)([A-Za-z_]\w*)", re.IGNORECASE)
+
+
+def sql_labels(sql: str) -> Tuple[str, str]:
+    """(операция, таблица) по тексту запроса: число серий ограничено схемой"""
+    stripped = sql.lstrip()
+    operation = stripped.split(None, 1)[0].upper() if stripped else "-"
+    match = SQL_TABLE_RE.search(sql)
+    return operation, match.group(1) if match else "-"
+
+
+async def _timed(statement: Awaitable, sql: str):
+    labels = sql_labels(sql)
+    started = time.perf_counter()
+    try:
+        return await statement
+    except Exception:
+        SQLITE_ERRORS.labels(*labels).inc()
+        raise
+    finally:
+        SQLITE_DURATION.labels(*labels).observe(time.perf_counter() - started)
+
+
+def instrument_aiosqlite():
+    """Оборачивает Connection.execute/executemany замером времени (один раз на процесс)"""
+    connection = aiosqlite.Connection
+    if getattr(connection, "_metrics_instrumented", False):
+        return
+    execute, executemany = connection.execute, connection.executemany
+
+    # Result сохраняет оба способа вызова: await db.execute(...) и async with db.execute(...)
+    def timed_execute(self, sql, parameters=None):
+        return Result(_timed(execute(self, sql, parameters), sql))
+
+    def timed_executemany(self, sql, parameters):
+        return Result(_timed(executemany(self, sql, parameters), sql))
+
+    connection.execute = timed_execute
+    connection.executemany = timed_executemany
+    connection._metrics_instrumented = True
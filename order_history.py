@@ -0,0 +1,283 @@
+# ==============================================================================
+# order_history.py - Статистика заказов за любой период: рабочая база + архивы
+# ==============================================================================
+#
+# После retention.py старые заказы лежат в archive/orders_YYYY-MM.db.
+# Запрос за период складывается из рабочей таблицы и нужных месячных
+# архивов: архив подключается ATTACH только на чтение и сразу отключается
+# (SQLite позволяет не больше 10 подключённых баз). Для закрытых месяцев,
+# целиком попавших в период, агрегаты считаются один раз и хранятся в
+# archive_month_stats — «статистика за прошлый сезон» читает пару строк.
+#
+# Только стандартная библиотека: используется ботом (/stats) и edit_orders.py.
+# Миграции business_day для базы и архивов здесь не выполняются — это
+# делают init_db бота и retention.py.
+
+import asyncio
+import json
+import os
+import sqlite3
+from collections import Counter
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from business_day import business_days_ago, business_today
+from retention import ARCHIVE_DIR, DB_FILE, RETENTION_DAYS, list_archives, next_month
+
+# Сезон на Алаколе (MM-DD), для '/stats season'
+SEASON_START = os.getenv("SEASON_START", "06-01")
+SEASON_END = os.getenv("SEASON_END", "08-31")
+
+ARCHIVE_STATS_SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS archive_month_stats (
+        month TEXT PRIMARY KEY,
+        orders INTEGER NOT NULL,
+        total INTEGER NOT NULL,
+        min_total INTEGER,
+        max_total INTEGER,
+        statuses TEXT NOT NULL,
+        archive_size INTEGER NOT NULL,
+        archive_mtime INTEGER NOT NULL,
+        computed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+]
+
+
+def parse_period(parts: List[str]) -> Tuple[str, str]:
+    """
+    ['2026-07-01', '2026-07-31'] -> ('2026-07-01', '2026-07-31').
+    Даты YYYY-MM-DD или ДД.ММ.ГГГГ; одна дата — один день, без дат — текущий
+    учётный день;
+    'season [ГГГГ]' / 'сезон [ГГГГ]' — последний начавшийся сезон или сезон года.
+    ValueError при неверных аргументах.
+    """
+    if parts and parts[0].lower() in ("season", "сезон"):
+        if len(parts) > 2:
+            raise ValueError
+        today = business_today()
+        year = int(parts[1]) if len(parts) == 2 else int(today[:4])
+        if len(parts) == 1 and today[5:] < SEASON_START:
+            year -= 1
+        return f"{year}-{SEASON_START}", f"{year}-{SEASON_END}"
+
+    if len(parts) > 2:
+        raise ValueError
+    days = []
+    for part in parts:
+        for pattern in ('%Y-%m-%d', '%d.%m.%Y'):
+            try:
+                days.append(datetime.strptime(part, pattern).date())
+                break
+            except ValueError:
+                continue
+        else:
+            raise ValueError
+    if not days:
+        days = [date.fromisoformat(business_today())]
+    date_from, date_to = days[0], days[-1]
+    if date_from > date_to:
+        raise ValueError
+    return date_from.isoformat(), date_to.isoformat()
+
+
+def shift_year(day: str, years: int = -1) -> str:
+    """Та же дата годом раньше (29.02 -> 28.02)"""
+    value = date.fromisoformat(day)
+    try:
+        return value.replace(year=value.year + years).isoformat()
+    except ValueError:
+        return value.replace(year=value.year + years, day=28).isoformat()
+
+
+def _merge(into: Dict, part: Dict) -> Dict:
+    into["orders"] += part["orders"]
+    into["total"] += part["total"]
+    for key, pick in (("min_total", min), ("max_total", max)):
+        if part[key] is not None:
+            into[key] = part[key] if into[key] is None else pick(into[key], part[key])
+    for status, (count, total) in part["statuses"].items():
+        current = into["statuses"].get(status, (0, 0))
+        into["statuses"][status] = (current[0] + count, current[1] + total)
+    return into
+
+
+def archives_between(start: str, end: str, archive_dir: str = ARCHIVE_DIR) -> List[Tuple[str, str]]:
+    """[(месяц, путь)] архивов, пересекающихся с [start, end), от старых к новым"""
+    result = []
+    for path in list_archives(archive_dir):
+        month = os.path.basename(path)[len("orders_"):-len(".db")]
+        if f"{next_month(month)}-01" > start and f"{month}-01" < end:
+            result.append((month, path))
+    return result
+
+
+class OrderHistory:
+    """
+    Запросы по рабочей базе и архивам на одном соединении:
+
+        with OrderHistory() as history:
+            season = history.period("2025-06-01", "2025-08-31")
+    """
+
+    def __init__(self, db_path: str = DB_FILE, archive_dir: str = ARCHIVE_DIR,
+                 retention_days: int = RETENTION_DAYS):
+        self.archive_dir = archive_dir
+        # uri=True — чтобы ATTACH принимал file:...?mode=ro
+        self.conn = sqlite3.connect(f"file:{db_path}", uri=True, timeout=30)
+        for statement in ARCHIVE_STATS_SCHEMA:
+            self.conn.execute(statement)
+        self.conn.commit()
+        # Месяц закрыт, когда все его заказы старше срока хранения и уже в архиве
+        self.closed_before = business_days_ago(retention_days)
+        self.cached_months = 0
+        self.scanned_months = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.conn.close()
+
+    # ===== ИСТОЧНИКИ =====
+
+    def _aggregate(self, schema: str, start: str, end: str) -> Dict:
+        count, total, min_total, max_total = self.conn.execute(f"""
+            SELECT COUNT(*), COALESCE(SUM(total), 0), MIN(total), MAX(total)
+            FROM {schema}.orders
+            WHERE business_day >= ? AND business_day < ?
+        """, (start, end)).fetchone()
+        statuses = self.conn.execute(f"""
+            SELECT status, COUNT(*), COALESCE(SUM(total), 0)
+            FROM {schema}.orders
+            WHERE business_day >= ? AND business_day < ?
+            GROUP BY status
+        """, (start, end)).fetchall()
+        return {
+            "orders": count, "total": total, "min_total": min_total, "max_total": max_total,
+            "statuses": {status: (cnt, amount) for status, cnt, amount in statuses},
+        }
+
+    def _attach(self, path: str):
+        self.conn.execute("ATTACH DATABASE ? AS arch", (f"file:{path}?mode=ro",))
+
+    def _detach(self):
+        self.conn.execute("DETACH DATABASE arch")
+
+    def _archives(self, start: str, end: str) -> List[Tuple[str, str]]:
+        return archives_between(start, end, self.archive_dir)
+
+    def _month_stats(self, month: str, path: str) -> Dict:
+        """Агрегаты закрытого месяца из кэша; пересчёт, если архив изменился"""
+        stat = os.stat(path)
+        row = self.conn.execute("""
+            SELECT orders, total, min_total, max_total, statuses
+            FROM archive_month_stats
+            WHERE month = ? AND archive_size = ? AND archive_mtime = ?
+        """, (month, stat.st_size, stat.st_mtime_ns)).fetchone()
+        if row:
+            self.cached_months += 1
+            return {
+                "orders": row[0], "total": row[1], "min_total": row[2], "max_total": row[3],
+                "statuses": {status: tuple(value) for status, value in json.loads(row[4]).items()},
+            }
+
+        self._attach(path)
+        try:
+            stats = self._aggregate("arch", f"{month}-01", f"{next_month(month)}-01")
+        finally:
+            self._detach()
+        self.scanned_months += 1
+        self.conn.execute("""
+            INSERT OR REPLACE INTO archive_month_stats
+                (month, orders, total, min_total, max_total, statuses, archive_size, archive_mtime)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        """, (month, stats["orders"], stats["total"], stats["min_total"], stats["max_total"],
+              json.dumps(stats["statuses"], ensure_ascii=False), stat.st_size, stat.st_mtime_ns))
+        self.conn.commit()
+        return stats
+
+    # ===== ЗАПРОСЫ =====
+
+    def period(self, date_from: Optional[str] = None, date_to: Optional[str] = None) -> Dict:
+        """
+        Заказы, сумма, мин/макс чек и разбивка по статусам за учётные дни
+        [date_from, date_to] (включительно, YYYY-MM-DD; None — без границы).
+        """
+        start = date_from or "0000-01-01"
+        end = (date.fromisoformat(date_to) + timedelta(days=1)).isoformat() if date_to else "9999-12-31"
+
+        stats = self._aggregate("main", start, end)
+        for month, path in self._archives(start, end):
+            month_start, month_end = f"{month}-01", f"{next_month(month)}-01"
+            if start <= month_start and month_end <= end and month_end <= self.closed_before:
+                _merge(stats, self._month_stats(month, path))
+                continue
+            # Месяц на границе периода или ещё пополняется — считаем по архиву
+            self._attach(path)
+            try:
+                _merge(stats, self._aggregate("arch", max(start, month_start), min(end, month_end)))
+            finally:
+                self._detach()
+            self.scanned_months += 1
+
+        stats["avg_total"] = stats["total"] / stats["orders"] if stats["orders"] else 0
+        return stats
+
+    def monthly(self, year: int) -> List[Dict]:
+        """Помесячная статистика за год (12 записей с ключом month)"""
+        result = []
+        month = f"{year:04d}-01"
+        for _ in range(12):
+            following = next_month(month)
+            last_day = (date.fromisoformat(f"{following}-01") - timedelta(days=1)).isoformat()
+            result.append({"month": month, **self.period(f"{month}-01", last_day)})
+            month = following
+        return result
+
+    def top_clients(self, date_from: Optional[str] = None, date_to: Optional[str] = None,
+                    limit: int = 10) -> List[Tuple[str, str, int, int]]:
+        """[(клиент, комната, заказов, сумма)] по всем источникам за период"""
+        start = date_from or "0000-01-01"
+        end = (date.fromisoformat(date_to) + timedelta(days=1)).isoformat() if date_to else "9999-12-31"
+        counts, sums = Counter(), Counter()
+
+        def collect(schema: str, lower: str, upper: str):
+            for client, room, count, total in self.conn.execute(f"""
+                SELECT client_name, room, COUNT(*), COALESCE(SUM(total), 0)
+                FROM {schema}.orders
+                WHERE business_day >= ? AND business_day < ?
+                GROUP BY client_name, room
+            """, (lower, upper)):
+                counts[(client, room)] += count
+                sums[(client, room)] += total
+
+        collect("main", start, end)
+        for month, path in self._archives(start, end):
+            self._attach(path)
+            try:
+                collect("arch", max(start, f"{month}-01"), min(end, f"{next_month(month)}-01"))
+            finally:
+                self._detach()
+
+        ranked = sorted(counts, key=lambda key: (-counts[key], -sums[key]))[:limit]
+        return [(client, room, counts[(client, room)], sums[(client, room)]) for client, room in ranked]
+
+
+def period_stats(date_from: Optional[str] = None, date_to: Optional[str] = None,
+                 db_path: str = DB_FILE, archive_dir: str = ARCHIVE_DIR) -> Dict:
+    with OrderHistory(db_path, archive_dir) as history:
+        return history.period(date_from, date_to)
+
+
+async def compare_with_last_year_async(date_from: str, date_to: str) -> Tuple[Dict, Dict]:
+    """Период и тот же период годом раньше — в рабочем потоке"""
+    def compare():
+        with OrderHistory() as history:
+            return (history.period(date_from, date_to),
+                    history.period(shift_year(date_from), shift_year(date_to)))
+    return await asyncio.to_thread(compare)
@@ -0,0 +1,184 @@
+# ==============================================================================
+# order_intake.py - Генерация ID заказов и идемпотентный приём заказов
+# ==============================================================================
+
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+# Ключ, присланный клиентом (заголовок Idempotency-Key / поле idempotencyKey / orderId)
+IDEMPOTENCY_TTL = int(os.getenv("IDEMPOTENCY_TTL_HOURS", "24")) * 3600
+# Ключ по отпечатку заказа, если клиент ключ не прислал — только для быстрых повторов
+IDEMPOTENCY_FINGERPRINT_TTL = int(os.getenv("IDEMPOTENCY_FINGERPRINT_TTL", "120"))
+# Сколько секунд занятый ключ без ответа считается «в обработке»: если процесс
+# упал между захватом ключа и сохранением заказа, после этого ключ снова свободен
+IDEMPOTENCY_LEASE = int(os.getenv("IDEMPOTENCY_LEASE_SECONDS", "60"))
+
+IDEMPOTENCY_SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS idempotency_keys (
+        key TEXT PRIMARY KEY,
+        order_id TEXT,
+        response TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        expires_at REAL NOT NULL,
+        claimed_at REAL
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_idempotency_expires ON idempotency_keys(expires_at)",
+]
+
+# ==============================================================================
+# ГЕНЕРАТОР ID
+# ==============================================================================
+
+class OrderIdGenerator:
+    """
+    Монотонный генератор ID заказов: <unix-секунды><счётчик 000-999>.
+
+    13 цифр, префикс совпадает со старыми ID вида str(int(timestamp)),
+    поэтому ORDER BY order_id сохраняет порядок вставки. При >1000 заказов
+    в секунду (или переводе часов назад) секунда «занимается» у будущего.
+    """
+
+    SEQ_DIGITS = 3
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._last_second = 0
+        self._seq = -1
+
+    def seed(self, last_order_id: Optional[str]):
+        """Продолжить после максимального ID из базы (перезапуск в ту же секунду)"""
+        if not last_order_id or not last_order_id.isdigit() or len(last_order_id) != 10 + self.SEQ_DIGITS:
+            return
+        with self._lock:
+            second, seq = int(last_order_id[:10]), int(last_order_id[10:])
+            if (second, seq) > (self._last_second, self._seq):
+                self._last_second, self._seq = second, seq
+
+    def next_id(self) -> str:
+        with self._lock:
+            now = int(time.time())
+            if now > self._last_second:
+                self._last_second, self._seq = now, 0
+            else:
+                self._seq += 1
+                if self._seq >= 10 ** self.SEQ_DIGITS:
+                    self._last_second, self._seq = self._last_second + 1, 0
+            return f"{self._last_second}{self._seq:0{self.SEQ_DIGITS}d}"
+
+
+order_id_generator = OrderIdGenerator()
+
+# ==============================================================================
+# ИДЕМПОТЕНТНОСТЬ
+# ==============================================================================
+
+def resolve_idempotency_key(order_data: Dict, header_key: str = None) -> Tuple[str, int]:
+    """Ключ идемпотентности и его TTL в секундах"""
+    explicit = header_key or order_data.get("idempotencyKey") or order_data.get("orderId")
+    if explicit:
+        return f"key:{explicit}", IDEMPOTENCY_TTL
+
+    payload = {
+        k: v for k, v in order_data.items()
+        if k not in ("timestamp", "scanned_room", "pdf_path")
+    }
+    digest = hashlib.sha256(
+        json.dumps(payload, sort_keys=True, ensure_ascii=False, default=str).encode("utf-8")
+    ).hexdigest()
+    return f"fp:{digest}", IDEMPOTENCY_FINGERPRINT_TTL
+
+
+async def claim_idempotency_key(db, key: str, ttl: int) -> Tuple[bool, Optional[Dict]]:
+    """
+    Пытается занять ключ.
+
+    Возвращает (True, None), если ключ свободен и запрос нужно обработать,
+    иначе (False, сохранённый ответ) — ответ None, если первый запрос
+    ещё обрабатывается. Захват без ответа старше IDEMPOTENCY_LEASE
+    (процесс упал посреди заказа) освобождается здесь же.
+    """
+    now = time.time()
+    await db.execute("""
+        DELETE FROM idempotency_keys
+        WHERE key = ? AND (expires_at < ? OR (response IS NULL AND (claimed_at IS NULL OR claimed_at < ?)))
+    """, (key, now, now - IDEMPOTENCY_LEASE))
+    cursor = await db.execute(
+        "INSERT OR IGNORE INTO idempotency_keys (key, expires_at, claimed_at) VALUES (?, ?, ?)",
+        (key, now + ttl, now)
+    )
+    await db.commit()
+    if cursor.rowcount == 1:
+        return True, None
+
+    cursor = await db.execute("SELECT response FROM idempotency_keys WHERE key = ?", (key,))
+    row = await cursor.fetchone()
+    return False, json.loads(row[0]) if row and row[0] else None
+
+
+async def store_idempotent_result(db, key: str, order_id: str, result: Dict):
+    """Сохранить ответ (без коммита — коммитится вместе с заказом)"""
+    await db.execute(
+        "UPDATE idempotency_keys SET order_id = ?, response = ? WHERE key = ?",
+        (order_id, json.dumps(result, ensure_ascii=False), key)
+    )
+
+
+async def lookup_idempotency_keys(db, keys: List[str]) -> Dict[str, Optional[Dict]]:
+    """Непросроченные ключи из списка: {ключ: сохранённый ответ или None (захват в пределах аренды)}"""
+    found = {}
+    keys = list(dict.fromkeys(keys))
+    # SQLite ограничивает число параметров в запросе
+    for start in range(0, len(keys), 500):
+        chunk = keys[start:start + 500]
+        now = time.time()
+        cursor = await db.execute(f"""
+            SELECT key, response FROM idempotency_keys
+            WHERE expires_at >= ? AND (response IS NOT NULL OR claimed_at >= ?)
+              AND key IN ({','.join('?' * len(chunk))})
+        """, (now, now - IDEMPOTENCY_LEASE, *chunk))
+        for key, response in await cursor.fetchall():
+            found[key] = json.loads(response) if response else None
+    return found
+
+
+async def existing_order_ids(db, order_ids: List[str]) -> set:
+    """Какие из order_id уже есть в orders"""
+    found = set()
+    order_ids = list(dict.fromkeys(order_ids))
+    for start in range(0, len(order_ids), 500):
+        chunk = order_ids[start:start + 500]
+        cursor = await db.execute(
+            f"SELECT order_id FROM orders WHERE order_id IN ({','.join('?' * len(chunk))})", chunk
+        )
+        found.update(row[0] for row in await cursor.fetchall())
+    return found
+
+
+def idempotency_row(key: str, ttl: int, order_id: str, result: Dict) -> Tuple:
+    return (key, order_id, json.dumps(result, ensure_ascii=False), time.time() + ttl)
+
+
+async def store_idempotent_results(db, rows: List[Tuple]):
+    """Пакетная запись ключей вместе с ответами (без коммита)"""
+    await db.executemany(
+        "INSERT OR REPLACE INTO idempotency_keys (key, order_id, response, expires_at) VALUES (?, ?, ?, ?)",
+        rows
+    )
+
+
+async def release_idempotency_key(db, key: str):
+    """Освободить ключ после ошибки, чтобы повтор клиента прошёл заново"""
+    await db.execute("DELETE FROM idempotency_keys WHERE key = ? AND response IS NULL", (key,))
+    await db.commit()
+
+
+async def purge_expired_idempotency_keys(db) -> int:
+    cursor = await db.execute("DELETE FROM idempotency_keys WHERE expires_at < ?", (time.time(),))
+    await db.commit()
+    return cursor.rowcount
@@ -0,0 +1,95 @@
+# ==============================================================================
+# order_status.py - Кэш статусов заказов для /status и GET /api/order/{id}/status
+# ==============================================================================
+
+import asyncio
+import hashlib
+import json
+import os
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, Optional
+
+ORDER_STATUS_CACHE_SIZE = int(os.getenv("ORDER_STATUS_CACHE_SIZE", "5000"))
+STATUS_LONG_POLL_MAX = int(os.getenv("STATUS_LONG_POLL_MAX", "30"))
+
+STATUS_EMOJI = {"принят": "🟡", "готовится": "🟠", "готов": "🟢", "выдан": "✅"}
+
+
+class OrderStatusCache:
+    """
+    Write-through кэш статусов заказов.
+
+    save_order и handle_status_button пишут сюда сразу после коммита в SQLite,
+    поэтому чтение статуса обычно не трогает базу. Ожидающие long-poll запросы
+    будятся при каждом изменении статуса заказа.
+    """
+
+    def __init__(self, max_size: int = ORDER_STATUS_CACHE_SIZE):
+        self.max_size = max_size
+        self._entries: "OrderedDict[str, Dict]" = OrderedDict()
+        self._waiters: Dict[str, asyncio.Event] = {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, order_id: str) -> Optional[Dict]:
+        entry = self._entries.get(order_id)
+        if entry is not None:
+            self._entries.move_to_end(order_id)
+        return entry
+
+    def put(self, order_id: str, status: str, telegram_user_id: int = None,
+            telegram_username: str = None) -> Dict:
+        """Записать заказ целиком (новый заказ или загрузка из SQLite)"""
+        entry = self._build_entry(order_id, status, telegram_user_id, telegram_username)
+        self._entries[order_id] = entry
+        self._entries.move_to_end(order_id)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+        self._notify(order_id)
+        return entry
+
+    def update_status(self, order_id: str, status: str) -> Optional[Dict]:
+        """Обновить статус; если заказа нет в кэше, его подгрузит следующий запрос"""
+        entry = self._entries.get(order_id)
+        if entry is None:
+            self._notify(order_id)
+            return None
+        return self.put(order_id, status, entry["telegram_user_id"], entry["telegram_username"])
+
+    async def wait_for_change(self, order_id: str, etag: str, timeout: float) -> Optional[Dict]:
+        """Ждать, пока ETag заказа не станет отличным от переданного (long-poll)"""
+        entry = self.get(order_id)
+        if entry is not None and entry["etag"] != etag:
+            return entry
+        event = self._waiters.setdefault(order_id, asyncio.Event())
+        try:
+            await asyncio.wait_for(event.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        return self.get(order_id)
+
+    def _notify(self, order_id: str):
+        event = self._waiters.pop(order_id, None)
+        if event is not None:
+            event.set()
+
+    @staticmethod
+    def _build_entry(order_id, status, telegram_user_id, telegram_username) -> Dict:
+        body = json.dumps(
+            {"order_id": order_id, "status": status},
+            ensure_ascii=False
+        ).encode("utf-8")
+        return {
+            "order_id": order_id,
+            "status": status,
+            "telegram_user_id": telegram_user_id,
+            "telegram_username": telegram_username,
+            "updated_at": datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            "body": body,
+            "etag": f'"{hashlib.md5(body).hexdigest()}"',
+        }
+
+
+order_status_cache = OrderStatusCache()
@@ -0,0 +1,250 @@
+# ==============================================================================
+# profiler.py - Профилирование живого процесса по запросу (/profile, /debug/profile)
+# ==============================================================================
+
+import asyncio
+import html
+import logging
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from datetime import datetime
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from aiogram import Router
+from aiogram.filters import Command, CommandObject
+from aiogram.types import BufferedInputFile, Message
+from aiohttp import web
+
+logger = logging.getLogger(__name__)
+
+ADMIN_IDS = list(map(int, os.getenv("ADMIN_IDS", "").split(","))) if os.getenv("ADMIN_IDS") else []
+
+PROFILE_MAX_SECONDS = int(os.getenv("PROFILE_MAX_SECONDS", "120"))
+PROFILE_SAMPLE_INTERVAL = float(os.getenv("PROFILE_SAMPLE_INTERVAL_MS", "5")) / 1000
+# HTTP-маршрут /debug/profile включается только с токеном
+PROFILE_TOKEN = os.getenv("PROFILE_TOKEN")
+
+profile_router = Router()
+
+# Один профиль за раз: два сэмплера мешают друг другу и искажают картину
+_profile_lock = asyncio.Lock()
+
+# ===== ОТСЛЕЖИВАЕМЫЕ ОБЪЕКТЫ =====
+
+# Имя -> функция, возвращающая объект (кэши и хранилища, которые растут со временем)
+TRACKED_OBJECTS: Dict[str, Callable[[], Any]] = {}
+
+
+def track_object(name: str, getter: Callable[[], Any]):
+    TRACKED_OBJECTS[name] = getter
+
+
+def deep_sizeof(obj: Any, limit: int = 200_000) -> Tuple[int, int]:
+    """Приблизительный размер объекта со всем содержимым: (байт, объектов)"""
+    seen = set()
+    stack = [obj]
+    total = 0
+    while stack and len(seen) < limit:
+        current = stack.pop()
+        if id(current) in seen:
+            continue
+        seen.add(id(current))
+        total += sys.getsizeof(current, 0)
+        if isinstance(current, dict):
+            stack.extend(current.keys())
+            stack.extend(current.values())
+        elif isinstance(current, (list, tuple, set, frozenset)):
+            stack.extend(current)
+        elif hasattr(current, "__dict__") and not isinstance(current, type):
+            stack.append(vars(current))
+    return total, len(seen)
+
+
+def tracked_objects_report() -> str:
+    lines = []
+    for name, getter in TRACKED_OBJECTS.items():
+        try:
+            obj = getter()
+            size, objects = deep_sizeof(obj)
+            length = len(obj) if hasattr(obj, "__len__") else "-"
+            lines.append(f"{name:<24} len={length:<8} ~{size / 1024:.1f} KiB ({objects} объектов)")
+        except Exception as e:
+            lines.append(f"{name:<24} ошибка: {e}")
+    return "\n".join(lines)
+
+# ===== СЭМПЛЕР СТЕКОВ =====
+
+class StackSampler:
+    """
+    Сэмплирующий профайлер: раз в interval снимает стеки всех потоков через
+    sys._current_frames() и считает одинаковые стеки.
+
+    Результат — collapsed stacks («поток;модуль:функция;... N»), формат
+    flamegraph.pl и speedscope. Накладные расходы не зависят от числа вызовов
+    функций, в отличие от cProfile.
+    """
+
+    def __init__(self, interval: float = PROFILE_SAMPLE_INTERVAL):
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self.samples = 0
+
+    def run(self, seconds: float):
+        own_thread = threading.get_ident()
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        deadline = time.monotonic() + seconds
+        while time.monotonic() < deadline:
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_thread:
+                    continue
+                self.stacks[self._collapse(names.get(thread_id, str(thread_id)), frame)] += 1
+            self.samples += 1
+            time.sleep(self.interval)
+
+    @staticmethod
+    def _collapse(thread_name: str, frame) -> str:
+        parts = []
+        while frame is not None:
+            code = frame.f_code
+            module = os.path.splitext(os.path.basename(code.co_filename))[0]
+            parts.append(f"{module}:{code.co_name}:{frame.f_lineno}")
+            frame = frame.f_back
+        parts.append(thread_name)
+        return ";".join(reversed(parts))
+
+    def collapsed(self) -> str:
+        return "\n".join(f"{stack} {count}" for stack, count in self.stacks.most_common()) + "\n"
+
+    def top_frames(self, limit: int = 10, thread_name: str = "MainThread") -> list:
+        """Функции с наибольшим собственным временем (верхний кадр стека) в потоке loop"""
+        leaf = Counter()
+        total = 0
+        for stack, count in self.stacks.items():
+            if not stack.startswith(thread_name + ";"):
+                continue
+            leaf[stack.rsplit(";", 1)[-1]] += count
+            total += count
+        return [(frame, count / total * 100) for frame, count in leaf.most_common(limit)] if total else []
+
+
+async def profile_cpu(seconds: float) -> StackSampler:
+    sampler = StackSampler()
+    await asyncio.to_thread(sampler.run, seconds)
+    return sampler
+
+# ===== TRACEMALLOC =====
+
+async def profile_memory(seconds: float, limit: int = 15) -> str:
+    """Прирост памяти за окно по строкам кода + размеры отслеживаемых объектов"""
+    started_here = not tracemalloc.is_tracing()
+    if started_here:
+        tracemalloc.start(25)
+    try:
+        before = tracemalloc.take_snapshot()
+        await asyncio.sleep(seconds)
+        after = tracemalloc.take_snapshot()
+    finally:
+        current, peak = tracemalloc.get_traced_memory()
+        if started_here:
+            tracemalloc.stop()
+
+    filters = [tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, "<frozen *>")]
+    growth = after.filter_traces(filters).compare_to(before.filter_traces(filters), "lineno")
+    top = after.filter_traces(filters).statistics("lineno")
+
+    lines = [
+        f"tracemalloc за {seconds:.0f} с: сейчас {current / 1024 / 1024:.1f} MiB, пик {peak / 1024 / 1024:.1f} MiB",
+        "",
+        f"== Рост за окно (top {limit}) ==",
+        *(str(stat) for stat in growth[:limit]),
+        "",
+        f"== Крупнейшие аллокации (top {limit}) ==",
+        *(str(stat) for stat in top[:limit]),
+        "",
+        "== Отслеживаемые объекты ==",
+        tracked_objects_report(),
+    ]
+    if started_here:
+        lines.insert(1, "(трассировка включена только на время окна — учтены аллокации внутри окна)")
+    return "\n".join(lines) + "\n"
+
+# ===== КОМАНДА /profile =====
+
+def parse_profile_args(args: Optional[str]) -> Tuple[float, str]:
+    """'/profile 30 mem' -> (30, 'mem'); ValueError при неверных аргументах"""
+    parts = (args or "").split()
+    seconds = float(parts[0]) if parts else 10
+    mode = parts[1].lower() if len(parts) > 1 else "cpu"
+    if not 0 < seconds <= PROFILE_MAX_SECONDS or mode not in ("cpu", "mem"):
+        raise ValueError
+    return seconds, mode
+
+
+@profile_router.message(Command("profile"))
+async def cmd_profile(message: Message, command: CommandObject):
+    if message.from_user.id not in ADMIN_IDS:
+        await message.answer("❌ Недостаточно прав")
+        return
+
+    try:
+        seconds, mode = parse_profile_args(command.args)
+    except ValueError:
+        await message.answer(f"ℹ️ Использование: /profile &lt;секунды 1-{PROFILE_MAX_SECONDS}&gt; [cpu|mem]")
+        return
+
+    if _profile_lock.locked():
+        await message.answer("⏳ Профилирование уже идёт, дождитесь результата")
+        return
+
+    async with _profile_lock:
+        await message.answer(f"🔬 Профилирую {seconds:.0f} с ({mode})...")
+        stamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        if mode == "mem":
+            report = await profile_memory(seconds)
+            await message.answer_document(
+                BufferedInputFile(report.encode("utf-8"), filename=f"memory_{stamp}.txt"),
+                caption="🧠 tracemalloc: рост памяти и отслеживаемые объекты"
+            )
+            return
+
+        sampler = await profile_cpu(seconds)
+        top = "\n".join(f"{share:5.1f}% {html.escape(frame)}" for frame, share in sampler.top_frames(5))
+        await message.answer_document(
+            BufferedInputFile(sampler.collapsed().encode("utf-8"), filename=f"profile_{stamp}.collapsed"),
+            caption=(
+                f"🔥 {sampler.samples} сэмплов за {seconds:.0f} с\n"
+                f"Открыть: speedscope.app или flamegraph.pl\n\n"
+                f"Топ в потоке loop:\n{top}"
+            )[:1024]
+        )
+    logger.info(f"Профилирование {mode} {seconds:.0f} с выполнено для {message.from_user.id}")
+
+# ===== HTTP /debug/profile =====
+
+async def profile_endpoint(request: web.Request) -> web.Response:
+    """GET /debug/profile?seconds=10&mode=cpu|mem, Authorization: Bearer PROFILE_TOKEN"""
+    if not PROFILE_TOKEN:
+        raise web.HTTPNotFound()
+    if request.headers.get("Authorization") != f"Bearer {PROFILE_TOKEN}":
+        return web.Response(status=401, text="unauthorized")
+
+    try:
+        seconds, mode = parse_profile_args(
+            f"{request.query.get('seconds', '10')} {request.query.get('mode', 'cpu')}"
+        )
+    except ValueError:
+        return web.Response(status=400, text=f"seconds must be 1-{PROFILE_MAX_SECONDS}, mode cpu|mem")
+
+    if _profile_lock.locked():
+        return web.Response(status=409, text="profiling already in progress")
+
+    async with _profile_lock:
+        if mode == "mem":
+            body = await profile_memory(seconds)
+        else:
+            body = (await profile_cpu(seconds)).collapsed()
+    return web.Response(text=body, content_type="text/plain")
@@ -0,0 +1,223 @@
+# ==============================================================================
+# rating_anomaly.py - Мгновенные оповещения о падении оценок (EWMA)
+# ==============================================================================
+#
+# Ежедневный отчёт в 9:00 показывает падение оценок только на следующее
+# утро. Здесь каждая категория (чистота, персонал, …) и средняя оценка по
+# типу номера ведут две экспоненциальные скользящие средние:
+#   • быструю (RATING_EWMA_FAST) — «как оценивают последние гости»;
+#   • медленную (RATING_EWMA_SLOW) с дисперсией — привычный уровень.
+# Если быстрая опустилась ниже медленной на RATING_ALERT_Z стандартных
+# ошибок (и хотя бы на RATING_ALERT_MIN_DROP балла), администраторам сразу
+# уходит оповещение. Повторно по той же метрике — только после того, как
+# оценки вернутся к норме.
+#
+# Обновление — O(1) на отзыв в submit_review. Состояние лежит в rating_ewma
+# и переживает перезапуск: при старте бота догоняются отзывы, сохранённые
+# после последнего обновления (без оповещений). Отзывы со статусом
+# 'flagged' (review_guard.py) и отклонённые в расчёт не входят.
+
+import logging
+import math
+import os
+from typing import Dict, List, Optional
+
+import aiosqlite
+
+from reviews_query import CATEGORIES
+
+logger = logging.getLogger(__name__)
+
+ADMIN_IDS = list(map(int, os.getenv("ADMIN_IDS", "").split(","))) if os.getenv("ADMIN_IDS") else []
+
+RATING_EWMA_FAST = float(os.getenv("RATING_EWMA_FAST", "0.3"))
+RATING_EWMA_SLOW = float(os.getenv("RATING_EWMA_SLOW", "0.03"))
+RATING_ALERT_Z = float(os.getenv("RATING_ALERT_Z", "3"))
+RATING_ALERT_MIN_DROP = float(os.getenv("RATING_ALERT_MIN_DROP", "1.0"))
+# Пока по метрике меньше отзывов, привычный уровень не считается известным
+RATING_ALERT_MIN_REVIEWS = int(os.getenv("RATING_ALERT_MIN_REVIEWS", "20"))
+
+CATEGORY_LABELS = {
+    'cleanliness': '🧹 Чистота',
+    'comfort': '🛏️ Комфорт',
+    'location': '📍 Расположение',
+    'facilities': '🏊 Удобства',
+    'staff': '👥 Персонал',
+    'value_for_money': '💰 Цена/качество',
+}
+
+RATING_ANOMALY_SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS rating_ewma (
+        metric TEXT PRIMARY KEY,
+        reviews INTEGER NOT NULL,
+        fast REAL NOT NULL,
+        slow REAL NOT NULL,
+        variance REAL NOT NULL,
+        alerted INTEGER NOT NULL DEFAULT 0,
+        last_review_id INTEGER NOT NULL,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+]
+
+# Отзывы, которые учитываются в расчёте (и при догоне после перезапуска)
+COUNTED = "status NOT IN ('flagged', 'rejected')"
+
+
+class Ewma:
+    """Быстрая и медленная EWMA одной метрики и дисперсия медленной"""
+
+    def __init__(self, reviews: int = 0, fast: float = 0.0, slow: float = 0.0, variance: float = 0.0,
+                 alerted: bool = False, last_review_id: int = 0):
+        self.reviews = reviews
+        self.fast = fast
+        self.slow = slow
+        self.variance = variance
+        self.alerted = alerted
+        self.last_review_id = last_review_id
+
+    def update(self, value: float, review_id: int) -> Optional[float]:
+        """Учесть оценку; возвращает z-оценку падения, если пора оповещать"""
+        self.reviews += 1
+        self.last_review_id = review_id
+        if self.reviews == 1:
+            self.fast = self.slow = value
+            return None
+
+        self.fast += RATING_EWMA_FAST * (value - self.fast)
+        # Сравнение с привычным уровнем до того, как в него вошла новая оценка;
+        # стандартная ошибка быстрой EWMA — sigma * sqrt(a / (2 - a))
+        drop = self.slow - self.fast
+        error = math.sqrt(self.variance * RATING_EWMA_FAST / (2 - RATING_EWMA_FAST))
+        z = drop / error if error else math.inf
+        alert = None
+        if (self.reviews > RATING_ALERT_MIN_REVIEWS and drop >= RATING_ALERT_MIN_DROP
+                and z >= RATING_ALERT_Z and not self.alerted):
+            self.alerted = True
+            alert = z
+        elif self.alerted and drop < RATING_ALERT_MIN_DROP / 2:
+            self.alerted = False
+
+        diff = value - self.slow
+        increment = RATING_EWMA_SLOW * diff
+        self.slow += increment
+        self.variance = (1 - RATING_EWMA_SLOW) * (self.variance + diff * increment)
+        return alert
+
+
+class RatingMonitor:
+    """
+    EWMA по метрикам 'category:<категория>' и 'room_type:<тип номера>'.
+
+    Метрики, изменённые с последнего сохранения, записываются в rating_ewma
+    в транзакции самого отзыва (save перед commit в submit_review) —
+    состояние в базе не отстаёт от памяти.
+    """
+
+    def __init__(self):
+        self.metrics: Dict[str, Ewma] = {}
+        self._dirty = set()
+
+    def __len__(self) -> int:
+        return len(self.metrics)
+
+    @property
+    def last_review_id(self) -> int:
+        return max((ewma.last_review_id for ewma in self.metrics.values()), default=0)
+
+    def observe(self, review_id: int, scores: Dict[str, float], room_type: Optional[str]) -> List[Dict]:
+        """Обновить метрики отзыва; [оповещение] для метрик, где оценки упали"""
+        values = {f"category:{category}": scores[category] for category in CATEGORIES}
+        if room_type:
+            values[f"room_type:{room_type}"] = sum(scores[category] for category in CATEGORIES) / len(CATEGORIES)
+
+        alerts = []
+        for metric, value in values.items():
+            ewma = self.metrics.setdefault(metric, Ewma())
+            z = ewma.update(value, review_id)
+            self._dirty.add(metric)
+            if z is not None:
+                alerts.append({
+                    "metric": metric, "label": metric_label(metric), "z": z,
+                    "recent": ewma.fast, "baseline": ewma.slow, "spread": math.sqrt(ewma.variance),
+                    "review_id": review_id,
+                })
+        return alerts
+
+    # ===== ХРАНЕНИЕ =====
+
+    async def save(self, db: aiosqlite.Connection):
+        """Записать изменённые метрики (коммит — за вызывающим)"""
+        if not self._dirty:
+            return
+        rows = []
+        for metric in self._dirty:
+            ewma = self.metrics[metric]
+            rows.append((metric, ewma.reviews, ewma.fast, ewma.slow, ewma.variance,
+                         int(ewma.alerted), ewma.last_review_id))
+        await db.executemany("""
+            INSERT OR REPLACE INTO rating_ewma
+                (metric, reviews, fast, slow, variance, alerted, last_review_id, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+        """, rows)
+        self._dirty.clear()
+
+    async def load(self, db_path: str):
+        """Состояние из rating_ewma и догон отзывов, сохранённых после него"""
+        async with aiosqlite.connect(db_path) as db:
+            for statement in RATING_ANOMALY_SCHEMA:
+                await db.execute(statement)
+            cursor = await db.execute(
+                "SELECT metric, reviews, fast, slow, variance, alerted, last_review_id FROM rating_ewma"
+            )
+            self.metrics = {
+                metric: Ewma(reviews, fast, slow, variance, bool(alerted), last_review_id)
+                for metric, reviews, fast, slow, variance, alerted, last_review_id in await cursor.fetchall()
+            }
+            self._dirty.clear()
+
+            cursor = await db.execute(f"""
+                SELECT id, room_type, {", ".join(CATEGORIES)}
+                FROM reviews
+                WHERE id > ? AND {COUNTED}
+                ORDER BY id
+            """, (self.last_review_id,))
+            replayed = 0
+            async for review_id, room_type, *values in cursor:
+                self.observe(review_id, dict(zip(CATEGORIES, values)), room_type)
+                replayed += 1
+            await self.save(db)
+            await db.commit()
+        logger.info(f"EWMA оценок: {len(self.metrics)} метрик, догнано {replayed} отзывов")
+
+
+def metric_label(metric: str) -> str:
+    scope, name = metric.split(":", 1)
+    if scope == "category":
+        return CATEGORY_LABELS.get(name, name)
+    return f"🏠 {name} (средняя оценка)"
+
+
+async def send_rating_alerts(bot, alerts: List[Dict]):
+    """Оповестить администраторов о падении оценок"""
+    if not alerts:
+        return
+    lines = [
+        f"• {alert['label']}: последние гости — <b>{alert['recent']:.1f}</b>, "
+        f"обычно {alert['baseline']:.1f} ± {alert['spread']:.1f}"
+        for alert in alerts
+    ]
+    text = (
+        "📉 <b>Оценки резко упали</b>\n\n" + "\n".join(lines) +
+        f"\n\nПоследний отзыв: #{alerts[0]['review_id']}. Подробности — в отчёте /analytics"
+    )
+    for admin_id in ADMIN_IDS:
+        try:
+            await bot.send_message(chat_id=admin_id, text=text)
+        except Exception as e:
+            logger.error(f"Не удалось отправить оповещение об оценках {admin_id}: {e}")
+    logger.warning(f"Падение оценок: {', '.join(alert['metric'] for alert in alerts)}")
+
+
+rating_monitor = RatingMonitor()
@@ -0,0 +1,618 @@
+# ==============================================================================
+# replica.py - Непрерывная репликация WAL в каталог реплики и восстановление на момент времени
+# ==============================================================================
+#
+# Схема как у litestream: база работает в WAL-режиме, репликатор держит
+# читающую транзакцию (SQLite не может перезапустить WAL, пока она открыта),
+# раз в REPLICA_SYNC_INTERVAL копирует новые закоммиченные кадры WAL в
+# сжатые сегменты и периодически снимает полный снапшот.
+#
+#   <REPLICA_DIR>/generations/<поколение>/meta.json
+#   <REPLICA_DIR>/generations/<поколение>/snapshots/<seq>_<ms>.db.gz
+#   <REPLICA_DIR>/generations/<поколение>/wal/<seq>_<ms>.wal.gz
+#
+# Снапшот <seq> — состояние базы до сегмента <seq>. Если цепочка кадров
+# прервалась (WAL перезаписан до копирования, перезапуск бота), начинается
+# новое поколение со своим снапшотом.
+#
+# Только стандартная библиотека — восстановление работает на хосте:
+#   python3 replica.py list --dir ~/replica
+#   python3 replica.py restore --dir ~/replica --out restored.db --at "2026-07-15 14:30:00"
+
+import argparse
+import gzip
+import json
+import logging
+import os
+import shutil
+import sqlite3
+import struct
+import sys
+import threading
+import time
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+DB_FILE = os.getenv("DB_FILE", "orders.db")
+# Пустой REPLICA_DIR — репликация выключена
+REPLICA_DIR = os.getenv("REPLICA_DIR", "")
+REPLICA_SYNC_INTERVAL = float(os.getenv("REPLICA_SYNC_INTERVAL", "1"))
+REPLICA_SNAPSHOT_INTERVAL = float(os.getenv("REPLICA_SNAPSHOT_INTERVAL_HOURS", "24")) * 3600
+REPLICA_RETENTION = float(os.getenv("REPLICA_RETENTION_HOURS", "72")) * 3600
+# Размер WAL (страниц), после которого репликатор сам делает checkpoint
+REPLICA_CHECKPOINT_PAGES = int(os.getenv("REPLICA_CHECKPOINT_PAGES", "1000"))
+REPLICA_SNAPSHOT_PAGES_PER_STEP = int(os.getenv("BACKUP_PAGES_PER_STEP", "256"))
+
+WAL_HEADER_SIZE = 32
+FRAME_HEADER_SIZE = 24
+WAL_MAGIC = (0x377F0682, 0x377F0683)
+
+
+class ReplicaError(Exception):
+    pass
+
+
+class ChainBroken(Exception):
+    """Кадры WAL потеряны до копирования — нужно новое поколение"""
+
+# ===== ФОРМАТ WAL =====
+
+def wal_checksum(data: bytes, s0: int, s1: int, big_endian: bool) -> Tuple[int, int]:
+    """Накопительная контрольная сумма SQLite WAL (пары 32-битных слов)"""
+    words = struct.unpack(f"{'>' if big_endian else '<'}{len(data) // 4}I", data)
+    for i in range(0, len(words), 2):
+        s0 = (s0 + words[i] + s1) & 0xFFFFFFFF
+        s1 = (s1 + words[i + 1] + s0) & 0xFFFFFFFF
+    return s0, s1
+
+
+def read_wal_header(f) -> Optional[Dict]:
+    """Заголовок WAL или None, если файла нет, он пуст или заголовок битый"""
+    f.seek(0)
+    raw = f.read(WAL_HEADER_SIZE)
+    if len(raw) < WAL_HEADER_SIZE:
+        return None
+    magic, version, page_size, checkpoint_seq, salt1, salt2, ck0, ck1 = struct.unpack(">8I", raw)
+    if magic not in WAL_MAGIC:
+        return None
+    big_endian = magic & 1 == 1
+    if wal_checksum(raw[:24], 0, 0, big_endian) != (ck0, ck1):
+        return None
+    return {
+        "page_size": page_size,
+        "salt": (salt1, salt2),
+        "checksum": (ck0, ck1),
+        "big_endian": big_endian,
+    }
+
+
+def read_committed_frames(f, header: Dict, offset: int, checksum: Tuple[int, int],
+                          salt: Optional[Tuple[int, int]] = None) -> Tuple[bytes, int, Tuple[int, int], int]:
+    """
+    Кадры от offset до последнего коммита: (сырые кадры, новый offset,
+    контрольная сумма на нём, число кадров). Чтение останавливается на первом
+    кадре с чужой солью или неверной суммой — это конец текущей цепочки.
+    """
+    frame_size = FRAME_HEADER_SIZE + header["page_size"]
+    salt = salt or header["salt"]
+    s0, s1 = checksum
+    f.seek(offset)
+    pending = []
+    chunks = []
+    committed_offset, committed_checksum = offset, checksum
+    position = offset
+    frames = 0
+    while True:
+        frame = f.read(frame_size)
+        if len(frame) < frame_size:
+            break
+        pgno, commit_size, salt1, salt2, ck0, ck1 = struct.unpack(">6I", frame[:FRAME_HEADER_SIZE])
+        if (salt1, salt2) != salt:
+            break
+        s0, s1 = wal_checksum(frame[:8], s0, s1, header["big_endian"])
+        s0, s1 = wal_checksum(frame[FRAME_HEADER_SIZE:], s0, s1, header["big_endian"])
+        if (s0, s1) != (ck0, ck1):
+            break
+        pending.append(frame)
+        position += frame_size
+        if commit_size:
+            chunks.extend(pending)
+            frames += len(pending)
+            pending = []
+            committed_offset, committed_checksum = position, (s0, s1)
+    return b"".join(chunks), committed_offset, committed_checksum, frames
+
+
+def valid_wal_end(f, header: Dict) -> int:
+    """Конец непрерывной цепочки кадров текущего WAL (включая незакоммиченные)"""
+    frame_size = FRAME_HEADER_SIZE + header["page_size"]
+    s0, s1 = header["checksum"]
+    position = WAL_HEADER_SIZE
+    f.seek(position)
+    while True:
+        frame = f.read(frame_size)
+        if len(frame) < frame_size:
+            return position
+        pgno, commit_size, salt1, salt2, ck0, ck1 = struct.unpack(">6I", frame[:FRAME_HEADER_SIZE])
+        if (salt1, salt2) != header["salt"]:
+            return position
+        s0, s1 = wal_checksum(frame[:8], s0, s1, header["big_endian"])
+        s0, s1 = wal_checksum(frame[FRAME_HEADER_SIZE:], s0, s1, header["big_endian"])
+        if (s0, s1) != (ck0, ck1):
+            return position
+        position += frame_size
+
+# ===== КАТАЛОГ РЕПЛИКИ =====
+
+def _stamp_ms() -> int:
+    return int(time.time() * 1000)
+
+
+def _parse_name(name: str) -> Tuple[int, int]:
+    """'00000012_1721040000000.wal.gz' -> (12, 1721040000000)"""
+    seq, ms = name.split(".", 1)[0].split("_")
+    return int(seq), int(ms)
+
+
+def _write_gzip(path: str, data: bytes):
+    with gzip.open(path + ".partial", "wb", compresslevel=6) as f:
+        f.write(data)
+    os.replace(path + ".partial", path)
+
+
+def list_generations(replica_dir: str) -> List[Dict]:
+    """Поколения с их снапшотами и сегментами, от старых к новым"""
+    root = os.path.join(replica_dir, "generations")
+    if not os.path.isdir(root):
+        return []
+    generations = []
+    for name in sorted(os.listdir(root)):
+        path = os.path.join(root, name)
+        meta_path = os.path.join(path, "meta.json")
+        if not os.path.exists(meta_path):
+            continue
+        with open(meta_path, encoding="utf-8") as f:
+            meta = json.load(f)
+        snapshots = [
+            (*_parse_name(entry), os.path.join(path, "snapshots", entry))
+            for entry in os.listdir(os.path.join(path, "snapshots")) if entry.endswith(".db.gz")
+        ]
+        segments = [
+            (*_parse_name(entry), os.path.join(path, "wal", entry))
+            for entry in os.listdir(os.path.join(path, "wal")) if entry.endswith(".wal.gz")
+        ]
+        generations.append({
+            "name": name,
+            "path": path,
+            "page_size": meta["page_size"],
+            "snapshots": sorted(snapshots),
+            "segments": sorted(segments),
+        })
+    return generations
+
+
+def restore(replica_dir: str, target: str, at: Optional[datetime] = None) -> Dict:
+    """
+    Восстановить базу из реплики в target на момент at (по умолчанию — последний
+    сегмент). Снапшот распаковывается, затем кадры сегментов по порядку
+    пишутся на свои страницы. Точность — интервал синхронизации.
+    """
+    started = time.monotonic()
+    limit_ms = int(at.timestamp() * 1000) if at else None
+    candidates = []
+    for generation in list_generations(replica_dir):
+        snapshots = [s for s in generation["snapshots"] if limit_ms is None or s[1] <= limit_ms]
+        if snapshots:
+            candidates.append((snapshots[-1][1], generation, snapshots[-1]))
+    if not candidates:
+        raise ReplicaError("В реплике нет снапшота на указанный момент")
+    _, generation, (snapshot_seq, snapshot_ms, snapshot_path) = max(candidates, key=lambda c: c[0])
+
+    segments = [
+        s for s in generation["segments"]
+        if s[0] >= snapshot_seq and (limit_ms is None or s[1] <= limit_ms)
+    ]
+    for expected, (seq, _, path) in enumerate(segments, start=snapshot_seq):
+        if seq != expected:
+            raise ReplicaError(f"Пропущен сегмент {expected:08d} в поколении {generation['name']}")
+
+    page_size = generation["page_size"]
+    frame_size = FRAME_HEADER_SIZE + page_size
+    partial = target + ".partial"
+    with gzip.open(snapshot_path, "rb") as src, open(partial, "wb") as dst:
+        shutil.copyfileobj(src, dst, 1024 * 1024)
+
+    frames = 0
+    with open(partial, "r+b") as db:
+        for _, _, path in segments:
+            with gzip.open(path, "rb") as segment:
+                while True:
+                    frame = segment.read(frame_size)
+                    if len(frame) < frame_size:
+                        break
+                    pgno, commit_size = struct.unpack(">2I", frame[:8])
+                    db.seek((pgno - 1) * page_size)
+                    db.write(frame[FRAME_HEADER_SIZE:])
+                    if commit_size:
+                        db.truncate(commit_size * page_size)
+                    frames += 1
+        db.flush()
+        os.fsync(db.fileno())
+
+    conn = sqlite3.connect(partial)
+    try:
+        # Страница 1 из WAL помечает файл как WAL-базу — восстановленная копия обычная
+        conn.execute("PRAGMA journal_mode=DELETE")
+        rows = conn.execute("PRAGMA integrity_check").fetchall()
+    finally:
+        conn.close()
+    if rows != [("ok",)]:
+        os.remove(partial)
+        raise ReplicaError(f"integrity_check не пройден: {rows[:5]}")
+    os.replace(partial, target)
+
+    restored_ms = segments[-1][1] if segments else snapshot_ms
+    return {
+        "path": target,
+        "generation": generation["name"],
+        "snapshot": os.path.basename(snapshot_path),
+        "segments": len(segments),
+        "frames": frames,
+        "restored_to": datetime.fromtimestamp(restored_ms / 1000).strftime('%Y-%m-%d %H:%M:%S'),
+        "size": os.path.getsize(target),
+        "seconds": round(time.monotonic() - started, 3),
+    }
+
+# ===== РЕПЛИКАТОР =====
+
+class Replicator:
+    """
+    Фоновый поток, копирующий WAL базы в каталог реплики.
+
+    Все соединения живут в потоке репликатора: event loop бота не ждёт ни
+    чтения WAL, ни сжатия, ни снапшотов.
+    """
+
+    def __init__(self, db_path: str = DB_FILE, replica_dir: str = REPLICA_DIR,
+                 interval: float = REPLICA_SYNC_INTERVAL, snapshot_interval: float = REPLICA_SNAPSHOT_INTERVAL,
+                 retention: float = REPLICA_RETENTION, checkpoint_pages: int = REPLICA_CHECKPOINT_PAGES):
+        self.db_path = db_path
+        self.wal_path = db_path + "-wal"
+        self.replica_dir = replica_dir
+        self.interval = interval
+        self.snapshot_interval = snapshot_interval
+        self.retention = retention
+        self.checkpoint_pages = checkpoint_pages
+        self.generation: Optional[str] = None
+        self.last_sync: Optional[float] = None
+        self.last_snapshot: Optional[float] = None
+        self.generations_started = 0
+        self._reader: Optional[sqlite3.Connection] = None
+        self._writer: Optional[sqlite3.Connection] = None
+        self._header: Optional[Dict] = None
+        self._offset = WAL_HEADER_SIZE
+        self._checksum = (0, 0)
+        self._seq = 0
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._ready = threading.Event()
+        self._error: Optional[BaseException] = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, timeout: float = 60):
+        """Запуск потока; ждёт первого снапшота, чтобы ошибки конфигурации всплыли сразу"""
+        self._thread = threading.Thread(target=self._run, name="wal-replicator", daemon=True)
+        self._thread.start()
+        self._ready.wait(timeout)
+        if self._error:
+            raise self._error
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+
+    def _run(self):
+        try:
+            self._open()
+            self._start_generation()
+        except BaseException as e:
+            self._error = e
+            self._ready.set()
+            return
+        self._ready.set()
+
+        while not self._stop.wait(self.interval):
+            self._tick()
+        # Последняя синхронизация перед остановкой бота
+        self._tick(final=True)
+        self._close()
+
+    def _tick(self, final: bool = False):
+        try:
+            try:
+                self.sync()
+            except ChainBroken as e:
+                logger.warning(f"Цепочка WAL прервана ({e}) — новое поколение реплики")
+                self._start_generation()
+                return
+            if final:
+                return
+            if time.time() - self.last_snapshot >= self.snapshot_interval:
+                self.snapshot()
+                self.prune()
+            elif self._wal_pages() >= self.checkpoint_pages:
+                self.checkpoint()
+        except Exception as e:
+            logger.error(f"Ошибка репликации WAL: {e}")
+
+    # ===== СОЕДИНЕНИЯ =====
+
+    def _open(self):
+        self._writer = sqlite3.connect(self.db_path, isolation_level=None, timeout=10, check_same_thread=False)
+        mode = self._writer.execute("PRAGMA journal_mode=WAL").fetchone()[0]
+        if mode != "wal":
+            raise ReplicaError(f"Не удалось включить WAL (journal_mode={mode})")
+        # Репликатор сам решает, когда делать checkpoint
+        self._writer.execute("PRAGMA wal_autocheckpoint=0")
+        self._reader = sqlite3.connect(self.db_path, isolation_level=None, check_same_thread=False)
+        self._hold_read()
+
+    def _close(self):
+        for conn in (self._reader, self._writer):
+            if conn:
+                conn.close()
+
+    def _hold_read(self):
+        """Открытая читающая транзакция не даёт SQLite перезапустить WAL"""
+        if self._reader.in_transaction:
+            self._reader.execute("ROLLBACK")
+        self._reader.execute("BEGIN")
+        self._reader.execute("SELECT COUNT(*) FROM sqlite_master").fetchone()
+
+    def _wal_pages(self) -> int:
+        """Кадров в текущем цикле WAL (размер файла не годится: после перезапуска файл не усекается)"""
+        if not self._header:
+            return 0
+        return (self._offset - WAL_HEADER_SIZE) // (FRAME_HEADER_SIZE + self._header["page_size"])
+
+    # ===== СИНХРОНИЗАЦИЯ =====
+
+    def sync(self) -> int:
+        """Скопировать новые закоммиченные кадры; возвращает число кадров"""
+        if not os.path.exists(self.wal_path):
+            return 0
+        copied = 0
+        with open(self.wal_path, "rb") as f:
+            header = read_wal_header(f)
+            if header is None:
+                return 0
+            if self._header is None or header["salt"] != self._header["salt"]:
+                copied += self._follow_restart(f, header)
+            data, offset, checksum, frames = read_committed_frames(f, header, self._offset, self._checksum)
+            if frames:
+                self._write_segment(data)
+                self._offset, self._checksum = offset, checksum
+                copied += frames
+        self._hold_read()
+        self.last_sync = time.time()
+        return copied
+
+    def _follow_restart(self, f, header: Dict) -> int:
+        """
+        WAL начат заново. Кадры старой цепочки за нашим offset ещё лежат в
+        файле, если новый WAL не дорос до них, — дочитываем их по старой соли.
+        """
+        copied = 0
+        old = self._header
+        if old is not None:
+            # При каждом перезапуске SQLite увеличивает salt-1 на единицу
+            if header["salt"][0] != (old["salt"][0] + 1) & 0xFFFFFFFF:
+                raise ChainBroken("WAL перезапускался несколько раз между синхронизациями")
+            data, _, _, frames = read_committed_frames(f, old, self._offset, self._checksum, salt=old["salt"])
+            if valid_wal_end(f, header) > self._offset:
+                raise ChainBroken("новый WAL перезаписал нескопированные кадры")
+            if frames:
+                self._write_segment(data)
+                copied = frames
+        self._header = header
+        self._offset, self._checksum = WAL_HEADER_SIZE, header["checksum"]
+        return copied
+
+    def _write_segment(self, data: bytes):
+        path = os.path.join(self._generation_path, "wal", f"{self._seq:08d}_{_stamp_ms()}.wal.gz")
+        _write_gzip(path, data)
+        self._seq += 1
+
+    def checkpoint(self):
+        """
+        Перенос WAL в базу. Под блокировкой записи докопируем WAL до конца и
+        делаем PASSIVE checkpoint без своей читающей транзакции: когда все
+        кадры перенесены, следующий писатель начнёт WAL заново, а в старом
+        журнале не останется нескопированных кадров.
+        """
+        self._writer.execute("BEGIN IMMEDIATE")
+        try:
+            self.sync()
+            self._reader.execute("ROLLBACK")
+            busy, log, done = self._reader.execute("PRAGMA wal_checkpoint(PASSIVE)").fetchone()
+        finally:
+            self._writer.execute("ROLLBACK")
+            self._hold_read()
+        if log != done:
+            logger.info(f"Checkpoint WAL неполный: перенесено {done}/{log} кадров (есть читатели)")
+
+    # ===== СНАПШОТЫ =====
+
+    @property
+    def _generation_path(self) -> str:
+        return os.path.join(self.replica_dir, "generations", self.generation)
+
+    def _start_generation(self):
+        self.generation = datetime.now().strftime('%Y%m%d_%H%M%S_%f')
+        os.makedirs(os.path.join(self._generation_path, "snapshots"))
+        os.makedirs(os.path.join(self._generation_path, "wal"))
+        page_size = self._writer.execute("PRAGMA page_size").fetchone()[0]
+        with open(os.path.join(self._generation_path, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump({"db": os.path.abspath(self.db_path), "page_size": page_size,
+                       "created_at": datetime.now().isoformat(timespec="seconds")}, f)
+        self._seq = 0
+        self._header = None
+        self.snapshot(new_generation=True)
+        self.generations_started += 1
+        logger.info(f"Реплика WAL: поколение {self.generation} в {self.replica_dir}")
+
+    def snapshot(self, new_generation: bool = False):
+        """
+        Полный снапшот ровно на позиции реплики: под блокировкой записи
+        догоняем WAL и открываем читающую транзакцию, затем копируем базу
+        backup API уже без блокировки — снапшот видит именно эту позицию.
+        """
+        self._writer.execute("BEGIN IMMEDIATE")
+        try:
+            if new_generation:
+                self._skip_current_wal()
+            else:
+                self.sync()
+            self._hold_read()
+        finally:
+            self._writer.execute("ROLLBACK")
+
+        path = os.path.join(self._generation_path, "snapshots", f"{self._seq:08d}_{_stamp_ms()}.db.gz")
+        raw = path[:-3] + ".partial"
+        target = sqlite3.connect(raw)
+        try:
+            self._reader.backup(target, pages=REPLICA_SNAPSHOT_PAGES_PER_STEP)
+        finally:
+            target.close()
+        with open(raw, "rb") as src, gzip.open(path + ".partial", "wb", compresslevel=6) as dst:
+            shutil.copyfileobj(src, dst, 1024 * 1024)
+        os.replace(path + ".partial", path)
+        os.remove(raw)
+        self._hold_read()
+        self.last_snapshot = time.time()
+
+    def _skip_current_wal(self):
+        """Новое поколение: всё, что уже есть в WAL, войдёт в снапшот"""
+        self._header = None
+        self._offset, self._checksum = WAL_HEADER_SIZE, (0, 0)
+        if not os.path.exists(self.wal_path):
+            return
+        with open(self.wal_path, "rb") as f:
+            header = read_wal_header(f)
+            if header is None:
+                return
+            _, offset, checksum, _ = read_committed_frames(f, header, WAL_HEADER_SIZE, header["checksum"])
+        self._header = header
+        self._offset, self._checksum = offset, checksum
+
+    def prune(self):
+        """
+        Удаление старше REPLICA_RETENTION: в текущем поколении оставляем
+        последний снапшот до границы (от него восстанавливается граница) и всё
+        после него, прошлые поколения удаляются целиком.
+        """
+        cutoff_ms = (time.time() - self.retention) * 1000
+        for generation in list_generations(self.replica_dir):
+            if generation["name"] == self.generation:
+                snapshots = generation["snapshots"]
+                older = [s for s in snapshots if s[1] < cutoff_ms]
+                if len(older) < 1:
+                    continue
+                keep_seq = older[-1][0]
+                for seq, _, path in snapshots:
+                    if seq < keep_seq:
+                        os.remove(path)
+                for seq, _, path in generation["segments"]:
+                    if seq < keep_seq:
+                        os.remove(path)
+                continue
+            newest = max([s[1] for s in generation["snapshots"] + generation["segments"]], default=0)
+            if newest < cutoff_ms:
+                shutil.rmtree(generation["path"])
+                logger.info(f"Реплика WAL: удалено поколение {generation['name']}")
+
+    def status(self) -> Dict:
+        return {
+            "generation": self.generation,
+            "segments": self._seq,
+            "last_sync": self.last_sync,
+            "last_snapshot": self.last_snapshot,
+            "wal_pages": self._wal_pages(),
+        }
+
+
+replicator = Replicator()
+
+# ===== КОМАНДНАЯ СТРОКА =====
+
+def _print_list(replica_dir: str):
+    generations = list_generations(replica_dir)
+    if not generations:
+        print(f"В {replica_dir} нет реплики")
+        return
+    for generation in generations:
+        stamps = [s[1] for s in generation["snapshots"] + generation["segments"]]
+        span = " — ".join(
+            datetime.fromtimestamp(ms / 1000).strftime('%Y-%m-%d %H:%M:%S') for ms in (min(stamps), max(stamps))
+        ) if stamps else "-"
+        print(f"📦 {generation['name']}: {len(generation['snapshots'])} снапшотов, "
+              f"{len(generation['segments'])} сегментов WAL ({span})")
+
+
+def main() -> int:
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Реплика WAL базы Pelikan Bot")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    replicate = sub.add_parser("replicate", help="реплицировать базу (до Ctrl+C)")
+    replicate.add_argument("--db", default=DB_FILE)
+    replicate.add_argument("--dir", default=REPLICA_DIR, required=not REPLICA_DIR)
+
+    listing = sub.add_parser("list", help="поколения, снапшоты и сегменты")
+    listing.add_argument("--dir", default=REPLICA_DIR, required=not REPLICA_DIR)
+
+    restoring = sub.add_parser("restore", help="восстановить базу на момент времени")
+    restoring.add_argument("--dir", default=REPLICA_DIR, required=not REPLICA_DIR)
+    restoring.add_argument("--out", required=True, help="куда записать восстановленную базу")
+    restoring.add_argument("--at", help="момент 'YYYY-MM-DD HH:MM:SS' (по умолчанию — последний)")
+    args = parser.parse_args()
+
+    if args.command == "list":
+        _print_list(args.dir)
+        return 0
+
+    if args.command == "replicate":
+        worker = Replicator(args.db, args.dir)
+        worker.start()
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            worker.stop()
+        return 0
+
+    if os.path.exists(args.out):
+        print(f"❌ {args.out} уже существует — восстановление не перезаписывает файлы")
+        return 1
+    at = datetime.strptime(args.at, '%Y-%m-%d %H:%M:%S') if args.at else None
+    try:
+        result = restore(args.dir, args.out, at)
+    except ReplicaError as e:
+        print(f"❌ {e}")
+        return 1
+    print(
+        f"✅ Восстановлено: {result['path']} на {result['restored_to']} "
+        f"(поколение {result['generation']}, снапшот {result['snapshot']}, "
+        f"{result['segments']} сегментов / {result['frames']} кадров, {result['seconds']} с)"
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
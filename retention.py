@@ -0,0 +1,327 @@
+# ==============================================================================
+# retention.py - Архивация старых заказов в помесячные базы (бот и командная строка)
+# ==============================================================================
+#
+# Заказы старше RETENTION_DAYS не удаляются безвозвратно: сначала они
+# копируются в archive/orders_YYYY-MM.db по месяцу учётного дня (позиции
+# лежат в orders.items и переезжают вместе с заказом), потом удаляются из
+# рабочей базы небольшими порциями с паузами, чтобы новые заказы не ждали
+# блокировку записи.
+# Освободившиеся страницы возвращаются на диск через incremental_vacuum.
+# Базу, созданную до auto_vacuum=INCREMENTAL, один раз переводят вручную
+# (полный VACUUM блокирует базу — в окно обслуживания, бот лучше остановить);
+# до этого ночная архивация место на диске не возвращает.
+#
+#   python3 retention.py --days 30 --dry-run
+#   python3 retention.py --db data/orders.db --archive-dir data/archive
+#   python3 retention.py --db data/orders.db --convert-vacuum
+
+import argparse
+import asyncio
+import logging
+import os
+import sqlite3
+import sys
+import threading
+import time
+from typing import Dict, List
+
+from business_day import business_days_ago, ensure_business_day
+
+DATA_DIR = os.getenv("DATA_DIR", "/app/data")
+DB_FILE = os.getenv("DB_FILE", "orders.db")
+ARCHIVE_DIR = os.getenv("ARCHIVE_DIR", f"{DATA_DIR}/archive")
+RETENTION_DAYS = int(os.getenv("RETENTION_DAYS", "30"))
+# Заказов за одну транзакцию удаления и пауза между порциями
+RETENTION_BATCH = int(os.getenv("RETENTION_BATCH", "500"))
+RETENTION_PAUSE = float(os.getenv("RETENTION_PAUSE_MS", "50")) / 1000
+# Страниц за один шаг incremental_vacuum
+RETENTION_VACUUM_STEP = int(os.getenv("RETENTION_VACUUM_STEP", "1000"))
+# Ночной запуск по планировщику (часы по Asia/Almaty, пусто — только вручную)
+RETENTION_HOUR = os.getenv("RETENTION_HOUR", "4")
+
+ARCHIVE_PREFIX = "orders_"
+
+logger = logging.getLogger(__name__)
+
+_retention_lock = threading.Lock()
+
+
+class RetentionError(Exception):
+    pass
+
+
+def archive_path(month: str, archive_dir: str = ARCHIVE_DIR) -> str:
+    return os.path.join(archive_dir, f"{ARCHIVE_PREFIX}{month}.db")
+
+
+def list_archives(archive_dir: str = ARCHIVE_DIR) -> List[str]:
+    """Архивные базы от старых к новым"""
+    if not os.path.isdir(archive_dir):
+        return []
+    names = [
+        name for name in os.listdir(archive_dir)
+        if name.startswith(ARCHIVE_PREFIX) and name.endswith(".db")
+    ]
+    return [os.path.join(archive_dir, name) for name in sorted(names)]
+
+
+def _connect(db_path: str) -> sqlite3.Connection:
+    # isolation_level=None — транзакции открываются явно, ATTACH вне транзакции
+    conn = sqlite3.connect(db_path, timeout=30, isolation_level=None)
+    conn.execute("PRAGMA busy_timeout = 30000")
+    return conn
+
+
+def _columns(conn: sqlite3.Connection, schema: str) -> List[str]:
+    # table_info не показывает генерируемые столбцы — в них нельзя вставлять
+    return [row[1] for row in conn.execute(f"PRAGMA {schema}.table_info(orders)")]
+
+
+def _prepare_archive(conn: sqlite3.Connection) -> List[str]:
+    """
+    Таблица orders в подключённом архиве (arch) по схеме рабочей базы.
+    Столбцы, добавленные в рабочую базу позже, дописываются в старые архивы.
+    Возвращает общий список столбцов для INSERT ... SELECT.
+    """
+    create_sql = conn.execute(
+        "SELECT sql FROM main.sqlite_master WHERE type = 'table' AND name = 'orders'"
+    ).fetchone()[0]
+    if not conn.execute("SELECT 1 FROM arch.sqlite_master WHERE type = 'table' AND name = 'orders'").fetchone():
+        conn.execute(create_sql.replace("CREATE TABLE orders", "CREATE TABLE arch.orders", 1))
+    conn.execute("CREATE INDEX IF NOT EXISTS arch.idx_orders_created_at ON orders(created_at)")
+
+    archived = _columns(conn, "arch")
+    types = {row[1]: row[2] for row in conn.execute("PRAGMA main.table_info(orders)")}
+    for column in types:
+        if column not in archived:
+            conn.execute(f"ALTER TABLE arch.orders ADD COLUMN {column} {types[column]}")
+            archived.append(column)
+    # Архивы до появления business_day: столбец досчитывается по created_at
+    ensure_business_day(conn, "arch", triggers=False)
+    return [column for column in types if column in archived]
+
+
+def upgrade_archives(archive_dir: str = ARCHIVE_DIR) -> int:
+    """Столбец и индекс business_day в архивах, созданных до его появления"""
+    updated = 0
+    for path in list_archives(archive_dir):
+        conn = sqlite3.connect(path, timeout=30)
+        try:
+            updated += ensure_business_day(conn, triggers=False)
+        finally:
+            conn.close()
+    return updated
+
+
+def expired_months(conn: sqlite3.Connection, cutoff: str) -> List[tuple]:
+    """[(месяц, заказов, сумма)] для заказов с учётным днём раньше cutoff"""
+    return conn.execute("""
+        SELECT substr(business_day, 1, 7) AS month, COUNT(*), COALESCE(SUM(total), 0)
+        FROM orders
+        WHERE business_day < ?
+        GROUP BY month
+        ORDER BY month
+    """, (cutoff,)).fetchall()
+
+
+def _archive_month(conn: sqlite3.Connection, month: str, cutoff: str, archive_dir: str,
+                   batch: int, pause: float) -> int:
+    conn.execute("ATTACH DATABASE ? AS arch", (archive_path(month, archive_dir),))
+    try:
+        columns = ", ".join(_prepare_archive(conn))
+        lower, upper = f"{month}-01", min(f"{next_month(month)}-01", cutoff)
+        moved = 0
+        while True:
+            conn.execute("DELETE FROM temp.retention_batch")
+            conn.execute("""
+                INSERT INTO temp.retention_batch (order_id)
+                SELECT order_id FROM main.orders
+                WHERE business_day >= ? AND business_day < ?
+                LIMIT ?
+            """, (lower, upper, batch))
+            count = conn.execute("SELECT COUNT(*) FROM temp.retention_batch").fetchone()[0]
+            if not count:
+                return moved
+
+            # Сначала копия в архив и её коммит, потом удаление: при сбое между
+            # шагами заказ окажется в обеих базах, и повторный запуск перезапишет
+            # копию (INSERT OR REPLACE), но не потеряет заказ
+            conn.execute("BEGIN")
+            conn.execute(f"""
+                INSERT OR REPLACE INTO arch.orders ({columns})
+                SELECT {columns} FROM main.orders
+                WHERE order_id IN (SELECT order_id FROM temp.retention_batch)
+            """)
+            conn.execute("COMMIT")
+
+            conn.execute("BEGIN IMMEDIATE")
+            deleted = conn.execute("""
+                DELETE FROM main.orders
+                WHERE order_id IN (SELECT order_id FROM temp.retention_batch)
+                  AND order_id IN (SELECT order_id FROM arch.orders)
+            """).rowcount
+            conn.execute("COMMIT")
+            moved += deleted
+            if deleted < count:
+                raise RetentionError(f"{month}: {count - deleted} заказов не найдено в архиве после копирования")
+            # Блокировка записи отпущена — даём пройти заказам из бота
+            if pause:
+                time.sleep(pause)
+    finally:
+        conn.execute("DETACH DATABASE arch")
+
+
+def next_month(month: str) -> str:
+    year, number = int(month[:4]), int(month[5:7])
+    return f"{year + number // 12:04d}-{number % 12 + 1:02d}"
+
+
+def incremental_vacuum(conn: sqlite3.Connection, step: int = RETENTION_VACUUM_STEP,
+                       pause: float = RETENTION_PAUSE) -> int:
+    """
+    Вернуть свободные страницы файловой системе порциями по step.
+    Без auto_vacuum=INCREMENTAL ничего не делает: полный VACUUM — только
+    через convert_vacuum (retention.py --convert-vacuum).
+    """
+    if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+        logger.warning("incremental_vacuum пропущен: база не в режиме auto_vacuum=INCREMENTAL "
+                       "(перевести: python3 retention.py --convert-vacuum)")
+        return 0
+
+    before = conn.execute("PRAGMA page_count").fetchone()[0]
+    while True:
+        free = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        if not free:
+            break
+        # executescript доводит прагму до конца: через execute() модуль sqlite3
+        # делает один шаг — освобождается одна страница вместо step
+        conn.executescript(f"PRAGMA incremental_vacuum({min(free, step)});")
+        if conn.execute("PRAGMA freelist_count").fetchone()[0] >= free:
+            break
+        if pause:
+            time.sleep(pause)
+    return before - conn.execute("PRAGMA page_count").fetchone()[0]
+
+
+def convert_vacuum(db_path: str = DB_FILE) -> int:
+    """
+    Разовый перевод базы в auto_vacuum=INCREMENTAL полным VACUUM.
+    Возвращает число освобождённых страниц (0, если режим уже включён).
+    """
+    if not os.path.exists(db_path):
+        raise RetentionError(f"База не найдена: {db_path}")
+    if not _retention_lock.acquire(blocking=False):
+        raise RetentionError("Архивация уже выполняется")
+    try:
+        conn = _connect(db_path)
+        try:
+            if conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2:
+                return 0
+            before = conn.execute("PRAGMA page_count").fetchone()[0]
+            conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            conn.execute("VACUUM")
+            return before - conn.execute("PRAGMA page_count").fetchone()[0]
+        finally:
+            conn.close()
+    finally:
+        _retention_lock.release()
+
+
+def run_retention(db_path: str = DB_FILE, archive_dir: str = ARCHIVE_DIR, days: int = RETENTION_DAYS,
+                  batch: int = RETENTION_BATCH, pause: float = RETENTION_PAUSE,
+                  vacuum: bool = True, dry_run: bool = False) -> Dict:
+    """
+    Перенести заказы старше days дней в помесячные архивы.
+    dry_run — только посчитать, что будет перенесено.
+    """
+    if not os.path.exists(db_path):
+        raise RetentionError(f"База не найдена: {db_path}")
+    if not _retention_lock.acquire(blocking=False):
+        raise RetentionError("Архивация уже выполняется")
+
+    try:
+        started = time.monotonic()
+        conn = _connect(db_path)
+        try:
+            # Архивы разбиты по месяцам учётного дня, как и отчёты
+            ensure_business_day(conn)
+            if not dry_run:
+                upgrade_archives(archive_dir)
+            cutoff = business_days_ago(days)
+            months = expired_months(conn, cutoff)
+            result = {
+                "cutoff": cutoff,
+                "months": [{"month": month, "orders": count, "total": total} for month, count, total in months],
+                "archived": 0,
+                "freed_pages": 0,
+                "page_size": conn.execute("PRAGMA page_size").fetchone()[0],
+            }
+            if dry_run or not months:
+                result["seconds"] = round(time.monotonic() - started, 2)
+                return result
+
+            os.makedirs(archive_dir, exist_ok=True)
+            conn.execute("CREATE TEMP TABLE IF NOT EXISTS retention_batch (order_id TEXT PRIMARY KEY)")
+            for month, _, _ in months:
+                result["archived"] += _archive_month(conn, month, cutoff, archive_dir, batch, pause)
+            if vacuum:
+                result["freed_pages"] = incremental_vacuum(conn, pause=pause)
+        finally:
+            conn.close()
+
+        result["seconds"] = round(time.monotonic() - started, 2)
+        return result
+    finally:
+        _retention_lock.release()
+
+
+async def run_retention_async(**kwargs) -> Dict:
+    """run_retention в рабочем потоке — event loop бота не блокируется"""
+    return await asyncio.to_thread(run_retention, **kwargs)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Архивация старых заказов Pelikan Bot")
+    parser.add_argument("--db", default=DB_FILE, help="путь к базе")
+    parser.add_argument("--archive-dir", default=ARCHIVE_DIR, help="каталог помесячных архивов")
+    parser.add_argument("--days", type=int, default=RETENTION_DAYS, help="архивировать старше N дней")
+    parser.add_argument("--batch", type=int, default=RETENTION_BATCH, help="заказов за транзакцию")
+    parser.add_argument("--no-vacuum", action="store_true", help="не возвращать место на диске")
+    parser.add_argument("--dry-run", action="store_true", help="только показать, что будет перенесено")
+    parser.add_argument("--convert-vacuum", action="store_true",
+                        help="перевести базу в auto_vacuum=INCREMENTAL полным VACUUM (разово, при остановленном боте)")
+    args = parser.parse_args()
+
+    if args.convert_vacuum:
+        try:
+            freed = convert_vacuum(args.db)
+        except (RetentionError, sqlite3.Error) as e:
+            print(f"❌ {e}")
+            return 1
+        print(f"✅ {args.db}: auto_vacuum=INCREMENTAL (освобождено {freed} страниц)")
+        return 0
+
+    try:
+        result = run_retention(
+            args.db, args.archive_dir, args.days, batch=args.batch,
+            vacuum=not args.no_vacuum, dry_run=args.dry_run
+        )
+    except RetentionError as e:
+        print(f"❌ {e}")
+        return 1
+
+    for month in result["months"]:
+        print(f"  {month['month']}: {month['orders']} заказов на {month['total']}₸")
+    if args.dry_run:
+        print(f"ℹ️ Старше {result['cutoff']}: {sum(m['orders'] for m in result['months'])} заказов")
+        return 0
+    print(
+        f"✅ В архив перенесено {result['archived']} заказов → {args.archive_dir} "
+        f"(освобождено {result['freed_pages'] * result['page_size'] / 1024 / 1024:.1f} МБ, {result['seconds']} с)"
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
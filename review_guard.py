@@ -0,0 +1,246 @@
+# ==============================================================================
+# review_guard.py - Дубликаты и флуд отзывов: проверка при сохранении
+# ==============================================================================
+#
+# Перед INSERT в reviews отзыв проверяется двумя способами:
+#   • окно частоты — сколько отзывов за REVIEW_RATE_WINDOW_HOURS оставил этот
+#     telegram_user_id и сколько пришло на этот номер (индексы по
+#     (telegram_user_id, created_at) и (room_number, created_at));
+#   • почти-дубликаты — MinHash-подпись текста (плюсы, минусы, комментарий)
+#     по символьным 5-граммам, разложенная на LSH-полосы. Кандидаты ищутся по
+#     ключам полос в review_lsh — REVIEW_LSH_BANDS точечных запросов по
+#     индексу на отзыв, без перебора старых отзывов; сходство кандидата
+#     оценивается по сохранённой подписи.
+#
+# Гость сверх REVIEW_USER_LIMIT получает отказ до конца окна. Дубликат или
+# всплеск отзывов на один номер сохраняется со статусом 'flagged' и причиной
+# в spam_reason: такой отзыв ждёт модерации (edit_reviews.py) и не попадает
+# в аналитику, где считаются только 'approved' и 'pending'.
+
+import hashlib
+import os
+import re
+import sqlite3
+import zlib
+from typing import Dict, List, Optional
+
+import aiosqlite
+import numpy as np
+
+# Отзывов от одного гостя и на один номер за окно
+REVIEW_RATE_WINDOW_HOURS = int(os.getenv("REVIEW_RATE_WINDOW_HOURS", "24"))
+REVIEW_USER_LIMIT = int(os.getenv("REVIEW_USER_LIMIT", "2"))
+REVIEW_ROOM_LIMIT = int(os.getenv("REVIEW_ROOM_LIMIT", "4"))
+# Оценка сходства по Жаккару, начиная с которой отзыв считается дубликатом
+REVIEW_DUP_THRESHOLD = float(os.getenv("REVIEW_DUP_THRESHOLD", "0.7"))
+# Более короткие тексты («всё отлично») на дубликаты не проверяются
+REVIEW_DUP_MIN_CHARS = int(os.getenv("REVIEW_DUP_MIN_CHARS", "30"))
+
+# Параметры подписи зашиты в код: подписи в базе должны оставаться сравнимыми.
+# 16 полос по 4 строки — кандидат находится с вероятностью ~50% уже при
+# сходстве 0.5 и почти наверняка (>99%) при 0.7
+REVIEW_LSH_BANDS = 16
+REVIEW_LSH_ROWS = 4
+SHINGLE_SIZE = 5
+REVIEW_LSH_CANDIDATES = 20
+_PRIME = 4294967291  # наибольшее простое < 2^32 — подпись помещается в uint32
+_rng = np.random.RandomState(20260601)
+_HASH_A = _rng.randint(1, 2 ** 31, REVIEW_LSH_BANDS * REVIEW_LSH_ROWS).astype(np.uint64)
+_HASH_B = _rng.randint(0, 2 ** 31, REVIEW_LSH_BANDS * REVIEW_LSH_ROWS).astype(np.uint64)
+
+_NON_WORD = re.compile(r"[\W_]+")
+
+GUARD_COLUMNS = {"spam_reason": "TEXT", "duplicate_of": "INTEGER"}
+
+GUARD_SCHEMA = [
+    "CREATE INDEX IF NOT EXISTS idx_reviews_user_created ON reviews(telegram_user_id, created_at)",
+    "CREATE INDEX IF NOT EXISTS idx_reviews_room_created ON reviews(room_number, created_at)",
+    """
+    CREATE TABLE IF NOT EXISTS review_signatures (
+        review_id INTEGER PRIMARY KEY,
+        signature BLOB NOT NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS review_lsh (
+        band INTEGER NOT NULL,
+        bucket INTEGER NOT NULL,
+        review_id INTEGER NOT NULL,
+        PRIMARY KEY (band, bucket, review_id)
+    ) WITHOUT ROWID
+    """,
+    # Удалённый отзыв уходит из кандидатов; отредактированный текст
+    # (edit_reviews.py) больше не соответствует подписи — она снимается
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_review_guard_delete AFTER DELETE ON reviews BEGIN
+        DELETE FROM review_signatures WHERE review_id = OLD.id;
+        DELETE FROM review_lsh WHERE review_id = OLD.id;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_review_guard_update AFTER UPDATE OF pros, cons, comment ON reviews BEGIN
+        DELETE FROM review_signatures WHERE review_id = OLD.id;
+        DELETE FROM review_lsh WHERE review_id = OLD.id;
+    END
+    """,
+]
+
+# ===== ПОДПИСЬ =====
+
+def review_text(pros: str, cons: str, comment: str) -> str:
+    """Текст отзыва для сравнения: нижний регистр, ё -> е, без пунктуации"""
+    text = " ".join(part for part in (pros, cons, comment) if part)
+    return _NON_WORD.sub(" ", text.lower().replace("ё", "е")).strip()
+
+
+def signature(text: str) -> Optional[np.ndarray]:
+    """
+    MinHash-подпись (uint32 x полосы*строки) по символьным 5-граммам.
+    None для текста короче REVIEW_DUP_MIN_CHARS.
+    """
+    if len(text) < REVIEW_DUP_MIN_CHARS:
+        return None
+    shingles = {text[i:i + SHINGLE_SIZE] for i in range(len(text) - SHINGLE_SIZE + 1)}
+    hashes = np.fromiter((zlib.crc32(s.encode()) for s in shingles), dtype=np.uint64, count=len(shingles))
+    # (a * x + b) mod p для всех перестановок сразу: матрица перестановки x шинглы
+    permuted = (np.outer(_HASH_A, hashes) + _HASH_B[:, None]) % _PRIME
+    return permuted.min(axis=1).astype(np.uint32)
+
+
+def band_buckets(sig: np.ndarray) -> List[int]:
+    """Ключ каждой LSH-полосы — 64-битный хэш её строк (знаковый, для SQLite)"""
+    return [
+        int.from_bytes(hashlib.blake2b(band.tobytes(), digest_size=8).digest(), "big", signed=True)
+        for band in sig.reshape(REVIEW_LSH_BANDS, REVIEW_LSH_ROWS)
+    ]
+
+
+def similarity(sig: np.ndarray, other: np.ndarray) -> float:
+    """Оценка сходства по Жаккару — доля совпавших минимумов"""
+    return float(np.mean(sig == other))
+
+# ===== СХЕМА =====
+
+def ensure_review_guard(conn: sqlite3.Connection) -> int:
+    """
+    Столбцы spam_reason/duplicate_of, индексы окон и LSH-таблицы.
+    Подписи считаются для отзывов, у которых их ещё нет; возвращает их число.
+    """
+    existing = {row[1] for row in conn.execute("PRAGMA table_info(reviews)")}
+    for column, column_type in GUARD_COLUMNS.items():
+        if column not in existing:
+            conn.execute(f"ALTER TABLE reviews ADD COLUMN {column} {column_type}")
+    for statement in GUARD_SCHEMA:
+        conn.execute(statement)
+    conn.commit()
+
+    signed = 0
+    signatures = {}  # одинаковые тексты считаются один раз
+    rows = conn.execute("""
+        SELECT id, pros, cons, comment FROM reviews
+        WHERE id NOT IN (SELECT review_id FROM review_signatures)
+    """).fetchall()
+    for review_id, pros, cons, comment in rows:
+        text = review_text(pros, cons, comment)
+        if text not in signatures:
+            signatures[text] = signature(text)
+        sig = signatures[text]
+        if sig is None:
+            continue
+        conn.execute("INSERT INTO review_signatures (review_id, signature) VALUES (?, ?)", (review_id, sig.tobytes()))
+        conn.executemany(
+            "INSERT OR IGNORE INTO review_lsh (band, bucket, review_id) VALUES (?, ?, ?)",
+            [(band, bucket, review_id) for band, bucket in enumerate(band_buckets(sig))]
+        )
+        signed += 1
+    conn.commit()
+    return signed
+
+
+def migrate_review_guard(db_path: str) -> int:
+    """ensure_review_guard для файла базы (init_db бота, запуск в рабочем потоке)"""
+    conn = sqlite3.connect(db_path, timeout=30)
+    try:
+        return ensure_review_guard(conn)
+    finally:
+        conn.close()
+
+# ===== ПРОВЕРКА ПРИ СОХРАНЕНИИ =====
+
+async def _recent_reviews(db: aiosqlite.Connection, column: str, value) -> int:
+    cursor = await db.execute(
+        f"SELECT COUNT(*) FROM reviews WHERE {column} = ? AND created_at >= datetime('now', ?)",
+        (value, f"-{REVIEW_RATE_WINDOW_HOURS} hours")
+    )
+    return (await cursor.fetchone())[0]
+
+
+async def user_over_limit(db: aiosqlite.Connection, user_id: int) -> bool:
+    """Гость уже оставил REVIEW_USER_LIMIT отзывов за окно"""
+    return await _recent_reviews(db, "telegram_user_id", user_id) >= REVIEW_USER_LIMIT
+
+
+async def find_duplicate(db: aiosqlite.Connection, sig: np.ndarray) -> Optional[Dict]:
+    """Самый похожий сохранённый отзыв со сходством от REVIEW_DUP_THRESHOLD или None"""
+    buckets = band_buckets(sig)
+    # Из каждой полосы — не больше REVIEW_LSH_CANDIDATES последних отзывов:
+    # даже при сотне одинаковых «Всё понравилось» проверка остаётся O(1)
+    bands = " UNION ".join(
+        "SELECT review_id FROM (SELECT review_id FROM review_lsh "
+        "WHERE band = ? AND bucket = ? ORDER BY review_id DESC LIMIT ?)"
+        for _ in buckets
+    )
+    params = [value for band, bucket in enumerate(buckets) for value in (band, bucket, REVIEW_LSH_CANDIDATES)]
+    cursor = await db.execute(f"""
+        SELECT review_id, signature FROM review_signatures
+        WHERE review_id IN ({bands})
+    """, params)
+    best = None
+    for review_id, blob in await cursor.fetchall():
+        score = similarity(sig, np.frombuffer(blob, dtype=np.uint32))
+        if score >= REVIEW_DUP_THRESHOLD and (best is None or score > best["similarity"]):
+            best = {"review_id": review_id, "similarity": score}
+    return best
+
+
+async def screen_review(db: aiosqlite.Connection, user_id: int, room: Optional[str],
+                        pros: str, cons: str, comment: str) -> Dict:
+    """
+    Решение по новому отзыву:
+        {"blocked": bool, "status": 'pending' | 'flagged', "spam_reason": str | None,
+         "duplicate_of": int | None, "signature": np.ndarray | None}
+    """
+    verdict = {"blocked": False, "status": "pending", "spam_reason": None,
+               "duplicate_of": None, "signature": None}
+    if await user_over_limit(db, user_id):
+        verdict["blocked"] = True
+        return verdict
+
+    reasons = []
+    sig = signature(review_text(pros, cons, comment))
+    verdict["signature"] = sig
+    if sig is not None:
+        duplicate = await find_duplicate(db, sig)
+        if duplicate:
+            verdict["duplicate_of"] = duplicate["review_id"]
+            reasons.append(f"похож на отзыв #{duplicate['review_id']} ({duplicate['similarity']:.0%})")
+    if room:
+        room_reviews = await _recent_reviews(db, "room_number", room)
+        if room_reviews >= REVIEW_ROOM_LIMIT:
+            reasons.append(f"номер {room}: {room_reviews + 1}-й отзыв за {REVIEW_RATE_WINDOW_HOURS} ч")
+
+    if reasons:
+        verdict["status"] = "flagged"
+        verdict["spam_reason"] = "; ".join(reasons)
+    return verdict
+
+
+async def remember_review(db: aiosqlite.Connection, review_id: int, sig: Optional[np.ndarray]):
+    """Добавить подпись сохранённого отзыва в LSH-индекс (в той же транзакции, что INSERT)"""
+    if sig is None:
+        return
+    await db.execute("INSERT INTO review_signatures (review_id, signature) VALUES (?, ?)", (review_id, sig.tobytes()))
+    await db.executemany(
+        "INSERT OR IGNORE INTO review_lsh (band, bucket, review_id) VALUES (?, ?, ?)",
+        [(band, bucket, review_id) for band, bucket in enumerate(band_buckets(sig))]
+    )
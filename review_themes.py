@@ -0,0 +1,316 @@
+# ==============================================================================
+# review_themes.py - Темы жалоб и похвалы в тексте отзывов для ежедневного отчёта
+# ==============================================================================
+#
+# Плюсы, минусы и комментарий разбиваются на слова, слова сводятся к основе
+# (тот же стеммер, что у /search), «не работал» склеивается в одно понятие,
+# соседние слова дают биграммы («холодн душ»). Для каждого учётного дня в
+# review_terms_daily хранится, в скольких отзывах встретилась основа —
+# отдельно для жалоб (минусы + комментарий при оценке ниже 6) и похвалы
+# (плюсы + комментарий при оценке от 8).
+#
+# Индекс инкрементальный: триггеры на reviews помечают изменившиеся дни в
+# review_terms_dirty, и пересчитываются только они. Период собирается из
+# дневных строк как разреженная матрица (период x основа) в numpy; результат
+# кэшируется в памяти, пока в индексе ничего не поменялось.
+
+import asyncio
+import os
+import re
+import sqlite3
+from collections import Counter, defaultdict
+from datetime import date, timedelta
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from business_day import business_days_ago
+from search_index import stem
+
+DB_FILE = os.getenv('DB_FILE', 'orders.db')
+# Тема попадает в отчёт, если встретилась хотя бы в стольких отзывах периода
+THEMES_MIN_REVIEWS = int(os.getenv("THEMES_MIN_REVIEWS", "3"))
+# ...и её доля выросла хотя бы во столько раз к предыдущему периоду
+THEMES_MIN_LIFT = float(os.getenv("THEMES_MIN_LIFT", "1.5"))
+THEMES_TOP = int(os.getenv("THEMES_TOP", "5"))
+
+COMPLAINT_SCORE = 6
+PRAISE_SCORE = 8
+KINDS = ("complaint", "praise")
+
+STOPWORDS = frozenset("""
+    а без более бы был была были было быть в вам вас весь во вот все всегда всего всех вы где да даже для до
+    его ее ей если есть еще же за здесь и из или им их к как какой когда кто ли между меня мне мной много
+    мы на над нам нас наш него нее ней них но ну о об один он она они оно от очень по под после при про раз
+    с со так такой также там тем то того тоже только том тот ты у уже чем что чтобы эта эти это этот я
+    было будет можно весьма просто всё ещё её целом вообще немного
+""".split())
+NEGATIONS = frozenset(("не", "нет", "ни"))
+
+_WORD = re.compile(r"[а-яa-z0-9]+(?:-[а-яa-z0-9]+)*")
+# Биграммы и «не …» не переходят через границу фразы
+_CLAUSE = re.compile(r"[.,;:!?\n]+")
+# Меняется вместе с extract_terms: при расхождении индекс пересчитывается целиком
+THEMES_EXTRACTOR_VERSION = 2
+
+THEMES_SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS review_terms_daily (
+        business_day TEXT NOT NULL,
+        kind TEXT NOT NULL,
+        term TEXT NOT NULL,
+        reviews INTEGER NOT NULL,
+        surface TEXT NOT NULL,
+        PRIMARY KEY (business_day, kind, term)
+    ) WITHOUT ROWID
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS review_terms_days (
+        business_day TEXT PRIMARY KEY,
+        reviews INTEGER NOT NULL
+    )
+    """,
+    "CREATE TABLE IF NOT EXISTS review_terms_dirty (business_day TEXT PRIMARY KEY)",
+    """
+    CREATE TABLE IF NOT EXISTS review_terms_meta (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        extractor INTEGER NOT NULL
+    )
+    """,
+    # business_day новой строки проставляет триггер business_day.py — его
+    # UPDATE и помечает день; текст и статус правятся в edit_reviews.py
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_review_terms_update
+    AFTER UPDATE OF pros, cons, comment, status, business_day,
+                    cleanliness, comfort, location, facilities, staff, value_for_money ON reviews
+    BEGIN
+        INSERT OR IGNORE INTO review_terms_dirty (business_day)
+        SELECT NEW.business_day WHERE NEW.business_day IS NOT NULL;
+        INSERT OR IGNORE INTO review_terms_dirty (business_day)
+        SELECT OLD.business_day WHERE OLD.business_day IS NOT NULL;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_review_terms_delete AFTER DELETE ON reviews
+    WHEN OLD.business_day IS NOT NULL
+    BEGIN
+        INSERT OR IGNORE INTO review_terms_dirty (business_day) VALUES (OLD.business_day);
+    END
+    """,
+]
+
+# (начало, конец, предыдущее начало) -> темы; сбрасывается при обновлении индекса
+_themes_cache: Dict[Tuple[str, str, str], Dict] = {}
+
+# ===== ТЕКСТ =====
+
+def extract_terms(text: str) -> Dict[str, str]:
+    """
+    'Не работал кондиционер, холодный душ' ->
+    {'не_работал': 'не работал', 'кондиционер': ..., 'холодн': 'холодный',
+     'душ': 'душ', 'не_работал кондиционер': ..., 'холодн душ': 'холодный душ'}
+    Ключ — основа (или пара основ), значение — словоформа для отчёта.
+    Пары собираются только внутри фразы (до знака препинания).
+    """
+    terms = {}
+    for clause in _CLAUSE.split((text or "").lower().replace("ё", "е")):
+        tokens = []
+        negate = False
+        for word in _WORD.findall(clause):
+            if word in NEGATIONS:
+                negate = True
+                continue
+            if word in STOPWORDS or len(word) < 3 or word.isdigit():
+                continue
+            key, surface = stem(word), word
+            if negate:
+                key, surface, negate = f"не_{key}", f"не {word}", False
+            tokens.append((key, surface))
+
+        terms.update(tokens)
+        for (key_a, surface_a), (key_b, surface_b) in zip(tokens, tokens[1:]):
+            if key_a != key_b:
+                terms[f"{key_a} {key_b}"] = f"{surface_a} {surface_b}"
+    return terms
+
+
+def review_terms(pros: str, cons: str, comment: str, score: float) -> Dict[str, Dict[str, str]]:
+    """Понятия отзыва по видам: жалобы и похвала"""
+    complaint = extract_terms(cons)
+    praise = extract_terms(pros)
+    if score is not None and score < COMPLAINT_SCORE:
+        complaint.update(extract_terms(comment))
+    elif score is not None and score >= PRAISE_SCORE:
+        praise.update(extract_terms(comment))
+    return {"complaint": complaint, "praise": praise}
+
+# ===== ИНДЕКС =====
+
+def ensure_themes_index(conn: sqlite3.Connection) -> bool:
+    """
+    Таблицы и триггеры; при первом создании и при смене THEMES_EXTRACTOR_VERSION
+    все дни помечаются к подсчёту
+    """
+    created = not conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'review_terms_daily'"
+    ).fetchone()
+    for statement in THEMES_SCHEMA:
+        conn.execute(statement)
+    stored = conn.execute("SELECT extractor FROM review_terms_meta WHERE id = 1").fetchone()
+    if created or not stored or stored[0] != THEMES_EXTRACTOR_VERSION:
+        conn.execute(
+            "INSERT OR REPLACE INTO review_terms_meta (id, extractor) VALUES (1, ?)", (THEMES_EXTRACTOR_VERSION,)
+        )
+        conn.execute("""
+            INSERT OR IGNORE INTO review_terms_dirty (business_day)
+            SELECT DISTINCT business_day FROM reviews WHERE business_day IS NOT NULL
+        """)
+    conn.commit()
+    return created
+
+
+def migrate_themes_index(db_path: str) -> bool:
+    """ensure_themes_index для файла базы (init_db бота, запуск в рабочем потоке)"""
+    conn = sqlite3.connect(db_path, timeout=30)
+    try:
+        return ensure_themes_index(conn)
+    finally:
+        conn.close()
+
+
+def refresh_themes_index(conn: sqlite3.Connection) -> int:
+    """Пересчитать помеченные дни одним проходом; возвращает число дней"""
+    days = [row[0] for row in conn.execute("SELECT business_day FROM review_terms_dirty")]
+    if not days:
+        return 0
+
+    daily = defaultdict(Counter)   # (день, вид) -> основа -> отзывов
+    surfaces = defaultdict(Counter)  # (вид, основа) -> словоформа -> раз
+    totals = Counter()
+    placeholders = ", ".join("?" * len(days))
+    for day, pros, cons, comment, score in conn.execute(f"""
+        SELECT business_day, pros, cons, comment, avg_score
+        FROM reviews
+        WHERE business_day IN ({placeholders}) AND status IN ('approved', 'pending')
+    """, days):
+        totals[day] += 1
+        for kind, terms in review_terms(pros, cons, comment, score).items():
+            for key, surface in terms.items():
+                daily[(day, kind)][key] += 1
+                surfaces[(kind, key)][surface] += 1
+
+    rows = [
+        (day, kind, key, count, surfaces[(kind, key)].most_common(1)[0][0])
+        for (day, kind), counter in daily.items()
+        for key, count in counter.items()
+    ]
+    conn.execute(f"DELETE FROM review_terms_daily WHERE business_day IN ({placeholders})", days)
+    conn.execute(f"DELETE FROM review_terms_days WHERE business_day IN ({placeholders})", days)
+    conn.executemany("INSERT INTO review_terms_daily VALUES (?, ?, ?, ?, ?)", rows)
+    conn.executemany(
+        "INSERT INTO review_terms_days (business_day, reviews) VALUES (?, ?)",
+        [(day, totals[day]) for day in days if totals[day]]
+    )
+    conn.execute(f"DELETE FROM review_terms_dirty WHERE business_day IN ({placeholders})", days)
+    conn.commit()
+    _themes_cache.clear()
+    return len(days)
+
+# ===== ТЕМЫ ЗА ПЕРИОД =====
+
+def _rank(terms: List[str], counts: np.ndarray, totals: Tuple[int, int],
+          surfaces: Dict[str, str]) -> List[Dict]:
+    """
+    counts — матрица 2 x V (предыдущий, текущий период) числа отзывов
+    с основой. Растущая тема: частая в текущем периоде и с долей выше,
+    чем в предыдущем (доли сглажены на +1, чтобы не делить на ноль).
+    """
+    previous, current = counts
+    prev_total, cur_total = totals
+    cur_share = current / max(cur_total, 1)
+    prev_share = previous / max(prev_total, 1)
+    lift = ((current + 1) / (cur_total + 2)) / ((previous + 1) / (prev_total + 2))
+    candidates = np.flatnonzero((current >= THEMES_MIN_REVIEWS) & (lift >= THEMES_MIN_LIFT))
+    # При равном росте биграмма («холодный душ») важнее своих слов
+    words = np.array([term.count(" ") + 1 for term in terms])
+    order = candidates[np.lexsort((-words[candidates], -(cur_share - prev_share)[candidates]))]
+
+    themes, used = [], set()
+    for index in order:
+        parts = set(terms[index].split(" "))
+        # «холодный душ» уже в отчёте — «душ» отдельно не повторяем
+        if parts <= used:
+            continue
+        used |= parts
+        themes.append({
+            "term": surfaces[terms[index]],
+            "reviews": int(current[index]),
+            "prev_reviews": int(previous[index]),
+            "share": round(float(cur_share[index]) * 100, 1),
+            "prev_share": round(float(prev_share[index]) * 100, 1),
+            "lift": round(float(lift[index]), 1),
+        })
+        if len(themes) >= THEMES_TOP:
+            break
+    return themes
+
+
+def period_themes(conn: sqlite3.Connection, start: str, end: str, prev_start: str) -> Dict:
+    """
+    Растущие темы жалоб и похвалы за учётные дни [start, end) против
+    [prev_start, start). Индекс предварительно обновляется.
+    """
+    refresh_themes_index(conn)
+    key = (start, end, prev_start)
+    if key in _themes_cache:
+        return _themes_cache[key]
+
+    totals = [0, 0]
+    for day, reviews in conn.execute(
+        "SELECT business_day, reviews FROM review_terms_days WHERE business_day >= ? AND business_day < ?",
+        (prev_start, end)
+    ):
+        totals[int(day >= start)] += reviews
+
+    result = {"reviews": totals[1], "prev_reviews": totals[0]}
+    for kind in KINDS:
+        # Дневные строки — разреженная матрица в формате COO: (период, основа, отзывов)
+        vocabulary: Dict[str, int] = {}
+        best_surface: Dict[str, Tuple[int, str]] = {}
+        periods, columns, values = [], [], []
+        for day, term, reviews, surface in conn.execute("""
+            SELECT business_day, term, reviews, surface FROM review_terms_daily
+            WHERE kind = ? AND business_day >= ? AND business_day < ?
+        """, (kind, prev_start, end)):
+            periods.append(int(day >= start))
+            columns.append(vocabulary.setdefault(term, len(vocabulary)))
+            values.append(reviews)
+            if reviews > best_surface.get(term, (0, ""))[0]:
+                best_surface[term] = (reviews, surface)
+
+        size = len(vocabulary)
+        flat = np.asarray(periods, dtype=np.int64) * size + np.asarray(columns, dtype=np.int64)
+        counts = np.bincount(flat, weights=np.asarray(values, dtype=np.float64), minlength=2 * size)
+        result[kind] = _rank(
+            list(vocabulary), counts.reshape(2, size), (totals[0], totals[1]),
+            {term: surface for term, (_, surface) in best_surface.items()}
+        ) if size else []
+
+    _themes_cache[key] = result
+    return result
+
+
+def rising_themes(days: int = 30, db_path: str = DB_FILE) -> Dict:
+    """Темы за последние days дней против предыдущих days дней (как в get_reviews_analytics)"""
+    start = business_days_ago(days)
+    end = (date.fromisoformat(business_days_ago(0)) + timedelta(days=1)).isoformat()
+    conn = sqlite3.connect(db_path, timeout=30)
+    try:
+        return period_themes(conn, start, end, business_days_ago(days * 2))
+    finally:
+        conn.close()
+
+
+async def rising_themes_async(days: int = 30, db_path: str = DB_FILE) -> Dict:
+    """rising_themes в рабочем потоке — разбор текста не блокирует event loop"""
+    return await asyncio.to_thread(rising_themes, days, db_path)
@@ -0,0 +1,172 @@
+# ==============================================================================
+# reviews_cache.py - Предрасчитанный JSON опубликованных отзывов для /api/reviews
+# ==============================================================================
+
+import asyncio
+import gzip
+import hashlib
+import json
+import os
+import time
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+
+import aiosqlite
+
+from reviews_query import encode_cursor
+
+DB_FILE = os.getenv('DB_FILE', 'orders.db')
+# Как часто (сек) сверять версию снимка с базой — одна выборка по первичному ключу
+REVIEWS_CACHE_CHECK_INTERVAL = float(os.getenv("REVIEWS_CACHE_CHECK_INTERVAL", "5"))
+REVIEWS_CACHE_MAX_AGE = int(os.getenv("REVIEWS_CACHE_MAX_AGE", "60"))
+
+PUBLISHED = "{row}.is_published = 1 AND {row}.status = 'approved'"
+BUMP_VERSION = (
+    "UPDATE cache_versions SET version = version + 1, changed_at = CURRENT_TIMESTAMP "
+    "WHERE name = 'published_reviews';"
+)
+
+# Версия снимка растёт только когда отзыв одобряют, снимают с публикации или
+# редактируют опубликованный — в том числе из edit_reviews.py в другом процессе
+REVIEWS_CACHE_SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS cache_versions (
+        name TEXT PRIMARY KEY,
+        version INTEGER NOT NULL DEFAULT 0,
+        changed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+    "INSERT OR IGNORE INTO cache_versions (name, version) VALUES ('published_reviews', 0)",
+    f"""
+    CREATE TRIGGER IF NOT EXISTS trg_reviews_cache_insert AFTER INSERT ON reviews
+    WHEN {PUBLISHED.format(row='NEW')}
+    BEGIN {BUMP_VERSION} END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS trg_reviews_cache_update AFTER UPDATE ON reviews
+    WHEN ({PUBLISHED.format(row='OLD')}) OR ({PUBLISHED.format(row='NEW')})
+    BEGIN {BUMP_VERSION} END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS trg_reviews_cache_delete AFTER DELETE ON reviews
+    WHEN {PUBLISHED.format(row='OLD')}
+    BEGIN {BUMP_VERSION} END
+    """,
+]
+
+PUBLISHED_REVIEWS_QUERY = """
+    SELECT
+        id,
+        display_name as name,
+        room_number,
+        cleanliness, comfort, location, facilities, staff, value_for_money,
+        ROUND(avg_score, 1) as avg_score,
+        pros, cons, comment,
+        created_at as date
+    FROM reviews
+    WHERE is_published = 1 AND status = 'approved'
+    ORDER BY created_at DESC, id DESC
+    LIMIT 50
+"""
+
+
+class PublishedReviewsSnapshot:
+    """Сериализованный (и сжатый) ответ /api/reviews, пересобирается только при смене версии"""
+
+    def __init__(self, db_file: str = DB_FILE):
+        self.db_file = db_file
+        self.version = None
+        self.body = b""
+        self.gzip_body = b""
+        self.etag = ""
+        self.gzip_etag = ""
+        self.last_modified = None
+        self.next_cursor = None
+        self._checked_at = 0.0
+        self._lock = asyncio.Lock()
+
+    async def get(self) -> "PublishedReviewsSnapshot":
+        if self.version is not None and time.monotonic() - self._checked_at < REVIEWS_CACHE_CHECK_INTERVAL:
+            return self
+
+        async with self._lock:
+            if self.version is not None and time.monotonic() - self._checked_at < REVIEWS_CACHE_CHECK_INTERVAL:
+                return self
+
+            async with aiosqlite.connect(self.db_file) as db:
+                cursor = await db.execute(
+                    "SELECT version, changed_at FROM cache_versions WHERE name = 'published_reviews'"
+                )
+                version, changed_at = await cursor.fetchone()
+                if version != self.version:
+                    await self._rebuild(db, version, changed_at)
+            self._checked_at = time.monotonic()
+        return self
+
+    def invalidate(self):
+        """Сбросить снимок из этого процесса, не дожидаясь интервала проверки"""
+        self.version = None
+
+    async def _rebuild(self, db, version: int, changed_at: str):
+        db.row_factory = aiosqlite.Row
+        cursor = await db.execute(PUBLISHED_REVIEWS_QUERY)
+        reviews = [dict(row) for row in await cursor.fetchall()]
+
+        self.next_cursor = encode_cursor(reviews[-1]["date"], reviews[-1]["id"]) if len(reviews) == 50 else None
+        for review in reviews:
+            del review["id"]
+        self.body = json.dumps(reviews).encode("utf-8")
+        self.gzip_body = gzip.compress(self.body, compresslevel=9)
+        self.etag = f'"{hashlib.sha1(self.body).hexdigest()[:20]}"'
+        # У сжатого представления свой сильный ETag: байты ответа другие
+        self.gzip_etag = f'{self.etag[:-1]}-gz"'
+        self.last_modified = (
+            datetime.strptime(changed_at, '%Y-%m-%d %H:%M:%S').replace(tzinfo=timezone.utc)
+            if changed_at else datetime.now(timezone.utc).replace(microsecond=0)
+        )
+        self.version = version
+
+    def http_headers(self, gzipped: bool = False) -> dict:
+        headers = {
+            "ETag": self.gzip_etag if gzipped else self.etag,
+            "Last-Modified": format_datetime(self.last_modified, usegmt=True),
+            "Cache-Control": f"public, max-age={REVIEWS_CACHE_MAX_AGE}",
+            "Vary": "Accept-Encoding, Origin",
+        }
+        if self.next_cursor:
+            headers["X-Next-Cursor"] = self.next_cursor
+        return headers
+
+    def not_modified(self, if_none_match: str = None, if_modified_since: str = None) -> bool:
+        """Проверка условного запроса (If-None-Match важнее If-Modified-Since)"""
+        if if_none_match:
+            candidates = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+            return "*" in candidates or self.etag in candidates or self.gzip_etag in candidates
+        if if_modified_since:
+            try:
+                return self.last_modified <= parsedate_to_datetime(if_modified_since)
+            except (TypeError, ValueError):
+                return False
+        return False
+
+
+def accepts_gzip(accept_encoding: str = None) -> bool:
+    """Разрешён ли gzip по Accept-Encoding с учётом q ("gzip;q=0" — запрет)"""
+    weights = {}
+    for part in (accept_encoding or "").lower().split(","):
+        coding, *params = [item.strip() for item in part.split(";")]
+        if not coding:
+            continue
+        weight = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip() == "q":
+                try:
+                    weight = float(value)
+                except ValueError:
+                    weight = 0.0
+        weights[coding] = weight
+    return weights.get("gzip", weights.get("*", 0.0)) > 0
+
+
+published_reviews_snapshot = PublishedReviewsSnapshot()
@@ -14,6 +14,9 @@ from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 from aiogram.types import Message, CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton, BufferedInputFile
 
+from review_guard import REVIEW_RATE_WINDOW_HOURS, remember_review, screen_review, user_over_limit
+from rating_anomaly import rating_monitor, send_rating_alerts
+
 # Импорт из главного файла
 DB_FILE = os.getenv('DB_FILE', 'orders.db')
 ADMIN_IDS = list(map(int, os.getenv("ADMIN_IDS", "").split(","))) if os.getenv("ADMIN_IDS") else []
@@ -46,6 +49,11 @@ class ReviewStates(StatesGroup):
 
 # ===================== ВСПОМОГАТЕЛЬНЫЕ ФУНКЦИИ =====================
 
+RATE_LIMIT_TEXT = (
+    "🙏 <b>Спасибо, ваши отзывы уже у нас!</b>\n\n"
+    f"Новый отзыв можно будет оставить в течение {REVIEW_RATE_WINDOW_HOURS} ч."
+)
+
 def get_score_keyboard(criteria: str) -> InlineKeyboardMarkup:
     """Создаёт клавиатуру с оценками 1-10"""
     keyboard = []
@@ -74,20 +82,18 @@ def get_skip_keyboard() -> InlineKeyboardMarkup:
 
 async def notify_managers_new_review(bot, review_id: int, user_id: int, username: str, data: dict):
     """Уведомить менеджеров о новом отзыве"""
-    avg_score = (
-        data['cleanliness'] + data['comfort'] + data['location'] +
-        data['facilities'] + data['staff'] + data['value']
-    ) / 6
+    avg_score = data['avg_score']
     
     room_info = data.get('room', 'не указан')
     scanned_info = f"\n📱 QR из номера: <b>{data.get('scanned_room')}</b>" if data.get('scanned_room') else ""
+    spam_info = f"\n⚠️ <b>На проверке:</b> {data['spam_reason']}" if data.get('spam_reason') else ""
     
     text = f"""
 🆕 <b>Новый отзыв #{review_id}</b>
 
 👤 От: {data['guest_name']} (@{username or 'без username'})
 🚪 Номер: {room_info}{scanned_info}
-⭐ Средняя оценка: <b>{avg_score:.1f}/10</b>
+⭐ Средняя оценка: <b>{avg_score:.1f}/10</b>{spam_info}
 
 Используйте /admin_reviews для модерации
 """
@@ -120,6 +126,12 @@ async def start_review(callback: CallbackQuery, state: FSMContext):
     """Начало опроса"""
     await callback.answer()
     
+    # Лимит отзывов проверяем сразу, чтобы гость не заполнял опрос впустую
+    async with aiosqlite.connect(DB_FILE) as db:
+        if await user_over_limit(db, callback.from_user.id):
+            await callback.message.answer(RATE_LIMIT_TEXT)
+            return
+    
     await callback.message.answer(
         "👤 <b>Шаг 1/12</b>\n\n"
         "Как вас зовут?\n"
@@ -401,28 +413,59 @@ async def submit_review(callback: CallbackQuery, state: FSMContext):
             # Получаем номер из QR-кода если есть
             scanned_room = user_room_tracking.get(user.id)
             
+            # Лимит на гостя, почти-дубликаты и всплеск по номеру (review_guard.py).
+            # BEGIN IMMEDIATE: проверки, INSERT и подпись — под одной блокировкой
+            # записи, двойное нажатие «Отправить» не проскочит мимо лимита и дедупа
+            await db.execute("BEGIN IMMEDIATE")
+            verdict = await screen_review(
+                db, user.id, data.get('room'), data.get('pros'), data.get('cons'), data.get('comment')
+            )
+            if verdict['blocked']:
+                await db.rollback()
+                await callback.message.answer(RATE_LIMIT_TEXT)
+                await state.clear()
+                return
+            
             cursor = await db.execute("""
                 INSERT INTO reviews (
                     telegram_user_id, telegram_username, guest_name, room_number,
                     cleanliness, comfort, location, facilities, staff, value_for_money,
-                    pros, cons, comment, display_name, scanned_room_number
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    pros, cons, comment, display_name, scanned_room_number,
+                    status, spam_reason, duplicate_of
+                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                RETURNING id, avg_score, room_type
             """, (
                 user.id, user.username, data['guest_name'], data.get('room'),
                 data['cleanliness'], data['comfort'], data['location'],
                 data['facilities'], data['staff'], data['value'],
                 data.get('pros'), data.get('cons'), data.get('comment'),
-                data['guest_name'], scanned_room
+                data['guest_name'], scanned_room,
+                verdict['status'], verdict['spam_reason'], verdict['duplicate_of']
             ))
             
-            review_id = cursor.lastrowid
+            review_id, avg_score, room_type = await cursor.fetchone()
+            await remember_review(db, review_id, verdict['signature'])
+            
+            # EWMA оценок по категориям и типу номера (rating_anomaly.py) — в том же
+            # коммите, что и отзыв; подозрительные не учитываются
+            alerts = []
+            if verdict['status'] != 'flagged':
+                scores = {
+                    'cleanliness': data['cleanliness'], 'comfort': data['comfort'], 'location': data['location'],
+                    'facilities': data['facilities'], 'staff': data['staff'], 'value_for_money': data['value'],
+                }
+                alerts = rating_monitor.observe(review_id, scores, room_type)
+                await rating_monitor.save(db)
             await db.commit()
         
-        # ✅ Добавляем scanned_room в data для уведомления
+        # ✅ Добавляем scanned_room, сохранённую среднюю оценку и причину проверки в data для уведомления
         data['scanned_room'] = scanned_room
+        data['avg_score'] = avg_score
+        data['spam_reason'] = verdict['spam_reason']
         
         # Уведомляем менеджеров
         await notify_managers_new_review(callback.bot, review_id, user.id, user.username, data)
+        await send_rating_alerts(callback.bot, alerts)
         
         await callback.message.answer(
             "✅ <b>Спасибо за ваш отзыв!</b>\n\n"
@@ -0,0 +1,224 @@
+# ==============================================================================
+# reviews_query.py - Постраничная выдача отзывов и сводка для сайта
+# ==============================================================================
+
+import base64
+import os
+from datetime import date, timedelta
+from typing import Dict, List, Optional, Tuple
+
+import aiosqlite
+
+DB_FILE = os.getenv('DB_FILE', 'orders.db')
+REVIEWS_PAGE_SIZE = int(os.getenv("REVIEWS_PAGE_SIZE", "20"))
+REVIEWS_PAGE_SIZE_MAX = 100
+
+CATEGORIES = ['cleanliness', 'comfort', 'location', 'facilities', 'staff', 'value_for_money']
+AVG_SCORE_SQL = "(cleanliness + comfort + location + facilities + staff + value_for_money) / 6.0"
+# Корзины распределения оценок в аналитике: <2, <4, <6, <8, остальное
+RATING_BUCKET_SQL = "MIN(CAST(avg_score / 2 AS INTEGER), 4)"
+RATING_BUCKETS = ['Очень плохо', 'Плохо', 'Удовлетворительно', 'Хорошо', 'Отлично']
+
+PUBLISHED = "{row}.is_published = 1 AND {row}.status = 'approved'"
+
+# Тип номера = номер без последнего слова: 'Бунгало (2+1) 401' -> 'Бунгало (2+1)'.
+# rtrim по набору символов номера без пробелов срезает последнее слово целиком.
+ROOM_TYPE_SQL = "NULLIF(rtrim(rtrim(room_number, replace(room_number, ' ', '')), ' '), '')"
+
+
+def _summary_delta(row: str, sign: str) -> str:
+    sums = ", ".join(f"sum_{c} = sum_{c} {sign} {row}.{c}" for c in CATEGORIES)
+    return f"""
+        UPDATE reviews_summary SET review_count = review_count {sign} 1, {sums}
+        WHERE id = 1 AND {PUBLISHED.format(row=row)};
+        UPDATE reviews_histogram SET review_count = review_count {sign} 1
+        WHERE bucket = CAST(ROUND({row}.avg_score) AS INTEGER) AND {PUBLISHED.format(row=row)};
+    """
+
+
+REVIEWS_QUERY_SCHEMA = [
+    f"ALTER TABLE reviews ADD COLUMN room_type TEXT GENERATED ALWAYS AS ({ROOM_TYPE_SQL}) VIRTUAL",
+    # Keyset-пагинация опубликованных отзывов: (created_at, id) по убыванию
+    "CREATE INDEX IF NOT EXISTS idx_reviews_published_keyset ON reviews(status, is_published, created_at, id)",
+    "CREATE INDEX IF NOT EXISTS idx_reviews_published_room_type ON reviews(status, is_published, room_type, created_at, id)",
+    # Средняя оценка и её корзина: VIRTUAL (ALTER TABLE не добавляет STORED),
+    # значения хранятся в индексах. Лучшие/худшие за период — обход
+    # idx_reviews_avg_score с конца, фильтр по дню и статусу без чтения строк
+    f"ALTER TABLE reviews ADD COLUMN avg_score REAL GENERATED ALWAYS AS ({AVG_SCORE_SQL}) VIRTUAL",
+    f"ALTER TABLE reviews ADD COLUMN rating_bucket INTEGER GENERATED ALWAYS AS ({RATING_BUCKET_SQL}) VIRTUAL",
+    "CREATE INDEX IF NOT EXISTS idx_reviews_avg_score ON reviews(avg_score, created_at, business_day, status)",
+    "CREATE INDEX IF NOT EXISTS idx_reviews_rating_bucket ON reviews(rating_bucket, business_day, status)",
+    # Агрегаты опубликованных отзывов, поддерживаются триггерами
+    f"""
+    CREATE TABLE IF NOT EXISTS reviews_summary (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        review_count INTEGER NOT NULL DEFAULT 0,
+        {", ".join(f"sum_{c} INTEGER NOT NULL DEFAULT 0" for c in CATEGORIES)}
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS reviews_histogram (
+        bucket INTEGER PRIMARY KEY,
+        review_count INTEGER NOT NULL DEFAULT 0
+    )
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS trg_reviews_summary_insert AFTER INSERT ON reviews
+    WHEN {PUBLISHED.format(row='NEW')}
+    BEGIN {_summary_delta('NEW', '+')} END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS trg_reviews_summary_update AFTER UPDATE ON reviews
+    WHEN ({PUBLISHED.format(row='OLD')}) OR ({PUBLISHED.format(row='NEW')})
+    BEGIN {_summary_delta('OLD', '-')} {_summary_delta('NEW', '+')} END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS trg_reviews_summary_delete AFTER DELETE ON reviews
+    WHEN {PUBLISHED.format(row='OLD')}
+    BEGIN {_summary_delta('OLD', '-')} END
+    """,
+]
+
+
+async def ensure_reviews_query_schema(db):
+    """Схема для пагинации и сводки; при первом запуске пересчитывает агрегаты"""
+    cursor = await db.execute("SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = 'idx_reviews_avg_score'")
+    new_indexes = await cursor.fetchone() is None
+    for statement in REVIEWS_QUERY_SCHEMA:
+        try:
+            await db.execute(statement)
+        except aiosqlite.OperationalError as e:
+            # Повторное ALTER TABLE ADD COLUMN
+            if "duplicate column" not in str(e):
+                raise
+
+    if new_indexes:
+        # Без статистики по новым индексам планировщик выбирает их для любого
+        # фильтра по status — вместо индексов по дню и keyset-пагинации
+        await db.execute("ANALYZE reviews")
+
+    cursor = await db.execute("SELECT COUNT(*) FROM reviews_summary")
+    if (await cursor.fetchone())[0] == 0:
+        await rebuild_reviews_summary(db)
+    await db.commit()
+
+
+async def rebuild_reviews_summary(db):
+    """Полный пересчёт агрегатов (первый запуск или ручная сверка)"""
+    await db.execute("DELETE FROM reviews_summary")
+    await db.execute("DELETE FROM reviews_histogram")
+    await db.execute(f"""
+        INSERT INTO reviews_summary (id, review_count, {", ".join(f"sum_{c}" for c in CATEGORIES)})
+        SELECT 1, COUNT(*), {", ".join(f"COALESCE(SUM({c}), 0)" for c in CATEGORIES)}
+        FROM reviews WHERE {PUBLISHED.format(row='reviews')}
+    """)
+    await db.executemany(
+        "INSERT INTO reviews_histogram (bucket, review_count) VALUES (?, 0)",
+        [(bucket,) for bucket in range(1, 11)]
+    )
+    await db.execute(f"""
+        UPDATE reviews_histogram SET review_count = (
+            SELECT COUNT(*) FROM reviews
+            WHERE {PUBLISHED.format(row='reviews')}
+              AND CAST(ROUND(avg_score) AS INTEGER) = reviews_histogram.bucket
+        )
+    """)
+
+# ==============================================================================
+# ПАГИНАЦИЯ
+# ==============================================================================
+
+def encode_cursor(created_at: str, review_id: int) -> str:
+    return base64.urlsafe_b64encode(f"{created_at}|{review_id}".encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[str, int]:
+    raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode("utf-8")
+    created_at, review_id = raw.rsplit("|", 1)
+    return created_at, int(review_id)
+
+
+def parse_review_filters(query) -> Dict:
+    """Разбор query-параметров /api/reviews; ValueError при неверных значениях"""
+    filters = {"limit": min(max(int(query.get("limit", REVIEWS_PAGE_SIZE)), 1), REVIEWS_PAGE_SIZE_MAX)}
+    if query.get("cursor"):
+        filters["cursor"] = decode_cursor(query["cursor"])
+    if query.get("min_score"):
+        filters["min_score"] = float(query["min_score"])
+    if query.get("room_type"):
+        filters["room_type"] = query["room_type"]
+    if query.get("date_from"):
+        filters["date_from"] = date.fromisoformat(query["date_from"]).isoformat()
+    if query.get("date_to"):
+        filters["date_to"] = (date.fromisoformat(query["date_to"]) + timedelta(days=1)).isoformat()
+    return filters
+
+
+async def query_published_reviews(filters: Dict, db_file: str = DB_FILE) -> Tuple[List[Dict], Optional[str]]:
+    """Страница опубликованных отзывов (новые сверху) и курсор следующей страницы"""
+    where = ["status = 'approved'", "is_published = 1"]
+    params = []
+
+    if "room_type" in filters:
+        where.append("room_type = ?")
+        params.append(filters["room_type"])
+    if "date_from" in filters:
+        where.append("created_at >= ?")
+        params.append(filters["date_from"])
+    if "date_to" in filters:
+        where.append("created_at < ?")
+        params.append(filters["date_to"])
+    if "cursor" in filters:
+        where.append("(created_at, id) < (?, ?)")
+        params.extend(filters["cursor"])
+    if "min_score" in filters:
+        where.append("avg_score >= ?")
+        params.append(filters["min_score"])
+
+    limit = filters["limit"]
+    async with aiosqlite.connect(db_file) as db:
+        db.row_factory = aiosqlite.Row
+        cursor = await db.execute(f"""
+            SELECT
+                id,
+                display_name as name,
+                room_number,
+                cleanliness, comfort, location, facilities, staff, value_for_money,
+                ROUND(avg_score, 1) as avg_score,
+                pros, cons, comment,
+                created_at as date
+            FROM reviews
+            WHERE {" AND ".join(where)}
+            ORDER BY created_at DESC, id DESC
+            LIMIT ?
+        """, (*params, limit + 1))
+        rows = [dict(row) for row in await cursor.fetchall()]
+
+    next_cursor = encode_cursor(rows[limit - 1]["date"], rows[limit - 1]["id"]) if len(rows) > limit else None
+    reviews = rows[:limit]
+    for review in reviews:
+        del review["id"]
+    return reviews, next_cursor
+
+# ==============================================================================
+# СВОДКА
+# ==============================================================================
+
+async def get_reviews_summary(db_file: str = DB_FILE) -> Dict:
+    """Средние по категориям и гистограмма оценок из поддерживаемых агрегатов"""
+    async with aiosqlite.connect(db_file) as db:
+        cursor = await db.execute(
+            f"SELECT review_count, {', '.join(f'sum_{c}' for c in CATEGORIES)} FROM reviews_summary WHERE id = 1"
+        )
+        row = await cursor.fetchone() or (0,) + (0,) * len(CATEGORIES)
+        cursor = await db.execute("SELECT bucket, review_count FROM reviews_histogram ORDER BY bucket")
+        histogram = {str(bucket): count for bucket, count in await cursor.fetchall()}
+
+    count, sums = row[0], row[1:]
+    categories = {c: round(total / count, 2) if count else None for c, total in zip(CATEGORIES, sums)}
+    return {
+        "count": count,
+        "avg_score": round(sum(sums) / (count * len(CATEGORIES)), 2) if count else None,
+        "categories": categories,
+        "histogram": histogram,
+    }
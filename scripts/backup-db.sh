@@ -1,20 +1,15 @@
 #!/bin/bash
 # Бэкап базы данных Pelikan Bot
+# Онлайн-копия через SQLite backup API (backup.py): консистентна даже во время
+# записи заказов, проверяется integrity_check и сжимается gzip
 BACKUP_DIR=~/backups
-DATE=$(date +%Y%m%d_%H%M%S)
-DB_PATH=~/pelikan-bot/pelikan-bot/data/orders.db
+BOT_DIR=~/pelikan-bot/pelikan-bot
+DB_PATH=$BOT_DIR/data/orders.db
 
-# Создаём директорию для бэкапов
-mkdir -p $BACKUP_DIR
-
-# Копируем базу
+# Копируем базу, удаляем бэкапы старше 30 дней
 if [ -f "$DB_PATH" ]; then
-    cp $DB_PATH $BACKUP_DIR/orders_$DATE.db
-    echo "✅ Backup created: orders_$DATE.db"
-    
-    # Удаляем бэкапы старше 30 дней
-    find $BACKUP_DIR -name "orders_*.db" -mtime +30 -delete
-    echo "🗑️ Old backups cleaned (>30 days)"
+    python3 $BOT_DIR/backup.py --db "$DB_PATH" --dir "$BACKUP_DIR" --keep 0 --keep-days 30
 else
     echo "❌ Database not found: $DB_PATH"
+    exit 1
 fi
@@ -1,7 +1,9 @@
 #!/bin/bash
 echo "💾 Список бэкапов базы данных:"
 echo ""
-ls -lth ~/backups/*.db
+ls -lth ~/backups/orders_*.db ~/backups/orders_*.db.gz 2>/dev/null
 echo ""
-echo "📊 Всего бэкапов: $(ls ~/backups/*.db 2>/dev/null | wc -l)"
+echo "📊 Всего бэкапов: $(ls ~/backups/orders_*.db ~/backups/orders_*.db.gz 2>/dev/null | wc -l)"
 echo "💿 Занято места: $(du -sh ~/backups 2>/dev/null | cut -f1)"
+echo ""
+echo "♻️ Восстановление: gunzip -c ~/backups/orders_YYYYMMDD_HHMMSS.db.gz > orders.db"
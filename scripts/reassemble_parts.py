@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+# ==============================================================================
+# reassemble_parts.py - Сборка файла из частей, присланных ботом (/backup, экспорт)
+# ==============================================================================
+#
+# Положите все части (*.part001, *.part002, ...) и манифест в одну папку:
+#   python3 reassemble_parts.py orders_20260715_030000.db.gz.manifest.json
+#   python3 reassemble_parts.py orders_2026-07.csv.gz.manifest.json --keep-compressed
+#
+# Каждая часть и результат проверяются по SHA-256 из манифеста.
+
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import shutil
+import sys
+
+
+def sha256_file(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def reassemble(manifest_path: str, out: str = None, keep_compressed: bool = False) -> str:
+    with open(manifest_path, encoding="utf-8") as f:
+        manifest = json.load(f)
+    directory = os.path.dirname(os.path.abspath(manifest_path))
+
+    missing = [part["name"] for part in manifest["parts"]
+               if not os.path.exists(os.path.join(directory, part["name"]))]
+    if missing:
+        raise SystemExit(f"❌ Не хватает частей: {', '.join(missing)}")
+
+    for part in manifest["parts"]:
+        if sha256_file(os.path.join(directory, part["name"])) != part["sha256"]:
+            raise SystemExit(f"❌ Часть {part['name']} повреждена (SHA-256 не совпадает)")
+
+    joined = os.path.join(directory, manifest["file"])
+    digest = hashlib.sha256()
+    with open(joined, "wb") as dst:
+        for part in manifest["parts"]:
+            with open(os.path.join(directory, part["name"]), "rb") as src:
+                for block in iter(lambda: src.read(1024 * 1024), b""):
+                    digest.update(block)
+                    dst.write(block)
+    if digest.hexdigest() != manifest["sha256"]:
+        raise SystemExit("❌ Собранный файл не совпадает с манифестом")
+
+    if not manifest["compressed"] or keep_compressed:
+        result = out or joined
+        if result != joined:
+            shutil.move(joined, result)
+        return result
+
+    result = out or os.path.join(directory, manifest["original_file"])
+    with gzip.open(joined, "rb") as src, open(result, "wb") as dst:
+        shutil.copyfileobj(src, dst, 1024 * 1024)
+    os.remove(joined)
+    if sha256_file(result) != manifest["original_sha256"]:
+        raise SystemExit("❌ Распакованный файл не совпадает с оригиналом")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Сборка файла из частей по манифесту")
+    parser.add_argument("manifest", help="*.manifest.json")
+    parser.add_argument("--out", help="куда записать результат")
+    parser.add_argument("--keep-compressed", action="store_true", help="не распаковывать gzip")
+    args = parser.parse_args()
+
+    result = reassemble(args.manifest, args.out, args.keep_compressed)
+    print(f"✅ Собрано и проверено: {result} ({os.path.getsize(result) / 1024 / 1024:.1f} МБ)")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
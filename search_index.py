@@ -0,0 +1,279 @@
+# ==============================================================================
+# search_index.py - Полнотекстовый поиск по отзывам и заказам (SQLite FTS5)
+# ==============================================================================
+#
+# reviews_fts — индекс над reviews (guest_name, pros, cons, comment) без
+# копии текста (content='reviews'); orders_fts — имя клиента и названия
+# позиций из orders.items. Оба поддерживаются триггерами, так что бот,
+# edit_orders.py и edit_reviews.py видят одно и то же.
+#
+# Стеммера для русского в FTS5 нет: слово запроса обрезается до основы и
+# ищется по префиксу — «холодный душ» находит «холодная вода в душе».
+#
+#   python3 search_index.py "холодный душ"
+#   python3 search_index.py --orders "Иванов"
+#   python3 search_index.py --rebuild
+#
+# Только стандартная библиотека: используется ботом (/search) и CLI.
+
+import argparse
+import asyncio
+import html
+import os
+import re
+import sqlite3
+import sys
+from typing import Dict, List
+
+DB_FILE = os.getenv("DB_FILE", "orders.db")
+SEARCH_LIMIT = int(os.getenv("SEARCH_LIMIT", "10"))
+
+FTS_TOKENIZER = "unicode61 remove_diacritics 2"
+# Названия позиций заказа через пробел; битый JSON не должен ломать вставку заказа
+ITEM_NAMES_SQL = (
+    "CASE WHEN json_valid({row}.items) THEN "
+    "(SELECT group_concat(json_extract(value, '$.name'), ' ') FROM json_each({row}.items)) END"
+)
+REVIEW_COLUMNS = ["guest_name", "pros", "cons", "comment"]
+
+SEARCH_SCHEMA = [
+    f"""
+    CREATE VIRTUAL TABLE IF NOT EXISTS reviews_fts USING fts5(
+        {", ".join(REVIEW_COLUMNS)},
+        content='reviews', content_rowid='id', tokenize='{FTS_TOKENIZER}'
+    )
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS trg_reviews_fts_insert AFTER INSERT ON reviews BEGIN
+        INSERT INTO reviews_fts (rowid, {", ".join(REVIEW_COLUMNS)})
+        VALUES (NEW.id, {", ".join(f"NEW.{c}" for c in REVIEW_COLUMNS)});
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS trg_reviews_fts_delete AFTER DELETE ON reviews BEGIN
+        INSERT INTO reviews_fts (reviews_fts, rowid, {", ".join(REVIEW_COLUMNS)})
+        VALUES ('delete', OLD.id, {", ".join(f"OLD.{c}" for c in REVIEW_COLUMNS)});
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS trg_reviews_fts_update AFTER UPDATE OF {", ".join(REVIEW_COLUMNS)} ON reviews BEGIN
+        INSERT INTO reviews_fts (reviews_fts, rowid, {", ".join(REVIEW_COLUMNS)})
+        VALUES ('delete', OLD.id, {", ".join(f"OLD.{c}" for c in REVIEW_COLUMNS)});
+        INSERT INTO reviews_fts (rowid, {", ".join(REVIEW_COLUMNS)})
+        VALUES (NEW.id, {", ".join(f"NEW.{c}" for c in REVIEW_COLUMNS)});
+    END
+    """,
+    # У orders текстовый ключ: rowid индекса = rowid заказа, order_id — для выдачи
+    f"""
+    CREATE VIRTUAL TABLE IF NOT EXISTS orders_fts USING fts5(
+        client_name, item_names, order_id UNINDEXED, tokenize='{FTS_TOKENIZER}'
+    )
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS trg_orders_fts_insert AFTER INSERT ON orders BEGIN
+        INSERT INTO orders_fts (rowid, client_name, item_names, order_id)
+        VALUES (NEW.rowid, NEW.client_name, {ITEM_NAMES_SQL.format(row="NEW")}, NEW.order_id);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_orders_fts_delete AFTER DELETE ON orders BEGIN
+        DELETE FROM orders_fts WHERE rowid = OLD.rowid;
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS trg_orders_fts_update AFTER UPDATE OF client_name, items ON orders BEGIN
+        DELETE FROM orders_fts WHERE rowid = OLD.rowid;
+        INSERT INTO orders_fts (rowid, client_name, item_names, order_id)
+        VALUES (NEW.rowid, NEW.client_name, {ITEM_NAMES_SQL.format(row="NEW")}, NEW.order_id);
+    END
+    """,
+]
+
+# Окончания, которые срезаются со слова запроса (основа не короче 3 букв)
+_ENDINGS = re.compile(
+    r"(иями|ями|ами|ого|его|ому|ему|ыми|ими|ешь|ете|ишь|ите|ют|ут|ат|ят|ая|яя|ое|ее|ые|ие|ый|ий|ой|"
+    r"ую|юю|ом|ем|ах|ях|ов|ев|ей|ам|ям|ть|ся|а|я|о|е|ы|и|у|ю|ь|й)$"
+)
+# Маркеры подсветки в snippet(): текст экранируется для HTML уже после них
+_MARK_START, _MARK_END = "\x02", "\x03"
+
+
+class SearchError(Exception):
+    pass
+
+
+def ensure_search_index(conn: sqlite3.Connection) -> bool:
+    """Таблицы FTS5 и триггеры; при первом создании индекс заполняется. True — если заполняли"""
+    existing = {row[0] for row in conn.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'table' AND name IN ('reviews_fts', 'orders_fts')"
+    )}
+    for statement in SEARCH_SCHEMA:
+        conn.execute(statement)
+    conn.commit()
+    if existing == {"reviews_fts", "orders_fts"}:
+        return False
+    rebuild_search_index(conn)
+    return True
+
+
+def rebuild_search_index(conn: sqlite3.Connection):
+    """Полная пересборка обоих индексов (первый запуск или ручная сверка)"""
+    conn.execute("INSERT INTO reviews_fts (reviews_fts) VALUES ('rebuild')")
+    conn.execute("DELETE FROM orders_fts")
+    conn.execute(f"""
+        INSERT INTO orders_fts (rowid, client_name, item_names, order_id)
+        SELECT rowid, client_name, {ITEM_NAMES_SQL.format(row="orders")}, order_id FROM orders
+    """)
+    conn.execute("INSERT INTO orders_fts (orders_fts) VALUES ('optimize')")
+    conn.commit()
+
+
+def migrate_search_index(db_path: str) -> bool:
+    """ensure_search_index для файла базы (init_db бота, запуск в рабочем потоке)"""
+    conn = sqlite3.connect(db_path, timeout=30)
+    try:
+        return ensure_search_index(conn)
+    finally:
+        conn.close()
+
+
+def stem(word: str) -> str:
+    """'холодный' -> 'холодн' (слово в нижнем регистре; короткая основа не обрезается)"""
+    base = _ENDINGS.sub("", word)
+    return base if len(base) >= 3 else word
+
+
+def build_match(query: str) -> str:
+    """
+    'Холодный душ!' -> '"холодн"* "душ"*' — слова запроса через AND, каждое
+    по основе-префиксу. SearchError, если в запросе нет слов.
+    """
+    terms = [f'"{stem(word)}"*' for word in re.findall(r"\w+", query.lower())]
+    if not terms:
+        raise SearchError("Пустой запрос")
+    return " ".join(terms)
+
+
+def _highlight(text: str, markup: str) -> str:
+    """Сниппет с маркерами -> HTML (<b>) или простой текст (**)"""
+    if markup == "html":
+        return html.escape(text or "").replace(_MARK_START, "<b>").replace(_MARK_END, "</b>")
+    return (text or "").replace(_MARK_START, "**").replace(_MARK_END, "**")
+
+
+def search_reviews(conn: sqlite3.Connection, query: str, limit: int = SEARCH_LIMIT,
+                   markup: str = "text") -> List[Dict]:
+    """Отзывы по релевантности (bm25: минусы и комментарий весят больше имени)"""
+    rows = conn.execute(f"""
+        SELECT r.id, r.guest_name, r.room_number, r.status, r.created_at,
+               ROUND(r.avg_score, 1),
+               snippet(reviews_fts, -1, '{_MARK_START}', '{_MARK_END}', '…', 12)
+        FROM reviews_fts
+        JOIN reviews r ON r.id = reviews_fts.rowid
+        WHERE reviews_fts MATCH ?
+        ORDER BY bm25(reviews_fts, 1.0, 2.0, 3.0, 2.0), r.created_at DESC
+        LIMIT ?
+    """, (build_match(query), limit)).fetchall()
+    return [
+        {"id": row[0], "guest_name": row[1], "room": row[2], "status": row[3], "date": row[4],
+         "avg_score": row[5], "snippet": _highlight(row[6], markup)}
+        for row in rows
+    ]
+
+
+def search_orders(conn: sqlite3.Connection, query: str, limit: int = SEARCH_LIMIT,
+                  markup: str = "text") -> List[Dict]:
+    """Заказы по релевантности, при равенстве — новые выше"""
+    rows = conn.execute(f"""
+        SELECT o.order_id, o.client_name, o.room, o.status, o.total, o.created_at,
+               snippet(orders_fts, 1, '{_MARK_START}', '{_MARK_END}', '…', 10),
+               highlight(orders_fts, 0, '{_MARK_START}', '{_MARK_END}')
+        FROM orders_fts
+        JOIN orders o ON o.order_id = orders_fts.order_id
+        WHERE orders_fts MATCH ?
+        ORDER BY bm25(orders_fts, 3.0, 1.0), o.created_at DESC
+        LIMIT ?
+    """, (build_match(query), limit)).fetchall()
+    return [
+        {"order_id": row[0], "client_name": _highlight(row[7], markup), "room": row[2], "status": row[3],
+         "total": row[4], "date": row[5], "snippet": _highlight(row[6], markup)}
+        for row in rows
+    ]
+
+
+def search(query: str, db_path: str = DB_FILE, limit: int = SEARCH_LIMIT, markup: str = "text",
+           reviews: bool = True, orders: bool = True) -> Dict[str, List[Dict]]:
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True, timeout=30)
+    try:
+        return {
+            "reviews": search_reviews(conn, query, limit, markup) if reviews else [],
+            "orders": search_orders(conn, query, limit, markup) if orders else [],
+        }
+    except sqlite3.OperationalError as e:
+        # Синтаксис MATCH или индекс ещё не создан
+        raise SearchError(str(e))
+    finally:
+        conn.close()
+
+
+async def search_async(query: str, **kwargs) -> Dict[str, List[Dict]]:
+    """search в рабочем потоке — event loop бота не блокируется"""
+    return await asyncio.to_thread(search, query, **kwargs)
+
+
+def print_reviews(results: List[Dict]):
+    print(f"\n🔎 Отзывы ({len(results)}):")
+    for review in results:
+        print(f"  #{review['id']} | {review['guest_name']} | {review['room'] or '-'} | "
+              f"{review['avg_score']}/10 | {review['status']} | {(review['date'] or '')[:10]}")
+        print(f"      {review['snippet']}")
+
+
+def print_orders(results: List[Dict]):
+    print(f"\n🔎 Заказы ({len(results)}):")
+    for order in results:
+        print(f"  #{order['order_id']} | {order['client_name']} | {order['room']} | "
+              f"{order['total']}₸ | {order['status']} | {(order['date'] or '')[:16]}")
+        if order["snippet"]:
+            print(f"      {order['snippet']}")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Поиск по отзывам и заказам Pelikan Bot")
+    parser.add_argument("query", nargs="*", help="слова для поиска")
+    parser.add_argument("--db", default=DB_FILE, help="путь к базе")
+    parser.add_argument("--limit", type=int, default=SEARCH_LIMIT, help="результатов на раздел")
+    scope = parser.add_mutually_exclusive_group()
+    scope.add_argument("--reviews", action="store_true", help="только отзывы")
+    scope.add_argument("--orders", action="store_true", help="только заказы")
+    parser.add_argument("--rebuild", action="store_true", help="пересобрать индексы")
+    args = parser.parse_args()
+
+    if args.rebuild:
+        conn = sqlite3.connect(args.db, timeout=30)
+        try:
+            ensure_search_index(conn)
+            rebuild_search_index(conn)
+        finally:
+            conn.close()
+        print("✅ Индексы поиска пересобраны")
+        if not args.query:
+            return 0
+    if not args.query:
+        parser.error("укажите слова для поиска")
+
+    try:
+        results = search(" ".join(args.query), args.db, args.limit,
+                         reviews=not args.orders, orders=not args.reviews)
+    except SearchError as e:
+        print(f"❌ {e}")
+        return 1
+    if not args.orders:
+        print_reviews(results["reviews"])
+    if not args.reviews:
+        print_orders(results["orders"])
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())